@@ -7,21 +7,14 @@ from pathlib import Path
 import os
 join = os.path.join
 
-def convert(filepath,opath=None,ofilename=None):
+def convert(filepath,opath=None,ofilename=None,sidecar=None):
+    """
+    Convert an Amira spatial graph file to JSON.
+    sidecar: None (arrays as JSON lists), 'base64' (arrays embedded as base64-encoded bytes), 
+             or 'buffer' (arrays stored in a binary .bin file alongside the JSON) - see AmiraMesh.write_json
+    """
     a = spatialgraph.SpatialGraph()
     a.read(filepath,quiet=True)
-    o = dict()
-    # AmiraMesh object data held in fields by name:
-    # 'VertexCoordinates', 'EdgeConnectivity', 'NumEdgePoints', 'EdgePointCoordinates', 'thickness'
-    # Dislike the naming of thickness, so capitalize.
-    # Data stored as numpy array, so call tolist()
-    for field in a.fields:
-        name = field['name']
-        if name.lower()=='radii':
-            name = 'radius'
-        name = name[0].upper() + name[1:]
-        if field['data'] is not None:
-            o[name] = field['data'].tolist()
             
     if opath is not None:
         if ofilename is not None:
@@ -31,8 +24,8 @@ def convert(filepath,opath=None,ofilename=None):
     else:
         f = filepath.replace('.am','.json')
 
-    with open(f, 'w') as handle:
-        json.dump(o, handle, indent=4)
+    # Field data are streamed to file (field names capitalised, Radii renamed to Radius)
+    a.write_json(f,sidecar=sidecar)
         
     return f
 
@@ -43,6 +36,7 @@ def main():
     parser.add_argument("filename", type=str, help="JSON filepath")
     parser.add_argument("-o","--opath", type=str, default=None, help="JSON filepath")
     parser.add_argument("-s","--stl", type=bool, default=True, help="STL")
+    parser.add_argument("-b","--binary", type=str, default=None, choices=['base64','buffer'], help="Store arrays as binary (base64 or .bin buffer)")
     
     args = parser.parse_args()
     
@@ -51,7 +45,7 @@ def main():
     ofile = args.opath
     stl = args.stl
 
-    convert(filename)
+    convert(filename,sidecar=args.binary)
     
     if stl is True:
         graph = spatialgraph.SpatialGraph()
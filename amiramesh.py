@@ -13,6 +13,87 @@ import re
 from tqdm import tqdm # Progress bar
 import sys
 import os
+import zlib
+try:
+    import numba as nb
+except ImportError:
+    nb = None
+
+def parse_ascii_values(text,strict=True):
+
+    """
+    Parse whitespace-separated numbers from ASCII data text into a flat float64 array.
+    Any line containing a comment (#) is ignored.
+    If strict=True, unparseable text raises an error. Otherwise parsing stops at the first unparseable value
+    (without changing the global warning filters, so this can be run in threads) and the caller must check the
+    number of values returned.
+    """
+
+    if '#' in text:
+        text = re.sub(r'^.*#.*$','',text,flags=re.MULTILINE)
+    if re.search(r'\S',text) is None:
+        # np.fromstring returns [-1] for whitespace-only text
+        return np.zeros(0)
+    if not strict:
+        return np.fromstring(text,dtype='float',sep=' ')
+    
+    import warnings
+    with warnings.catch_warnings():
+        # Unparseable tokens only raise a DeprecationWarning in numpy, so promote it to an error
+        warnings.simplefilter('error',DeprecationWarning)
+        return np.fromstring(text,dtype='float',sep=' ')
+
+def _rle_control_bytes(d,uncompressed_size):
+
+    """
+    Locate the control byte of each HxByteRLE run in d (a uint8 array, or bytes).
+    Returns the control byte positions, the end position of the last run, the number of decoded bytes
+    and an error flag (0: ok, 1: data ended early, 2: zero control byte).
+    (Compiled with numba where available - each run's position depends on the previous run, so this can't be vectorised)
+    """
+
+    nb_ = len(d)
+    ctrl = np.empty(nb_//2+1,dtype=np.int64)
+    nctrl = 0
+    bytes_read = 0
+    filepos = 0
+    while bytes_read < uncompressed_size:
+        if filepos>=nb_:
+            return ctrl[:nctrl],filepos,bytes_read,1
+        x = int(d[filepos])
+        if x==0:
+            return ctrl[:nctrl],filepos,bytes_read,2
+        ctrl[nctrl] = filepos
+        nctrl += 1
+        if x > 0x7f:
+            x = (x & 0x7f)
+            filepos += x + 1
+        else:
+            filepos += 2
+        bytes_read += x
+    return ctrl[:nctrl],filepos,bytes_read,0
+
+def _rle_expand(d,ctrl,uncompressed_size):
+    # Expand the runs starting at each control byte (numba-compiled counterpart of the numpy gather in decode_rle)
+    out = np.empty(uncompressed_size,dtype=np.uint8)
+    pos = 0
+    for c in ctrl:
+        x = int(d[c])
+        if x > 0x7f:
+            n = min(x & 0x7f,uncompressed_size-pos)
+            out[pos:pos+n] = d[c+1:c+1+n]
+        else:
+            n = min(x,uncompressed_size-pos)
+            out[pos:pos+n] = d[c+1]
+        pos += n
+    return out
+
+if nb is not None:
+    _rle_control_bytes_jit = nb.njit(cache=True)(_rle_control_bytes)
+    _rle_expand_jit = nb.njit(cache=True)(_rle_expand)
+else:
+    _rle_control_bytes_jit = None
+    _rle_expand_jit = None
 
 class AmiraMesh(object):
     
@@ -31,6 +112,7 @@ class AmiraMesh(object):
         self.filename = None
         self.dir = None
         self.diagnostic = None
+        self.fieldIndex = None
         
     def _populate_next_data_field(self,i,curDataMarker,eof=False):
         self.dataFieldCount += 1
@@ -60,7 +142,7 @@ class AmiraMesh(object):
                     return chk,marker,markerIndex
         return chk,marker,markerIndex
         
-    def _read_file_data(self,content,strt,fin,curDataMarker,quiet=False):
+    def _read_file_data(self,content,strt,fin,curDataMarker,quiet=False,values=None):
         
         # Get corresponding field and definition entries
         curField = [x for x in self.fields if x['marker']==curDataMarker][0]
@@ -68,54 +150,19 @@ class AmiraMesh(object):
         
         # Update field entry to include data size and shape
         curField['nentries'] = [int(x) for x in curDef['size']]
-        curShape = [int(x) for x in curDef['size']]
-        if curField['nelements']>1:
-            curShape.append(curField['nelements'])
-        curField['shape'] = curShape
-            
-        # Grab data
-        fin = content[strt:].find('@')
-        if fin<0:
-            fin = len(content)-strt
-        curData = content[strt:strt+fin] # -1
+        curField['shape'] = self._field_shape(curField)
         
         # Data type
         if 'ascii' in self.fileType.lower():
-            #curData = curData.splitlines()
-            curData = [s.strip().split(' ') for s in curData.splitlines() if s]
-            comment_line = []
-            for k,cnt in enumerate(curData):
-                if '#' in cnt:
-                    comment_line.append(k)
-                else:
-                    cnt = [x for x in cnt if x!='']
-                    curData[k] = cnt
-            if len(comment_line)>0:
-                curData = [x for k,x in enumerate(curData) if k not in comment_line]
-                
-            if curField['type']=='float':
-                dtype = np.dtype('f')
-            elif curField['type']=='double':
-                dtype = np.dtype('d')                     
-            elif curField['type']=='int':
-                dtype = np.dtype('i')
-            elif curField['type']=='long':
-                dtype = np.dtype('i')
-            elif curField['type']=='byte':
-                dtype = np.dtype('byte')
-            elif curField['type']=='bool':
-                dtype = np.dtype('bool')
-            else: # Default to float
-                dtype = np.dtype('f')
+            # Grab data (or use values already parsed in parallel)
+            if values is not None:
+                curData = values
+            else:
+                curData = content[strt:self._ascii_section_end(content,strt)]
+            
+            dtype = self._numpy_dtype(curField['type'])
             try:
-                curData = np.asarray(curData) #,dtype=dtype)
-                curData = np.reshape(curData,curField['shape'])
-                if str(dtype).lower() not in ['byte','bool']:
-                    curData = curData.astype('float')
-                if str(dtype).lower()=='bool':
-                    # If boolean data are stored as float/integer
-                    if curData[0].astype('float') in [0.,1.]:
-                        curData = curData.astype('float')
+                curData = self._parse_ascii_data(curData,curField['shape'])
                 curField['data'] = curData.astype(dtype)
             except Exception as e:
                 if not quiet:
@@ -123,28 +170,245 @@ class AmiraMesh(object):
                     print(f'Error reading {fname} data: {e}')
 
         elif 'binary' in self.fileType.lower():
-            #curData = self.decode_rle(self,curData,uncompressed_size)
-
-            if curField['encoding']=='raw':
-                if curField['type'] != 'byte':
-                    raise Exception('Unsupported data type')
-                curData = curData.strip('\n\r')
-            else:
-                enc = curField['encoding']
-                num_bytes = int(curField['encoding_length'])
-                curData = curData.strip('\n\r')
-                assert len(curData)==num_bytes
-    
-                assert curField['type'] == 'byte'
-                uncompressed_size = np.prod(curField['shape'])
-                curData = self.decode_rle(curData, uncompressed_size)
-            flt_values = np.fromstring(data_strip, dtype=np.uint8) # only tested with bytes
+            # Binary data are located by byte offset (strt), with the size given by the header
+            dtype = self._numpy_dtype(curField['type'])
+            nbytes = int(np.prod(curField['shape']))*dtype.itemsize
+            enc = curField['encoding']
+            try:
+                if enc is None or enc=='raw':
+                    curData = content[strt:strt+nbytes]
+                else:
+                    curData = content[strt:strt+int(curField['encoding_length'])]
+                    if enc=='HxByteRLE':
+                        curData = self.decode_rle(curData,nbytes)
+                    elif enc=='HxZip':
+                        curData = zlib.decompress(curData)
+                    else:
+                        raise Exception(f'Unsupported encoding: {enc}')
+                if len(curData)!=nbytes:
+                    raise Exception(f'Expected {nbytes} bytes, found {len(curData)}')
+                
+                curData = np.frombuffer(curData,dtype=dtype.newbyteorder(self._byte_order()))
+                # Copy into a native-endian, writeable array
+                curField['data'] = np.reshape(curData,curField['shape']).astype(dtype)
+            except Exception as e:
+                if not quiet:
+                    fname = curField['name']
+                    print(f'Error reading {fname} data: {e}')
 
         else:
             raise Exception('File type not currently supported!')
         
         return True
         
+    def _numpy_dtype(self,fieldType):
+        # Numpy equivalent of an Amira field data type
+        if fieldType=='float':
+            return np.dtype('f')
+        elif fieldType=='double':
+            return np.dtype('d')
+        elif fieldType=='int':
+            return np.dtype('i')
+        elif fieldType=='long':
+            return np.dtype('int64')
+        elif fieldType=='byte':
+            # Amira bytes are unsigned
+            return np.dtype('uint8')
+        elif fieldType=='bool':
+            return np.dtype('bool')
+        else: # Default to float
+            return np.dtype('f')
+            
+    def _ascii_section_end(self,content,strt):
+        # ASCII data run up to the next marker (or the end of the file)
+        fin = content.find('@',strt)
+        if fin<0:
+            fin = len(content)
+        return fin
+        
+    def _line_chunks(self,text,chunk_size):
+        # Split text into pieces of roughly chunk_size characters, breaking only at line ends
+        chunks = []
+        strt = 0
+        while strt<len(text):
+            fin = text.find('\n',strt+chunk_size)
+            if fin<0:
+                fin = len(text)
+            chunks.append(text[strt:fin])
+            strt = fin
+        return chunks
+        
+    def _parallel_workers(self,workers,min_size=32*1024*1024):
+        # Number of threads to decode field data with. Parallel decoding only pays off with more than one core
+        # and a large data section, so fall back to serial reading (1) otherwise
+        if workers is None or workers<=1 or self.data is None or len(self.data)<min_size:
+            return 1
+        if hasattr(os,'sched_getaffinity'):
+            ncpu = len(os.sched_getaffinity(0))
+        else:
+            ncpu = os.cpu_count() or 1
+        return int(min(workers,ncpu))
+        
+    def _read_fields_parallel(self,workers,quiet=False,chunk_size=16*1024*1024):
+    
+        """
+        Decode field data sections concurrently in a thread pool.
+        ASCII sections are split into line-aligned chunks (of ~chunk_size characters, so large single fields are
+        also divided). numpy's text parser, zlib decompression and numpy copies all release the GIL, so threads
+        are used for both ASCII and binary files (no worker processes are started).
+        """
+        
+        from concurrent.futures import ThreadPoolExecutor
+        
+        inds = [i for i in range(len(self.fields)) if self.fieldRange[i]>=0]
+        for i in [i for i in range(len(self.fields)) if self.fieldRange[i]<0]:
+            if not quiet:
+                print(f"Could not locate data for {self.fields[i]['name']}")
+        
+        if 'binary' in self.fileType.lower():
+            def decode(i):
+                self._read_file_data(self.data,self.fieldRange[i],self.fieldRange[i+1],self.fields[i]['marker'],quiet=quiet)
+            with ThreadPoolExecutor(max_workers=workers) as ex:
+                list(ex.map(decode,inds))
+            return
+            
+        tasks = []
+        for i in inds:
+            strt = self.fieldRange[i]
+            text = self.data[strt:self._ascii_section_end(self.data,strt)]
+            tasks.extend([(i,chunk) for chunk in self._line_chunks(text,chunk_size)])
+            
+        # Unparseable values truncate a chunk, which is caught by the size check in _parse_ascii_data
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            futures = [ex.submit(parse_ascii_values,chunk,False) for _,chunk in tasks]
+            values = {i:[] for i in inds}
+            failed = {}
+            for (i,_),fut in zip(tasks,futures):
+                try:
+                    values[i].append(fut.result())
+                except Exception as e:
+                    failed[i] = e
+                    
+        for i in inds:
+            if i in failed:
+                if not quiet:
+                    fname = self.fields[i]['name']
+                    print(f'Error reading {fname} data: {failed[i]}')
+                continue
+            self._read_file_data(self.data,self.fieldRange[i],self.fieldRange[i+1],self.fields[i]['marker'],quiet=quiet,values=values[i])
+            
+    def _byte_order(self):
+        # Amira's BINARY format is big-endian, unless flagged as little-endian
+        if 'little' in self.fileType.lower():
+            return '<'
+        else:
+            return '>'
+            
+    def _field_shape(self,curField):
+        # Data shape for a field, from its definition size and number of elements
+        curDef = [x for x in self.definitions if x['name']==curField['definition']][0]
+        curShape = [int(x) for x in curDef['size']]
+        if curField['nelements']>1:
+            curShape.append(curField['nelements'])
+        return curShape
+        
+    def _binary_field_offsets(self):
+    
+        """
+        Locate the start of each field's data in a binary data section (self.data, bytes).
+        Sections are visited in marker order, and each marker is searched for only after the end of the
+        previous section, so that marker-like byte sequences in the binary data can't be matched.
+        """
+        
+        offsets = [-1]*len(self.fields)
+        order = sorted(range(len(self.fields)),key=lambda i:int(self.fields[i]['marker'].replace('@','')))
+        pos = 0
+        for i in order:
+            curField = self.fields[i]
+            mrk = (curField['marker']+'\n').encode()
+            mInd = self.data.find(mrk,pos)
+            if mInd==-1:
+                mInd = self.data.find(mrk)
+            if mInd==-1:
+                continue
+            offsets[i] = mInd + len(mrk)
+            pos = offsets[i] + self._binary_section_size(curField)
+        return offsets
+        
+    def _binary_section_size(self,curField):
+        # Number of bytes a field occupies in a binary data section
+        if curField['encoding'] is None or curField['encoding']=='raw':
+            return int(np.prod(self._field_shape(curField)))*self._numpy_dtype(curField['type']).itemsize
+        else:
+            return int(curField['encoding_length'])
+            
+    def _map_binary_fields(self,f,quiet=False):
+    
+        """
+        Locate each field in an open binary file without reading the data section.
+        Raw fields are memory-mapped (read-only) from the file, so data are only loaded from disk when accessed.
+        Encoded (RLE/zip) fields can't be mapped and are read and decoded from their byte range.
+        Returns the file offset of each field's data.
+        """
+        
+        offsets = [-1]*len(self.fields)
+        order = sorted(range(len(self.fields)),key=lambda i:int(self.fields[i]['marker'].replace('@','')))
+        pos = self.dataOffset
+        for i in order:
+            curField = self.fields[i]
+            curDef = [x for x in self.definitions if x['name']==curField['definition']][0]
+            curField['nentries'] = [int(x) for x in curDef['size']]
+            curField['shape'] = self._field_shape(curField)
+            
+            # Markers are separated from the end of the previous section by whitespace (and possibly comments)
+            mrk = (curField['marker']+'\n').encode()
+            f.seek(pos)
+            window = f.read(1024)
+            mInd = window.find(mrk)
+            if mInd==-1:
+                if not quiet:
+                    print(f"Could not locate data for {curField['name']}")
+                continue
+            offsets[i] = pos + mInd + len(mrk)
+            nbytes = self._binary_section_size(curField)
+            pos = offsets[i] + nbytes
+            
+            dtype = self._numpy_dtype(curField['type'])
+            try:
+                if curField['encoding'] is None or curField['encoding']=='raw':
+                    if np.prod(curField['shape'])>0:
+                        curField['data'] = np.memmap(f,dtype=dtype.newbyteorder(self._byte_order()),mode='r',
+                                                     offset=offsets[i],shape=tuple(curField['shape']))
+                    else:
+                        curField['data'] = np.zeros(curField['shape'],dtype=dtype)
+                else:
+                    f.seek(offsets[i])
+                    self._read_file_data(f.read(nbytes),0,nbytes,curField['marker'],quiet=quiet)
+            except Exception as e:
+                if not quiet:
+                    fname = curField['name']
+                    print(f'Error reading {fname} data: {e}')
+        return offsets
+        
+    def _parse_ascii_data(self,text,shape):
+    
+        """
+        Convert the text of an ASCII data section into a (float64) array with the requested shape.
+        Any line containing a comment (#) is ignored. Values are parsed in one pass with np.fromstring,
+        rather than building intermediate lists of strings.
+        Text can also be supplied as a list of line-aligned chunks (see _read_fields_parallel).
+        """
+    
+        if type(text) is list:
+            data = np.concatenate(text) if len(text)>0 else np.zeros(0)
+        else:
+            data = parse_ascii_values(text)
+            
+        nexpected = int(np.prod(shape))
+        if data.shape[0]!=nexpected:
+            raise ValueError(f'Expected {nexpected} values, found {data.shape[0]}')
+        return np.reshape(data,shape)
+        
     def _check_type(self,str_,type='float'):
         
         # See if a string can be converted into a number
@@ -179,7 +443,19 @@ class AmiraMesh(object):
 #    def add_field(self,**kwargs):
 #        self.fields.append(self._field_generator(**kwargs))
         
-    def read(self,filename,quiet=False):
+    def read(self,filename,quiet=False,mmap=False,header_only=False,workers=None):
+    
+        """
+        Read an AmiraMesh file.
+        If mmap=True and the file is binary, only the header is parsed and raw fields are returned as
+        read-only np.memmap arrays, so only the data that are used get read from disk.
+        (Editing a mapped field requires replacing it with an in-memory copy, e.g. via set_data.)
+        If header_only=True, reading stops at the first data marker (see read_header).
+        If workers>1, field data are decoded concurrently in threads (see _read_fields_parallel), using at most as many
+        threads as there are available cores. workers is only a request: reading falls back to serial when just one core
+        is available or the data section is smaller than 32 MB (see _parallel_workers), where threads can't help, and a
+        message is printed unless quiet=True.
+        """
         
         self.fileRead = False
         self.filename = filename
@@ -191,6 +467,7 @@ class AmiraMesh(object):
         self.fileType = None
         self.paramText = []
         self.fields = []
+        self.invalidate_field_index()
         self.fieldOffset = []
         self.data = []
         self.header = []
@@ -212,15 +489,20 @@ class AmiraMesh(object):
         bytesRead = 0
         fileSize = os.path.getsize(filename)
         
-        with open(filename,'r') as f:
+        # Opened in binary mode so that binary data sections can be read as-is.
+        # Header lines are decoded individually
+        with open(filename,'rb') as f:
             i = -1
             while True:
                 if inHeader:
+                    lineStart = f.tell()
                     curLine = f.readline()
+                    if len(curLine)==0:
+                        raise Exception('Error: No data section found!')
                     #print curLine
                     i += 1
                     bytesRead += sys.getsizeof(curLine)
-                    curLine = curLine.strip('\n\r')
+                    curLine = curLine.decode('utf-8',errors='replace').strip('\n\r')
                 
                     if curLine=='' or curLine==' ':
                         pass
@@ -280,10 +562,10 @@ class AmiraMesh(object):
                                 curParamVal = spl2[0]
                                 self.parameters.append({'parameter':curParam,'value':curParamVal})                        
                             elif curParam=='TransformationMatrix':
-                                matr = [float(re.sub(r'\W+','',x)) for x in spl[1:]]
+                                matr = [float(re.sub(r'[^\w.+-]+','',x)) for x in spl[1:]]
                                 self.parameters.append({'parameter':curParam,'value':matr})                        
                             elif curParam=='BoundingBox':
-                                bbox = [float(re.sub(r'\W+','',x)) for x in spl[1:]]
+                                bbox = [float(re.sub(r'[^\w.+-]+','',x)) for x in spl[1:]]
                                 self.parameters.append({'parameter':curParam,'value':bbox})                        
                             else:
                                 val = spl[1:]
@@ -381,9 +663,21 @@ class AmiraMesh(object):
                     if dataSectionChk: # Come out of header and move on to data
                         #self.fieldOffset.append(i)         
                         inHeader = False
+                        # File position of the first data marker
+                        self.dataOffset = lineStart
                         self.header = content[0:-2]
                         self.data = content[-1]
                         content = []
+                        
+                        if header_only:
+                            # Fill field sizes from the definitions, but leave the data section untouched
+                            for curField in self.fields:
+                                curDef = [x for x in self.definitions if x['name']==curField['definition']][0]
+                                curField['nentries'] = [int(x) for x in curDef['size']]
+                                curField['shape'] = self._field_shape(curField)
+                            self.data = None
+                            self.fieldRange = None
+                            break
                     
                 else:
 #                    if 'binary' in self.fileType.lower():
@@ -395,8 +689,19 @@ class AmiraMesh(object):
 #                            f.seek(hdrEnd+1)
 #                            self.data = f.read() 
 #                    else:
-                    if True:
-                        self.data += f.read()
+                    if mmap and 'binary' in self.fileType.lower():
+                        # Only record where each field starts - data are mapped from the file
+                        self.data = None
+                        self.fieldRange = self._map_binary_fields(f,quiet=quiet)
+                        break
+                        
+                    # Data section, including the first marker
+                    f.seek(self.dataOffset)
+                    self.data = f.read()
+                    if 'binary' not in self.fileType.lower():
+                        self.data = self.data.decode('utf-8',errors='replace')
+                        if '\r' in self.data:
+                            self.data = self.data.replace('\r\n','\n').replace('\r','\n')
                     bytesRead += sys.getsizeof(self.data)
                     if bytesRead<fileSize:
                         pass
@@ -405,21 +710,37 @@ class AmiraMesh(object):
                         #raise Exception('Not all of file was read! Only {} of {}'.format(bytesRead,fileSize))
                     break
 
-        self.fieldRange = []
-        for curField in self.fields:
-            mrk = curField['marker']
-            mInd = self.data.find(mrk+'\n')
-            if mInd==-1:
-                mInd = self.data.find(mrk)
-            mInd += len(mrk)
-            self.fieldRange.append(mInd)
-        self.fieldRange.append(len(self.data))
-
-        for i,curField in enumerate(self.fields):
-            self._read_file_data(self.data,self.fieldRange[i],self.fieldRange[i+1],curField['marker'],quiet=quiet)
+        if self.data is not None:
+            self.fieldRange = []
+            if 'binary' in self.fileType.lower():
+                self.fieldRange = self._binary_field_offsets()
+            else:
+                for curField in self.fields:
+                    mrk = curField['marker']
+                    mInd = self.data.find(mrk+'\n')
+                    if mInd==-1:
+                        mInd = self.data.find(mrk)
+                    mInd += len(mrk)
+                    self.fieldRange.append(mInd)
+            self.fieldRange.append(len(self.data))
+    
+            requested = workers
+            workers = self._parallel_workers(workers)
+            if requested is not None and requested>1 and workers==1 and not quiet:
+                print('Reading field data serially (parallel decoding needs more than one core and over 32 MB of data)')
+            if workers>1:
+                self._read_fields_parallel(workers,quiet=quiet)
+            else:
+                for i,curField in enumerate(self.fields):
+                    if self.fieldRange[i]<0:
+                        if not quiet:
+                            print(f"Could not locate data for {curField['name']}")
+                        continue
+                    self._read_file_data(self.data,self.fieldRange[i],self.fieldRange[i+1],curField['marker'],quiet=quiet)
             
         # Remove any null data fields
-        self.fields = [x for x in self.fields if x['data'] is not None]
+        if not header_only:
+            self.fields = [x for x in self.fields if x['data'] is not None]
 
         # Populate field names            
         self.fieldNames = [x['name'] for x in self.fields]
@@ -427,10 +748,19 @@ class AmiraMesh(object):
         # Populate the last field
         #self._populate_next_data_field(i,curDataMarker,eof=True)
 
-        self.fileRead = True
+        self.fileRead = not header_only
         
         return True
         
+    def read_header(self,filename,quiet=False):
+    
+        """
+        Read only the header of an AmiraMesh file, stopping at the first data marker.
+        Populates definitions, parameters and fields (with shapes but no data), without touching the data section.
+        """
+        
+        return AmiraMesh.read(self,filename,quiet=quiet,header_only=True)
+        
     def add_definition(self,name,size):
         if type(size) is not list:
             size = [size]
@@ -450,6 +780,7 @@ class AmiraMesh(object):
             self.fieldNames = []
         field = self._field_generator(**kwargs)
         self.fields.append(field)
+        self.invalidate_field_index()
         if self.fieldNames is not None:
             self.fieldNames.append(field['name'])
         
@@ -458,29 +789,258 @@ class AmiraMesh(object):
         
         return field
         
-    def write_json(self,filename):
+    def write_json(self,filename,sidecar=None,chunk_size=100000):
+    
+        """
+        Write fields to JSON, streaming each array to file in blocks rather than building Python lists.
+        sidecar: None - arrays are written as (nested) JSON lists
+                 'base64' - arrays are written as {"dtype","shape","base64"} objects holding the raw bytes
+                 'buffer' - raw bytes are written to a binary file alongside the JSON (<filename>.bin), and
+                            arrays are written as {"dtype","shape","buffer","byteOffset","byteLength"} objects
+        """
     
         import json
+        import base64
 
-        o = dict()
         # AmiraMesh object data held in fields by name:
         # 'VertexCoordinates', 'EdgeConnectivity', 'NumEdgePoints', 'EdgePointCoordinates', 'thickness'
         # Dislike the naming of thickness, so capitalize.
-        # Data stored as numpy array, so call tolist()
-        for field in self.fields:
-            name = field['name']
-            if name.lower()=='radii':
-                name = 'radius'
-            name = name[0].upper() + name[1:]
-            if field['data'] is not None:
-                o[name] = field['data'].tolist()
+        fields = [x for x in self.fields if x['data'] is not None]
+        
+        bufferFile = None
+        if sidecar=='buffer':
+            bufferName = os.path.splitext(filename)[0] + '.bin'
+            bufferFile = open(bufferName,'wb')
+            byteOffset = 0
+        elif sidecar not in [None,'base64']:
+            raise Exception(f'Unsupported JSON sidecar: {sidecar}')
 
-        with open(filename, 'w') as handle:
-            json.dump(o, handle, indent=4)
+        try:
+            with open(filename, 'w') as handle:
+                handle.write('{\n')
+                for i,field in enumerate(fields):
+                    name = field['name']
+                    if name.lower()=='radii':
+                        name = 'radius'
+                    name = name[0].upper() + name[1:]
+                    handle.write('    {}: '.format(json.dumps(name)))
+                    
+                    data = np.asarray(field['data'])
+                    if sidecar is None:
+                        self._write_json_array(handle,data,chunk_size=chunk_size)
+                    else:
+                        data = np.ascontiguousarray(data)
+                        dtype = data.dtype.newbyteorder('<')
+                        raw = data.astype(dtype).tobytes()
+                        o = {'dtype':dtype.str,'shape':list(data.shape)}
+                        if sidecar=='base64':
+                            o['base64'] = base64.b64encode(raw).decode('ascii')
+                        else:
+                            bufferFile.write(raw)
+                            o['buffer'] = os.path.basename(bufferName)
+                            o['byteOffset'] = byteOffset
+                            o['byteLength'] = len(raw)
+                            byteOffset += len(raw)
+                        handle.write(json.dumps(o))
+                    if i<len(fields)-1:
+                        handle.write(',')
+                    handle.write('\n')
+                handle.write('}\n')
+        finally:
+            if bufferFile is not None:
+                bufferFile.close()
+                
+    def _write_json_array(self,handle,data,chunk_size=100000):
+        # Write an array as a JSON list (of lists, for 2D arrays), formatting blocks of values at once
+        import json
+        if data.ndim>2 or data.dtype.kind not in 'biuf':
+            json.dump(data.tolist(),handle)
+            return
+            
+        if data.ndim==1:
+            fmt = '%s'
+            ncol = 1
+        else:
+            ncol = data.shape[1]
+            fmt = '[' + ', '.join(['%s']*ncol) + ']'
+        
+        data = data.reshape(data.shape[0],-1)
+        handle.write('[')
+        for i in range(0,data.shape[0],chunk_size):
+            block = data[i:i+chunk_size]
+            if i>0:
+                handle.write(',\n')
+            if block.dtype.kind=='f' and not np.all(np.isfinite(block)):
+                # Let the json module handle NaN/Infinity
+                rows = data[i:i+chunk_size] if ncol>1 else block[:,0]
+                text = ',\n'.join([json.dumps(x) for x in rows.tolist()])
+            else:
+                text = ',\n'.join([fmt]*block.shape[0]) % tuple(block.ravel().tolist())
+            handle.write(text)
+        handle.write(']')
+        
+    def read_json_arrays(self,filename):
+    
+        """
+        Read the arrays stored in a JSON file (e.g. written by write_json) into a dictionary of numpy arrays.
+        Numeric lists (1D, or 2D lists of lists) are parsed directly into typed arrays without building Python lists;
+        base64 and binary-buffer sidecar arrays are decoded with np.frombuffer. Other values are parsed with the json module.
+        """
+        
+        import json
+        import base64
+        
+        with open(filename,'r') as f:
+            text = f.read()
+            
+        decoder = json.JSONDecoder()
+        ws = re.compile(r'[\s,]*')
+        nestedEnd = re.compile(r'\]\s*\]')
+        nonNumeric = re.compile(r'[^\d\s\[\],.eE+-]')
+        deeper = re.compile(r'\[\s*\[')
+        result = {}
+        buffers = {}
+        
+        pos = ws.match(text,0).end()
+        if text[pos]!='{':
+            raise Exception('JSON file must contain an object')
+        pos += 1
+        while True:
+            pos = ws.match(text,pos).end()
+            if text[pos]=='}':
+                break
+            key,pos = decoder.raw_decode(text,pos)
+            pos = text.index(':',pos) + 1
+            pos = ws.match(text,pos).end()
+            
+            val = None
+            if text[pos]=='[':
+                # Fast path for 1D/2D numeric lists
+                close = text.find(']',pos)
+                inner = text.find('[',pos+1)
+                if inner!=-1 and inner<close:
+                    # List of lists - the end is the first pair of closing brackets
+                    mtch = nestedEnd.search(text,pos)
+                    end = mtch.end() if mtch is not None else -1
+                else:
+                    end = close + 1
+                span = text[pos:end]
+                if end>pos and span.count('[')==span.count(']') and nonNumeric.search(span) is None and deeper.search(span,1) is None:
+                    nrow = span.count('[') - 1
+                    body = span.translate(str.maketrans('[],','   '))
+                    dtype = 'float' if re.search(r'[.eE]',body) is not None else 'int64'
+                    vals = np.fromstring(body,dtype=dtype,sep=' ') if body.strip() else np.zeros(0)
+                    if nrow>0:
+                        # Only reshape lists of lists if every row has the same length (ragged lists use the json module)
+                        rowLengths = self._json_row_lengths(span,nrow)
+                        if np.all(rowLengths==rowLengths[0]):
+                            val = vals.reshape(nrow,rowLengths[0])
+                    else:
+                        val = vals
+                    if val is not None:
+                        pos = end
+            if val is None:
+                val,pos = decoder.raw_decode(text,pos)
+                if isinstance(val,dict) and 'dtype' in val and 'shape' in val:
+                    if 'base64' in val:
+                        raw = base64.b64decode(val['base64'])
+                    else:
+                        bufferName = os.path.join(os.path.dirname(filename),val['buffer'])
+                        if bufferName not in buffers:
+                            buffers[bufferName] = np.memmap(bufferName,dtype=np.uint8,mode='r')
+                        raw = buffers[bufferName][val['byteOffset']:val['byteOffset']+val['byteLength']]
+                    dtype = np.dtype(val['dtype'])
+                    val = np.frombuffer(raw,dtype=dtype).reshape(val['shape']).astype(dtype.newbyteorder('='))
+                else:
+                    try:
+                        val = np.asarray(val)
+                    except ValueError:
+                        pass # Ragged lists are returned as lists
+            result[key] = val
+            
+        return result
+        
+    def _json_row_lengths(self,span,nrow):
+        # Number of values in each row of a JSON list of numeric lists (span), counted without splitting the text
+        b = np.frombuffer(span.encode(),dtype=np.uint8)
+        numeric = ~np.isin(b,np.frombuffer(b' [],\t\r\n',dtype=np.uint8))
+        tokenStart = numeric & ~np.concatenate([[False],numeric[:-1]])
+        row = np.cumsum(b==ord('['))
+        return np.bincount(row[tokenStart],minlength=nrow+2)[2:]
+        
+    def _data_rows(self,data):
+        # Arrange field data as one row per entry, in file order.
+        # Lattices (3D+) are stored with the first index varying fastest
+        data = np.asarray(data)
+        if data.ndim<=1:
+            return data.reshape(-1,1)
+        elif data.ndim==2:
+            return data
+        else:
+            axes = [2,1,0] + list(range(3,data.ndim))
+            data = np.transpose(data,axes)
+            return data.reshape(-1,int(np.prod(data.shape[3:])))
+            
+    def _write_ascii_data(self,f,data,precision=None,chunk_size=100000):
+    
+        """
+        Write field data as ASCII text, formatting blocks of rows with a single string operation.
+        Floating point data are written in full (as Python floats), or with the given number of significant figures
+        """
+        
+        rows = self._data_rows(data)
+        nrow,ncol = rows.shape
+        if precision is not None and rows.dtype.kind=='f':
+            fmt = '%.{}g'.format(int(precision))
+        else:
+            fmt = '%s'
+        rowFmt = ' '.join([fmt]*ncol) + '\n'
+        for i in range(0,nrow,chunk_size):
+            block = rows[i:i+chunk_size]
+            f.write((rowFmt*block.shape[0]) % tuple(block.ravel().tolist()))
+            
+    def _binary_data(self,curField,byteorder,encoding=None):
+        # Bytes for a field in a binary file, plus the encoding used
+        dtype = self._numpy_dtype(curField['type']).newbyteorder(byteorder)
+        raw = np.ascontiguousarray(self._data_rows(curField['data']),dtype=dtype).tobytes()
+        if encoding is None or encoding=='raw':
+            return raw,None
+        elif encoding=='HxByteRLE':
+            return self.encode_rle(raw),encoding
+        elif encoding=='HxZip':
+            return zlib.compress(raw),encoding
+        else:
+            raise Exception(f'Unsupported encoding: {encoding}')
         
-    def write(self,filename):
+    def write(self,filename,precision=None,fileType=None,encoding=None):
+    
+        """
+        Write to an AmiraMesh file.
+        precision: number of significant figures for floating point data in ASCII files (default: full precision)
+        fileType: override the file type, e.g. '3D BINARY-LITTLE-ENDIAN 2.1' for a compact binary file
+        encoding: compression for binary files ('HxByteRLE' or 'HxZip'). Defaults to the encoding each field
+                  was read with, otherwise raw
+        """
+        
+        if fileType is None:
+            fileType = self.fileType
+        binary = 'binary' in fileType.lower()
+        if 'little' in fileType.lower():
+            byteorder = '<'
+        else:
+            byteorder = '>'
+            
+        # Binary data are prepared first, as the header includes the size of encoded fields
+        if binary:
+            binData = []
+            for d in self.fields:
+                enc = encoding
+                if enc is None and d['encoding'] in ['HxByteRLE','HxZip']:
+                    enc = d['encoding']
+                binData.append(self._binary_data(d,byteorder,encoding=enc))
+    
         with open(filename, 'w') as f:
-            f.write('# AmiraMesh {}\n'.format(self.fileType))
+            f.write('# AmiraMesh {}\n'.format(fileType))
             f.write('\n')
             
             # Definition section
@@ -509,36 +1069,30 @@ class AmiraMesh(object):
             f.write('\n')
             
             # Data definition section
-            for d in self.fields:
+            for i,d in enumerate(self.fields):
+                marker = d['marker']
+                if binary and binData[i][1] is not None:
+                    marker += '({},{})'.format(binData[i][1],len(binData[i][0]))
                 if d['nelements']>1:
-                    f.write('{0} {{ {1}[{2}] {3} }} {4} \n'.format(d['definition'],d['type'],d['nelements'],d['name'],d['marker']))
+                    f.write('{0} {{ {1}[{2}] {3} }} {4} \n'.format(d['definition'],d['type'],d['nelements'],d['name'],marker))
                 else:
-                    f.write('{0} {{ {1} {2} }} {3} \n'.format(d['definition'],d['type'],d['name'],d['marker']))
+                    f.write('{0} {{ {1} {2} }} {3} \n'.format(d['definition'],d['type'],d['name'],marker))
             f.write('\n')
             
             # Data section
             f.write('# Data section\n')
-            for d in self.fields:
-                f.write('{}\n'.format(d['marker']))
-                data = d['data']
-                name = d['name']
-                if data.ndim==1:
-                    for j in range(data.shape[0]):
-                        if data[j] is None:
-                            breakpoint()
-                        data[j].tofile(f, sep=" ", format="%s")
-                        f.write('\n')
-                elif data.ndim==2:
-                    for j in range(data.shape[0]):
-                        data[j,:].tofile(f, sep=" ", format="%s")
-                        f.write('\n')
-                else:
-                    for j in range(data.shape[2]):
-                        for k in range(data.shape[1]):
-                            for l in range(data.shape[0]):
-                                data[l,k,j].tofile(f, sep=" ", format="%s")
-                                f.write('\n')
-                f.write('\n')
+            if not binary:
+                for d in self.fields:
+                    f.write('{}\n'.format(d['marker']))
+                    self._write_ascii_data(f,d['data'],precision=precision)
+                    f.write('\n')
+                    
+        if binary:
+            with open(filename, 'ab') as f:
+                for i,d in enumerate(self.fields):
+                    f.write('{}\n'.format(d['marker']).encode())
+                    f.write(binData[i][0])
+                    f.write(b'\n\n')
         
 #    def add_field(self,fieldDict):
 #        markers = [int(x['marker'].replace('@','')) for x in self.fields]
@@ -552,27 +1106,90 @@ class AmiraMesh(object):
 #        self.fieldRange.append(-1)
         
     def decode_rle(self,d,uncompressed_size):
-        # based on decode.rle from nat's amiramesh-io.R
-        d = np.fromstring(d, dtype=np.uint8 )
-        rval = np.empty( (uncompressed_size,), dtype=np.uint8 )
-        bytes_read = 0
-        filepos = 0
-        while bytes_read < uncompressed_size:
-            x=d[filepos]
-            if x==0:
-                raise ValueError('x is 0 at %d'%filepos)
-            filepos += 1
     
-            if x > 0x7f:
-                x = (x & 0x7f)
-                mybytes=d[filepos:filepos+x]
-                filepos += x
-            else:
-                mybytes=np.repeat(d[filepos],x)
-                filepos += 1
-            rval[bytes_read:bytes_read+len(mybytes)] = mybytes
-            bytes_read += len(mybytes)
+        """
+        Decode HxByteRLE-compressed bytes (based on decode.rle from nat's amiramesh-io.R).
+        Each run starts with a control byte: if the high bit is set, the lower 7 bits give a count of literal bytes that follow;
+        otherwise the control byte gives the number of times the following byte is repeated.
+        Runs are located and expanded with numba-compiled loops. If numba isn't installed, the control bytes are
+        located with a Python loop over runs and the runs are expanded with a single numpy gather.
+        """
+        
+        d = np.frombuffer(d, dtype=np.uint8 )
+        
+        # Locate the control byte of each run
+        if _rle_control_bytes_jit is not None:
+            ctrl,filepos,bytes_read,err = _rle_control_bytes_jit(d,int(uncompressed_size))
+        else:
+            ctrl,filepos,bytes_read,err = _rle_control_bytes(d.tobytes(),uncompressed_size)
+        if err==1:
+            raise ValueError(f'RLE data ended after {bytes_read} of {uncompressed_size} bytes')
+        elif err==2:
+            raise ValueError('x is 0 at %d'%filepos)
+        if filepos>d.shape[0]:
+            raise ValueError('RLE data truncated')
+        if _rle_expand_jit is not None:
+            return _rle_expand_jit(d,ctrl,int(uncompressed_size))
+            
+        x = d[ctrl].astype('int64')
+        literal = x > 0x7f
+        count = np.where(literal, x & 0x7f, x)
+        
+        # Source byte for each output byte: the repeated value, or successive literal bytes
+        runStart = np.cumsum(count) - count
+        src = np.repeat(ctrl+1,count)
+        offset = np.arange(src.shape[0]) - np.repeat(runStart,count)
+        src += offset * np.repeat(literal,count)
+        
+        rval = d[src[:uncompressed_size]]
         return rval
+        
+    def encode_rle(self,d,min_run=3):
+    
+        """
+        Encode bytes using HxByteRLE (the inverse of decode_rle).
+        Runs of at least min_run identical bytes are stored as repeats, everything else as literal blocks
+        (both split into blocks of at most 127 bytes). Returns a bytes object.
+        """
+        
+        d = np.frombuffer(np.ascontiguousarray(d).tobytes(),dtype=np.uint8)
+        n = d.shape[0]
+        if n==0:
+            return b''
+        
+        # Runs of identical bytes
+        runStarts = np.concatenate([[0],np.where(np.diff(d)!=0)[0]+1])
+        runLengths = np.diff(np.concatenate([runStarts,[n]]))
+        repeat = np.repeat(runLengths>=min_run,runLengths)
+        isRunStart = np.zeros(n,dtype='bool')
+        isRunStart[runStarts] = True
+        
+        # Segments: each repeated run, or a maximal stretch of literal bytes
+        segStart = isRunStart & (repeat | np.concatenate([[True],repeat[:-1]]))
+        segStarts = np.where(segStart)[0]
+        segLengths = np.diff(np.concatenate([segStarts,[n]]))
+        
+        # Split segments into blocks of up to 127 bytes
+        nblock = (segLengths + 126) // 127
+        blockSeg = np.repeat(np.arange(segStarts.shape[0]),nblock)
+        blockIndex = np.arange(blockSeg.shape[0]) - np.repeat(np.cumsum(nblock)-nblock,nblock)
+        blockStarts = segStarts[blockSeg] + 127*blockIndex
+        blockLengths = np.minimum(segStarts[blockSeg]+segLengths[blockSeg]-blockStarts,127)
+        blockRepeat = repeat[blockStarts]
+        
+        # Output layout: control byte, then either the repeated value or the literal bytes
+        outLengths = np.where(blockRepeat,2,blockLengths+1)
+        outStarts = np.cumsum(outLengths) - outLengths
+        out = np.empty(int(np.sum(outLengths)),dtype=np.uint8)
+        out[outStarts] = np.where(blockRepeat,blockLengths,blockLengths|0x80)
+        out[outStarts[blockRepeat]+1] = d[blockStarts[blockRepeat]]
+        
+        lit = ~blockRepeat
+        litLengths = blockLengths[lit]
+        offset = np.arange(np.sum(litLengths)) - np.repeat(np.cumsum(litLengths)-litLengths,litLengths)
+        out[np.repeat(outStarts[lit]+1,litLengths)+offset] = d[np.repeat(blockStarts[lit],litLengths)+offset]
+        
+        return out.tobytes()
 
     def get_parameter_value(self,paramName):
         #if not self.fileRead:
@@ -583,20 +1200,56 @@ class AmiraMesh(object):
             return None
         return val[0]
         
+    def field_index(self):
+        """
+        Name- and marker-keyed lookup tables for self.fields.
+        Rebuilt when fields are added/removed/renamed through the class methods, or when the field list is replaced or resized.
+        get_field also checks each entry it returns against self.fields, so direct renames and replaced field dicts are picked up
+        """
+        if self.fields is None:
+            return {},{}
+        return self._field_index()[2:4]
+        
+    def _field_index(self):
+        index = getattr(self,'fieldIndex',None)
+        if index is None or index[0] is not self.fields or index[1]!=len(self.fields):
+            byName,byMarker,posName,posMarker = {},{},{},{}
+            for i,f in enumerate(self.fields):
+                # First match takes precedence, as in a linear search
+                if f['name'] not in byName:
+                    byName[f['name']],posName[f['name']] = f,i
+                if f['marker'] not in byMarker:
+                    byMarker[f['marker']],posMarker[f['marker']] = f,i
+            index = (self.fields,len(self.fields),byName,byMarker,{'name':(byName,posName),'marker':(byMarker,posMarker)})
+            self.fieldIndex = index
+        return index
+        
+    def invalidate_field_index(self):
+        self.fieldIndex = None
+        
+    def _lookup_field(self,key,value):
+        # Indexed lookup of the first field with f[key]==value, checked against self.fields in case a field dict has been
+        # renamed or replaced directly (in which case the index is rebuilt)
+        lookup,pos = self._field_index()[4][key]
+        f = lookup.get(value)
+        if f is not None:
+            if self.fields[pos[value]] is f and f[key]==value:
+                return f
+        elif not any(x[key]==value for x in self.fields):
+            return None
+        self.invalidate_field_index()
+        return self._field_index()[4][key][0].get(value)
+        
     def get_field(self,name=None,marker=None):
         #if not self.fileRead:
         #    return None
         
+        if self.fields is None:
+            return None
         if name is not None:
-            val = [x for x in self.fields if x['name']==name]
-            if len(val)==0:
-                return None
-            return val[0]
+            return self._lookup_field('name',name)
         elif marker is not None:
-            val = [x for x in self.fields if x['marker']==marker]
-            if len(val)==0:
-                return None
-            return val[0]
+            return self._lookup_field('marker',marker)
             
     def get_field_names(self):
         return [x['name'] for x in self.fields]
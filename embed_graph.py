@@ -800,10 +800,11 @@ def embed_graph(embedding_resolution=[10.,10.,10.],embedding_dim=[512,512,512],d
             
         embed_count = 0
         gc = sg.get_node_count()
+        offsets = sg.edge_offsets()
         for ei,edge in enumerate(edges):
             x0 = node_coords[edge[0]]
             x1 = node_coords[edge[1]]
-            p0 = np.sum(npts[:ei])
+            p0 = offsets[ei]
             p1 = p0 + npts[ei]
             pts = points[p0:p1] # um
             rads = radii[p0:p1] * radius_scale
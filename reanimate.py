@@ -137,6 +137,9 @@ def export_dat(graph,ofile,network_name='anon',remove_intermediate=True,nbc=2,in
     
     if flow is None:
         flow = np.ones(nseg)
+        
+    if include_length:
+        edge_lengths = graph.get_edge_lengths()
 
     maxEdge = np.max(edgePointCoordinates,axis=0)
     maxVertex = np.max(vertexCoordinates,axis=0)
@@ -181,9 +184,7 @@ def export_dat(graph,ofile,network_name='anon',remove_intermediate=True,nbc=2,in
                 
             # Calculate lengths
             if include_length:
-                i0 = np.sum(nedgePoints[:i])
-                pts = edgePointCoordinates[i0:i0+nedgePoints[i]]
-                length = np.sum([np.linalg.norm(pts[j]-pts[j-1]) for j in range(1,pts.shape[0])])
+                length = edge_lengths[i]
                 handle.write(f"{i+1} {vt} {segnodname1} {segnodname2} {diam} {length} {flow[i]} {0.45}\n")
             else:
                 handle.write(f"{i+1} {vt} {segnodname1} {segnodname2} {diam} {flow[i]} {0.45}\n")
@@ -19,99 +19,111 @@ from matplotlib import pyplot as plt
 import copy
 from itertools import combinations
 
+def index_lookup(keep):
+    """
+    Old-to-new index lookup for deleting the entries flagged False in a boolean keep array (-1 for deleted entries)
+    """
+    keep = np.asarray(keep,dtype='bool')
+    return np.where(keep,np.cumsum(keep)-1,-1)
+
+def _new_labels(graph,data,n,counter):
+    # n new labels, unique with respect to existing labels (data) and the graph's label counter
+    start = getattr(graph,counter) + 1
+    if data.shape[0]>0:
+        start = max(start,int(np.max(data))+1)
+    setattr(graph,counter,start+n-1)
+    return np.arange(start,start+n).astype(data.dtype)
+
 def update_array_index(vals,inds,keep):
     # Updates/offets indices for an array (vals) to exclude values in a flag array (keep)
     # inds: array indices for vals.
     
     # Vertex coords (mx3), connections (nx2), vertex indices to keep (boolean, m)
     
-    # Index vertices to be deleted
-    del_inds = np.where(keep==False)[0]
-    # Total number of vertices, prior to deletion
-    npoints = vals.shape[0]
-    # Indices of all vertices, prior to deletion
-    old_inds = np.linspace(0,npoints-1,npoints,dtype='int')
     # Lookup for vertices, post deletion (-1 corresponds to a deletion)
-    new_inds_lookup = np.zeros(npoints,dtype='int')-1
-    new_inds_lookup[~np.in1d(old_inds,del_inds)] = np.linspace(0,npoints-del_inds.shape[0]-1,npoints-del_inds.shape[0])
+    new_inds_lookup = index_lookup(keep)
     # Create a new index array using updated index lookup table
     if type(inds) is not list and inds.dtype!=object:
         new_inds = new_inds_lookup[inds] 
         # Remove -1 values that reference deleted nodes
-        new_inds = new_inds[(new_inds[:,0]>=0) & (new_inds[:,1]>=0)]
+        new_inds = new_inds[np.all(new_inds>=0,axis=1)]
     else: # Nested list
+        lengths = np.asarray([len(i) for i in inds],dtype='int')
         new_inds = []
-        #valid = np.ones(len(inds),dtype='bool')
-        for i in inds:
-            nxt = new_inds_lookup[i]
-            if np.all(nxt>=0):
-                new_inds.append(nxt)
+        if np.sum(lengths)>0:
+            flat = new_inds_lookup[np.concatenate([np.asarray(i,dtype='int').ravel() for i in inds])]
+            nxt = np.split(flat,np.cumsum(lengths)[:-1])
+            # Entries are valid if none of their indices have been deleted
+            valid = np.ones(lengths.shape[0],dtype='bool')
+            nonempty = lengths>0
+            valid[nonempty] = np.minimum.reduceat(flat,np.concatenate([[0],np.cumsum(lengths)[:-1]])[nonempty])>=0
+            new_inds = [nxt[i] for i in np.where(valid)[0]]
+        else:
+            new_inds = [np.asarray(i,dtype='int') for i in inds]
     
     return vals[keep],new_inds,new_inds_lookup
     
-def delete_vertices(graph,keep_nodes,return_lookup=False,return_keep_edge=False): # #verts,edges,keep_nodes):
-
+def deletion_masks(edgeconn,nedgepoints,keep_nodes):
     """
-    Efficiently delete vertices as flagged by a boolean array (keep_nodes) and update the indexing of an
-    edge (index) array that potentially references those vertices
+    Masks for deleting the nodes flagged False in keep_nodes, along with every edge that contains them.
+    Returns keep masks for edges and edge points, and old-to-new lookups for nodes, edges and points (-1 where deleted)
     """
+    keep_nodes = np.asarray(keep_nodes,dtype='bool')
+    keep_edges = np.all(keep_nodes[edgeconn],axis=1) if edgeconn.shape[0]>0 else np.zeros(0,dtype='bool')
+    keep_points = np.repeat(keep_edges,nedgepoints)
+    return keep_edges,keep_points,index_lookup(keep_nodes),index_lookup(keep_edges),index_lookup(keep_points)
     
-    nodecoords,edgeconn,edgepoints,nedgepoints = graph.get_standard_fields()
-    
-    # Find which edges must be deleted
-    del_node_inds = np.where(keep_nodes==False)[0]
-    del_edges = [np.where((edgeconn[:,0]==i) | (edgeconn[:,1]==i))[0] for i in del_node_inds]
-    # Remove empties (i.e. where the node doesn't appear in any edges)
-    del_edges = [x for x in del_edges if len(x)>0]
-    # Flatten
-    del_edges = [item for sublist in del_edges for item in sublist]
-    # Convert to numpy
-    del_edges = arr(del_edges)
-    # List all edge indices
-    inds = np.linspace(0,edgeconn.shape[0]-1,edgeconn.shape[0],dtype='int')
-    # Define which edge each edgepoint belongs to
-    edge_inds = np.repeat(inds,nedgepoints)
-    # Create a mask of points to keep for edgepoint variables
-    keep_edgepoints = ~np.in1d(edge_inds,del_edges)
-    # Apply mask to edgepoint array
-    edgepoints = edgepoints[keep_edgepoints]
-    # Apply mask to scalars
-    scalars = graph.get_scalars()
-    for scalar in scalars:
-        graph.set_data(scalar['data'][keep_edgepoints],name=scalar['name'])
+def _check_field_sizes(graph,nnode,nedge,npoint):
+    # Fields are subset by definition, so refuse any whose definition is unknown or whose length doesn't match it
+    sizes = {'vertex':nnode,'edge':nedge,'point':npoint}
+    for f in graph.fields:
+        if f['data'] is None:
+            continue
+        size = sizes.get(f['definition'].lower())
+        if size is None:
+            raise ValueError(f"Field {f['name']} has unknown definition '{f['definition']}'")
+        if f['data'].shape[0]!=size:
+            raise ValueError(f"Field {f['name']} has {f['data'].shape[0]} entries, but {f['definition']} has size {size}")
     
-    # Create a mask for removing edge connections and apply to the nedgepoint array
-    keep_edges = np.ones(edgeconn.shape[0],dtype='bool')
-    if len(del_edges)>0:
-        keep_edges[del_edges] = False
-        nedgepoints = nedgepoints[keep_edges]
+def delete_vertices(graph,keep_nodes,return_lookup=False,return_keep_edge=False,return_lookups=False): # #verts,edges,keep_nodes):
+
+    """
+    Efficiently delete vertices as flagged by a boolean array (keep_nodes), along with all edges that contain them.
+    Every VERTEX, EDGE and POINT field is subset and edge connectivity is re-indexed in a single pass.
+    Raises a ValueError (leaving the graph unchanged) if a field has any other definition, or a length that doesn't match
+    its definition.
+    return_lookup returns the node lookup; return_lookups returns old-to-new lookups for nodes, edges and points
+    (-1 for deleted entries)
+    """
     
-    # Remove nodes and update indices
-    nodecoords, edgeconn, edge_lookup = update_array_index(nodecoords,edgeconn,keep_nodes)
+    nodecoords,edgeconn,edgepoints,nedgepoints = graph.get_standard_fields()
+    keep_nodes = np.asarray(keep_nodes,dtype='bool')
+    if keep_nodes.shape[0]!=nodecoords.shape[0]:
+        raise ValueError(f'keep_nodes has {keep_nodes.shape[0]} entries, but the graph has {nodecoords.shape[0]} nodes')
     
-    node_scalars = graph.get_node_scalars()
-    for i,sc in enumerate(node_scalars):
-        graph.set_data(node_scalars[i]['data'][keep_nodes],name=sc['name'])
+    _check_field_sizes(graph,nodecoords.shape[0],edgeconn.shape[0],edgepoints.shape[0])
+    keep_edges,keep_points,node_lookup,edge_lookup,point_lookup = deletion_masks(edgeconn,nedgepoints,keep_nodes)
+    masks = {'vertex':keep_nodes,'edge':keep_edges,'point':keep_points}
     
-    # Update VERTEX definition
-    vertex_def = graph.get_definition('VERTEX')
-    vertex_def['size'] = [nodecoords.shape[0]]
-    # Update EDGE definition
-    edge_def = graph.get_definition('EDGE')
-    edge_def['size'] = [edgeconn.shape[0]]
-    # Update POINT definition
-    edgepoint_def = graph.get_definition('POINT')
-    edgepoint_def['size'] = [edgepoints.shape[0]]
+    for f in graph.fields:
+        if f['data'] is None:
+            continue
+        if f['name']=='EdgeConnectivity':
+            graph.set_data(node_lookup[edgeconn[keep_edges]],name=f['name'])
+            continue
+        graph.set_data(f['data'][masks[f['definition'].lower()]],name=f['name'])
     
-    graph.set_data(nodecoords,name='VertexCoordinates')
-    graph.set_data(edgeconn,name='EdgeConnectivity')
-    graph.set_data(nedgepoints,name='NumEdgePoints')
-    graph.set_data(edgepoints,name='EdgePointCoordinates')
+    # Update definitions
+    graph.set_definition_size('VERTEX',int(np.sum(keep_nodes)))
+    graph.set_definition_size('EDGE',int(np.sum(keep_edges)))
+    graph.set_definition_size('POINT',int(np.sum(keep_points)))
             
     graph.set_graph_sizes()
 
-    if return_lookup:
-        return graph, edge_lookup
+    if return_lookups:
+        return graph, node_lookup, edge_lookup, point_lookup
+    elif return_lookup:
+        return graph, node_lookup
     elif return_keep_edge:
         return graph, keep_edges
     else:
@@ -175,6 +187,27 @@ def split_artery_vein(graph,gfile=None,capillaries=False):
     else:
         return agraph,vgraph
 
+def _undirected_edge_groups(edges):
+    """
+    Group edges by their (unordered) node pair.
+    Returns, for each edge, the index of its group, plus the number of edges in each
+    group and the index of the first edge in each group.
+    """
+    edges = np.asarray(edges,dtype='int64').reshape(-1,2)
+    if edges.shape[0]==0:
+        return np.zeros(0,dtype='int'), np.zeros(0,dtype='int'), np.zeros(0,dtype='int')
+    lo,hi = np.minimum(edges[:,0],edges[:,1]), np.maximum(edges[:,0],edges[:,1])
+    key = lo*(hi.max()+1) + hi
+    _, first, inverse, counts = np.unique(key,return_index=True,return_inverse=True,return_counts=True)
+    return inverse.reshape(-1), counts, first
+
+# Segmented reductions used by SpatialGraph.edge_reduce/node_reduce
+_reduce_ufuncs = {'min':np.minimum, 'max':np.maximum, 'fmin':np.fmin, 'fmax':np.fmax, 'sum':np.add, 'mean':np.add}
+# Reductions equivalent to common numpy functions, when applied to NaN-free data
+_reduce_funcs = {np.nanmax:'max', np.max:'max', np.amax:'max', max:'max',
+                 np.nanmin:'min', np.min:'min', np.amin:'min', min:'min',
+                 np.nanmean:'mean', np.mean:'mean', np.nansum:'sum', np.sum:'sum', sum:'sum'}
+
 def _rotation_matrix_from_vectors(a, b, eps=1e-12):
     """
     Return R such that R @ a == b (approximately), for 3D vectors.
@@ -350,6 +383,180 @@ class SpatialGraph(amiramesh.AmiraMesh):
             
     def print(self):
         self.__repr__()
+        
+    def set_data(self,data,**kwargs):
+        amiramesh.AmiraMesh.set_data(self,data,**kwargs)
+        # Cached topology indices are derived from the graph structure fields
+        f = self.get_field(**kwargs)
+        if f is not None and f['name'] in ['NumEdgePoints','EdgeConnectivity']:
+            self.invalidate_topology_cache()
+            
+    def invalidate_topology_cache(self):
+        """
+        Clear cached topology indices (edge offsets etc.).
+        This happens automatically when NumEdgePoints/EdgeConnectivity are set with set_data, or their arrays are replaced,
+        but needs calling if those arrays are edited in place without set_data
+        """
+        self.topologyCache = {}
+        
+    def _cached_topology(self,key,fieldName,build):
+        # Return a cached value derived from a field's data, rebuilding it if the data array has been replaced
+        data = self.get_data(fieldName)
+        if data is None:
+            return None
+        cache = getattr(self,'topologyCache',None)
+        if cache is None:
+            cache = self.topologyCache = {}
+        entry = cache.get(key)
+        if entry is not None and entry[0] is data and entry[1]==data.shape:
+            return entry[2]
+        value = build(data)
+        cache[key] = (data,data.shape,value)
+        return value
+        
+    def edge_offsets(self):
+        """
+        CSR-style index into edge point arrays: the points of edge i are offsets[i]:offsets[i+1] (length nedge+1).
+        Cached until NumEdgePoints changes
+        """
+        return self._cached_topology('edge_offsets','NumEdgePoints',
+                                     lambda npts: np.concatenate([[0],np.cumsum(npts,dtype='int64')]))
+                                     
+    def adjacency(self):
+        """
+        CSR node-edge incidence structure, cached until EdgeConnectivity changes.
+        Returns (indptr, edges, neighbours, is_start): for node n, entries indptr[n]:indptr[n+1] give each incident edge
+        (in ascending order), the node at its other end, and whether n is the edge's start node (EdgeConnectivity[:,0]).
+        Self-loops appear twice (once as start, once as end)
+        """
+        def build(edgeconn):
+            nedge = edgeconn.shape[0]
+            verts = self.get_data('VertexCoordinates')
+            nnode = 0 if verts is None else verts.shape[0]
+            if nedge>0:
+                nnode = max(nnode,int(np.max(edgeconn))+1)
+            nodes = edgeconn.ravel()
+            order = np.argsort(nodes,kind='stable') # stable, so edges stay in ascending order
+            edges = np.repeat(np.arange(nedge),2)[order]
+            is_start = np.tile([True,False],nedge)[order]
+            neighbours = edgeconn[:,::-1].ravel()[order]
+            indptr = np.concatenate([[0],np.cumsum(np.bincount(nodes,minlength=nnode))])
+            for x in [indptr,edges,neighbours,is_start]:
+                x.setflags(write=False)
+            return indptr,edges,neighbours,is_start
+        return self._cached_topology('adjacency','EdgeConnectivity',build)
+        
+    def _node_incidence(self,index):
+        # Incident edges, neighbouring nodes and start flags for a single node (see adjacency)
+        indptr,edges,neighbours,is_start = self.adjacency()
+        index = int(index)
+        if index<0 or index>=indptr.shape[0]-1:
+            return edges[0:0],neighbours[0:0],is_start[0:0]
+        i0,i1 = indptr[index],indptr[index+1]
+        return edges[i0:i1],neighbours[i0:i1],is_start[i0:i1]
+        
+    def node_edges(self,index):
+        """
+        Unique indices of the edges that contain a node (ascending)
+        """
+        edges,_,_ = self._node_incidence(index)
+        if edges.shape[0]>1 and np.any(edges[1:]==edges[:-1]): # Self-loops
+            edges = np.unique(edges)
+        return edges
+
+    def _segment_reduce(self,data,indptr,op):
+        # Reduce rows of data over the CSR segments indptr[i]:indptr[i+1]. Empty segments are NaN (0 for 'sum')
+        nseg = indptr.shape[0] - 1
+        counts = np.diff(indptr)
+        filled = counts>0
+        shape = (nseg,) + data.shape[1:]
+        if op in ['first','last']:
+            out = np.empty(shape,dtype=data.dtype) if np.all(filled) else np.full(shape,np.nan)
+            inds = indptr[:-1] if op=='first' else indptr[1:] - 1
+            out[filled] = data[inds[filled]]
+            return out
+            
+        if op not in _reduce_ufuncs:
+            raise ValueError(f'Unknown reduction: {op}')
+        ufunc = _reduce_ufuncs[op]
+        if op in ['sum','mean']:
+            out = np.zeros(shape,dtype='float')
+        elif np.all(filled):
+            out = np.empty(shape,dtype=data.dtype)
+        else:
+            out = np.full(shape,np.nan)
+        if np.any(filled):
+            # Empty segments start where the next one does, so can simply be left out
+            out[filled] = ufunc.reduceat(data,indptr[:-1][filled],axis=0)
+        if op=='mean':
+            out[filled] /= counts[filled].reshape((-1,)+(1,)*(data.ndim-1))
+            out[~filled] = np.nan
+        return out
+        
+    def edge_reduce(self,data,op='mean'):
+        """
+        Reduce edge point data (one entry, or row, per edge point) to one value per edge.
+        op is one of 'min', 'max', 'mean', 'sum', 'first' or 'last'.
+        Edges with no points are set to NaN (0 for 'sum')
+        """
+        data = arr(data)
+        offsets = self.edge_offsets()
+        if data.shape[0]!=offsets[-1]:
+            raise ValueError(f'Expected {offsets[-1]} edge point values, got {data.shape[0]}')
+        return self._segment_reduce(data,offsets,op)
+        
+    def node_reduce(self,data,op='max',default=np.nan):
+        """
+        Reduce edge data (one entry, or row, per edge) to one value per node, over the edges that each node belongs to.
+        op is one of 'min', 'max', 'mean', 'sum', 'first' or 'last' ('first'/'last' take the lowest/highest index edge).
+        NaN edge values are ignored; nodes with no (non-NaN) edge values are set to default
+        """
+        data = arr(data,dtype='float')
+        if data.shape[0]!=self.nedge:
+            raise ValueError(f'Expected {self.nedge} edge values, got {data.shape[0]}')
+        indptr,edges,_,_ = self.adjacency()
+        nnode = min(self.nnode,indptr.shape[0]-1)
+        indptr = indptr[:nnode+1]
+        vals = data[edges[:indptr[-1]]]
+        
+        if op in ['min','max']:
+            # fmin/fmax ignore NaN
+            out = self._segment_reduce(vals,indptr,'f'+op)
+        elif op in ['sum','mean']:
+            valid = ~np.isnan(vals)
+            out = self._segment_reduce(np.where(valid,vals,0.),indptr,'sum')
+            counts = self._segment_reduce(valid.astype('float'),indptr,'sum')
+            if op=='mean':
+                out = np.divide(out,counts,out=np.full(out.shape,np.nan),where=counts>0)
+            out[counts==0] = np.nan
+        else:
+            out = self._segment_reduce(vals,indptr,op)
+            
+        result = np.full((self.nnode,)+data.shape[1:],default,dtype='float')
+        result[:nnode] = np.where(np.isnan(out),default,out)
+        return result
+        
+    def reduce_point_scalars(self,names=None,op='mean',node_op=None,default=np.nan):
+        """
+        Reduce several point scalar fields in one pass.
+        Returns a dictionary of per-edge values (reduced with op) or, if node_op is given, per-node values
+        (per-edge values reduced again over each node's edges with node_op)
+        """
+        if names is None:
+            names = [x['name'] for x in self.get_scalars()]
+        elif isinstance(names,str):
+            names = [names]
+        fields = [self.get_data(n) for n in names]
+        names = [n for n,f in zip(names,fields) if f is not None]
+        fields = [f for f in fields if f is not None]
+        if len(fields)==0:
+            return {}
+            
+        data = np.column_stack([arr(f,dtype='float') for f in fields])
+        res = self.edge_reduce(data,op=op)
+        if node_op is not None:
+            res = self.node_reduce(res,op=node_op,default=default)
+        return dict([(n,res[:,i]) for i,n in enumerate(names)])
 
     def add_edgepoint_field(self,name,vals):
         marker = self.generate_next_marker()
@@ -466,10 +673,12 @@ class SpatialGraph(amiramesh.AmiraMesh):
         
     def read(self,*args,**kwargs):
         """
-        Read spatial graph from .am Amira (or JSON) file
+        Read spatial graph from .am Amira (or JSON, or npz/hdf5/zarr - see save) file
         """
         if args[0].endswith('.json'):
             self.read_json(args[0])
+        elif os.path.splitext(args[0].rstrip('/\\'))[1].lower() in ['.npz','.h5','.hdf5','.zarr']:
+            return self.load(args[0])
         else:
             if not amiramesh.AmiraMesh.read(self,*args,**kwargs):
                 return False
@@ -478,7 +687,14 @@ class SpatialGraph(amiramesh.AmiraMesh):
                 pass
 
         self.set_graph_sizes()
+        self.set_label_counters()
+                
+        return True
         
+    def set_label_counters(self):
+        """
+        Set the next available node/edge/point labels from any label fields
+        """
         node_labels = self.get_data('NodeLabel')
         if node_labels is None:
             self.node_label_counter = self.nnode
@@ -496,7 +712,146 @@ class SpatialGraph(amiramesh.AmiraMesh):
             self.point_label_counter = self.nedgepoint
         else:
             self.point_label_counter = np.max(point_labels) + 1
+        
+    @staticmethod
+    def probe(path,quiet=True):
+        """
+        Cheaply summarise a spatial graph .am file from its header alone (the data section is never read).
+        Returns a dictionary of graph sizes, fields, parameters and bounding box (None if not in the header)
+        """
+        graph = SpatialGraph()
+        graph.read_header(path,quiet=quiet)
+        graph.set_graph_sizes()
+        
+        return {'filename':path,
+                'fileType':graph.fileType,
+                'nnode':getattr(graph,'nnode',None),
+                'nedge':getattr(graph,'nedge',None),
+                'nedgepoint':getattr(graph,'nedgepoint',None),
+                'definitions':{x['name']:x['size'] for x in graph.definitions},
+                'fields':[{'name':x['name'],'definition':x['definition'],'type':x['type'],
+                           'shape':x['shape'],'encoding':x['encoding']} for x in graph.fields],
+                'parameters':{x['parameter']:x['value'] for x in graph.parameters},
+                'BoundingBox':graph.get_parameter_value('BoundingBox'),
+               }
+               
+    def _storage_format(self,path,format=None):
+        if format is None:
+            ext = os.path.splitext(path.rstrip('/\\'))[1].lower()
+            if ext in ['.h5','.hdf5']:
+                format = 'hdf5'
+            elif ext=='.zarr':
+                format = 'zarr'
+            else:
+                format = 'npz'
+        format = format.lower()
+        if format=='h5':
+            format = 'hdf5'
+        if format not in ['npz','hdf5','zarr']:
+            raise Exception(f'Unsupported storage format: {format}')
+        return format
+               
+    def save(self,path,format=None,compression_level=4):
+        """
+        Save the graph in a compressed columnar format ('npz', 'hdf5' or 'zarr'; inferred from the file extension if not given).
+        Each field is stored as a typed array, alongside the definitions and parameters (as JSON), so that
+        conversion to and from .am files is lossless. HDF5 and zarr arrays are chunked, so subsets of fields can be loaded cheaply.
+        """
+        import json
+        
+        format = self._storage_format(path,format=format)
+        
+        def to_list(v):
+            if isinstance(v,np.ndarray):
+                return v.tolist()
+            elif isinstance(v,np.generic):
+                return v.item()
+            elif isinstance(v,(list,tuple)):
+                return [to_list(x) for x in v]
+            return v
+        
+        header = {'fileType':self.fileType,
+                  'definitions':[{'name':d['name'],'size':to_list(d['size'])} for d in self.definitions],
+                  'parameters':[{'parameter':p['parameter'],'value':to_list(p['value'])} for p in self.parameters],
+                  'fields':[{'name':f['name'],'marker':f['marker'],'definition':f['definition'],'type':str(f['type']),
+                             'encoding':f['encoding'],'encoding_length':to_list(f['encoding_length']),
+                             'nelements':int(f['nelements']),'nentries':to_list(f['nentries']),'shape':to_list(f['shape'])} 
+                            for f in self.fields if f['data'] is not None],
+                 }
+        header = json.dumps(header)
+        fields = [f for f in self.fields if f['data'] is not None]
+        
+        if format=='npz':
+            data = {f'field{i}':np.asarray(f['data']) for i,f in enumerate(fields)}
+            np.savez_compressed(path,header=np.asarray(header),**data)
+        elif format=='hdf5':
+            import h5py
+            with h5py.File(path,'w') as h:
+                h.attrs['header'] = header
+                grp = h.create_group('fields')
+                for f in fields:
+                    data = np.asarray(f['data'])
+                    grp.create_dataset(f['name'],data=data,chunks=True if data.size>0 else None,
+                                       compression='gzip',compression_opts=compression_level,shuffle=True)
+        elif format=='zarr':
+            import zarr
+            grp = zarr.open_group(path,mode='w')
+            grp.attrs['header'] = header
+            for f in fields:
+                data = np.asarray(f['data'])
+                if hasattr(grp,'create_array'): # zarr>=3
+                    grp.create_array(f['name'],data=data)
+                else:
+                    grp.create_dataset(f['name'],data=data)
+                    
+    def load(self,path,format=None,fields=None):
+        """
+        Load a graph saved with save(). If a list of field names is provided, only those fields are loaded
+        (the four graph structure fields are always loaded)
+        """
+        import json
+        
+        format = self._storage_format(path,format=format)
+        
+        if fields is not None:
+            fields = list(set(['VertexCoordinates','EdgeConnectivity','NumEdgePoints','EdgePointCoordinates'] + list(fields)))
+        
+        if format=='npz':
+            store = np.load(path)
+            header = json.loads(str(store['header']))
+            get = lambda i,name: store[f'field{i}']
+        elif format=='hdf5':
+            import h5py
+            store = h5py.File(path,'r')
+            header = json.loads(store.attrs['header'])
+            get = lambda i,name: store['fields'][name][()]
+        elif format=='zarr':
+            import zarr
+            store = zarr.open_group(path,mode='r')
+            header = json.loads(store.attrs['header'])
+            get = lambda i,name: store[name][...]
+            
+        try:
+            self.fileType = header['fileType']
+            self.definitions = header['definitions']
+            self.parameters = header['parameters']
+            self.fields = []
+            for i,f in enumerate(header['fields']):
+                if fields is not None and f['name'] not in fields:
+                    continue
+                f['data'] = np.asarray(get(i,f['name']))
+                self.fields.append(f)
+        finally:
+            if format in ['npz','hdf5']:
+                store.close()
                 
+        self.fieldNames = [x['name'] for x in self.fields]
+        self.filename = path
+        self.fileRead = True
+        
+        self.set_graph_sizes()
+        self.set_label_counters()
+        
         return True
             
     def remove_edges(self,edge_inds_to_remove):
@@ -1104,10 +1459,8 @@ class SpatialGraph(amiramesh.AmiraMesh):
                 
     def read_json(self,filename):
     
-        import json
-        
-        with open(filename, 'r') as json_file:
-            data = json.load(json_file)
+        # Arrays are parsed directly into numpy (including base64/binary sidecar arrays from write_json)
+        data = self.read_json_arrays(filename)
             
         req = ['VertexCoordinates','EdgeConnectivity','NumEdgePoints','EdgePointCoordinates']
         if not np.all([x in list(data.keys()) for x in req]):
@@ -1156,6 +1509,7 @@ class SpatialGraph(amiramesh.AmiraMesh):
             
         self.fields[ind]['name'] = new_name
         self.fieldNames[ind] = new_name
+        self.invalidate_field_index()
         
     def set_graph_sizes(self,labels=False):
         """
@@ -1458,33 +1812,24 @@ class SpatialGraph(amiramesh.AmiraMesh):
         return [rx,ry,rz]
         
     def edge_point_index(self):
+        """
+        Index of the edge that each edge point belongs to (length nedgepoint).
+        Cached (read-only) until NumEdgePoints changes
+        """
+        def build(nedgepoint):
+            edgeInd = np.repeat(np.arange(nedgepoint.shape[0]),nedgepoint)
+            edgeInd.setflags(write=False)
+            return edgeInd
+        return self._cached_topology('edge_point_index','NumEdgePoints',build)
         
-        coords = self.get_data('EdgePointCoordinates')
-        nedgepoint = self.get_data('NumEdgePoints')
-        npoint = coords.shape[0]
-        edgeInd = np.zeros(npoint,dtype='int') - 1
-
-        cntr = 0
-        curN = nedgepoint[0]
-        j = 0
-        for i in range(npoint):
-            edgeInd[i] = j
-            cntr += 1
-            if cntr>=curN:
-                cntr = 0
-                j += 1
-                if j<nedgepoint.shape[0]:
-                    curN = nedgepoint[j]
-                elif i!=npoint-1:
-                    import pdb
-                    pdb.set_trace()
-                
-        return edgeInd
-        
-    def constrain_nodes(self,xrange=[None,None],yrange=[None,None],zrange=[None,None],no_copy=True,keep_stradling_edges=False):
+    def constrain_nodes(self,xrange=[None,None],yrange=[None,None],zrange=[None,None],no_copy=True,keep_stradling_edges=False,clip_edges=False):
     
         """
-        Delete all nodes outside a rectangular region
+        Delete all nodes outside a rectangular region (unset limits default to the node extent).
+        keep_stradling_edges keeps edges with one node inside the region, along with their outside node.
+        clip_edges instead cuts these edges where they first cross the region boundary, adding a new node at each cut
+        (float point fields, including edge point coordinates, are interpolated at the cut; other point fields take the
+        value of the last point inside, and vertex fields of the new nodes that of the outside node they replace)
         """
         
         assert len(xrange)==2
@@ -1497,58 +1842,111 @@ class SpatialGraph(amiramesh.AmiraMesh):
             graph = self
 
         nodeCoords = graph.get_data('VertexCoordinates')
-        nnode = len(nodeCoords)
         
         # Spatial extent of nodes
-        r = self.node_spatial_extent()
-
-        # Locate nodes outside of ranges
-        if xrange[1] is None:
-            xrange[1] = r[0][1]
-        if yrange[1] is None:
-            yrange[1] = r[1][1]
-        if zrange[1] is None:
-            zrange[1] = r[2][1]
-        xrange = [np.max([r[0][0],xrange[0]]),np.min([r[0][1],xrange[1]])]
-        yrange = [np.max([r[1][0],yrange[0]]),np.min([r[1][1],yrange[1]])]
-        zrange = [np.max([r[2][0],zrange[0]]),np.min([r[2][1],zrange[1]])]
+        r = graph.node_spatial_extent()
+        ranges = [xrange,yrange,zrange]
+        lo = arr([r[i][0] if x[0] is None else np.max([r[i][0],x[0]]) for i,x in enumerate(ranges)])
+        hi = arr([r[i][1] if x[1] is None else np.min([r[i][1],x[1]]) for i,x in enumerate(ranges)])
         
         # Mark which nodes to keep / delete
-        keepNode = np.ones(nnode,dtype='bool')
-        for i in range(nnode):
-            x,y,z = nodeCoords[i,:]
-            if x<xrange[0] or x>xrange[1] or y<yrange[0] or y>yrange[1] or z<zrange[0] or z>zrange[1]:
-                keepNode[i] = False
+        keepNode = np.all((nodeCoords>=lo) & (nodeCoords<=hi),axis=1)
                 
-        # Keep edges that straddle the boundary
-        if keep_stradling_edges:
-            keepNodeEdit = keepNode.copy()
-            ec = self.get_data('EdgeConnectivity')
-            ch = 0
-            for i,kn in enumerate(keepNode):
-                if kn==True:
-                    conns = np.empty([0])
-                    inds0 = np.where(ec[:,0]==i)
-                    if len(inds0[0])>0:
-                        conns = np.concatenate([conns,ec[inds0[0],1]])
-                    inds1 = np.where(ec[:,1]==i)
-                    if len(inds1[0])>0:
-                        conns = np.concatenate([conns,ec[inds1[0],0]])
-                    conns = conns.astype('int')
-                    if np.any(keepNode[conns]==False):
-                        keepNodeEdit[conns] = True
-                        ch += 1
-            if ch>0:
-                keepNode = keepNodeEdit
+        if clip_edges:
+            keepNode = graph._clip_straddling_edges(keepNode,lo,hi)
+        elif keep_stradling_edges:
+            # Keep edges that straddle the boundary
+            ec = graph.get_data('EdgeConnectivity')
+            straddle = keepNode[ec[:,0]]!=keepNode[ec[:,1]]
+            keepNode = keepNode.copy()
+            keepNode[ec[straddle].ravel()] = True
                 
-        nodes_to_delete = np.where(keepNode==False)
-        nodes_to_keep = np.where(keepNode==True)
-        if len(nodes_to_keep[0])==0:
+        if not np.any(keepNode):
             print('No nodes left!')
             return
         
-        editor = Editor()
-        return editor.delete_nodes(self,nodes_to_delete[0])
+        return delete_vertices(graph,keepNode)
+        
+    def _clip_straddling_edges(self,keepNode,lo,hi):
+        # Cut edges with one node inside the box lo-hi (flagged in keepNode) where they first leave it, adding a new
+        # node at each cut in place of the outside node. Returns keepNode extended to cover the new nodes
+        nodeCoords,ec,points,nedgepoints = self.get_standard_fields()
+        straddle = np.where(keepNode[ec[:,0]]!=keepNode[ec[:,1]])[0]
+        nstr = straddle.shape[0]
+        if nstr==0:
+            return keepNode
+            
+        offsets = self.edge_offsets()
+        edge_index = self.edge_point_index()
+        fwd = keepNode[ec[straddle,0]] # inside node is the start node
+        n = nedgepoints[straddle]
+        
+        # First point outside the box on each straddling edge, counting from the inside node
+        str_number = np.zeros(self.nedge,dtype='int') - 1
+        str_number[straddle] = np.arange(nstr)
+        pts = np.where(str_number[edge_index]>=0)[0]
+        s = str_number[edge_index[pts]]
+        j = pts - offsets[edge_index[pts]]
+        jo = np.where(fwd[s],j,n[s]-1-j)
+        outside = np.any((points[pts]<lo) | (points[pts]>hi),axis=1)
+        k = np.minimum.reduceat(np.where(outside,jo,n[s]),np.concatenate([[0],np.cumsum(n)[:-1]]))
+        k = np.clip(k,1,n-1)
+        
+        # Interpolate between the last inside point (ia) and the first outside point (ib)
+        ia = offsets[straddle] + np.where(fwd,k-1,n-k)
+        ib = offsets[straddle] + np.where(fwd,k,n-k-1)
+        pa,pb = points[ia].astype('float'),points[ib].astype('float')
+        d = pb - pa
+        with np.errstate(divide='ignore',invalid='ignore'):
+            t = np.where(pb>hi,(hi-pa)/d,np.where(pb<lo,(lo-pa)/d,np.inf))
+        t[np.isnan(t)] = np.inf
+        t = np.clip(np.min(t,axis=1),0.,1.)
+        cut = pa + t[:,None]*d
+        
+        # New point order: drop points beyond the cut and insert the cut point, sorted by (edge, position in edge)
+        keep_pt = np.ones(points.shape[0],dtype='bool')
+        keep_pt[pts] = jo<k[s]
+        src = np.concatenate([np.where(keep_pt)[0],points.shape[0]+np.arange(nstr)])
+        pos = np.concatenate([(np.arange(points.shape[0])-offsets[edge_index])[keep_pt],np.where(fwd,k,n-k-1)])
+        edge_of = np.concatenate([edge_index[keep_pt],straddle])
+        order = src[np.lexsort((pos,edge_of))]
+        
+        npoint = points.shape[0]
+        for f in self.fields:
+            data = f['data']
+            if data is None or f['definition'].lower()!='point' or data.shape[0]!=npoint:
+                continue
+            if f['name']=='EdgePointCoordinates':
+                vals = cut
+            elif data.dtype.kind=='f':
+                # Interpolate each row (multi-component fields too)
+                tr = t.reshape((nstr,)+(1,)*(data.ndim-1))
+                vals = data[ia] + tr*(data[ib]-data[ia])
+            else:
+                vals = data[ia]
+            self.set_data(np.concatenate([data,vals.astype(data.dtype)])[order],name=f['name'])
+        nedgepoints = nedgepoints.copy()
+        nedgepoints[straddle] = k + 1
+        self.set_data(nedgepoints,name='NumEdgePoints')
+        
+        # New nodes at the cuts replace the outside nodes (whose node scalars they inherit)
+        nnode = nodeCoords.shape[0]
+        outside_node = np.where(fwd,ec[straddle,1],ec[straddle,0])
+        ec = ec.copy()
+        ec[straddle,np.where(fwd,1,0)] = nnode + np.arange(nstr)
+        self.set_data(ec,name='EdgeConnectivity')
+        for f in self.fields:
+            data = f['data']
+            if data is None or f['definition'].lower()!='vertex' or data.shape[0]!=nnode:
+                continue
+            vals = cut.astype(data.dtype) if f['name']=='VertexCoordinates' else data[outside_node]
+            self.set_data(np.concatenate([data,vals]),name=f['name'])
+            
+        self.set_definition_size('VERTEX',nnode+nstr)
+        self.set_definition_size('POINT',order.shape[0])
+        self.set_graph_sizes()
+        
+        return np.concatenate([keepNode,np.ones(nstr,dtype='bool')])
         
     def crop(self,*args,**kwargs):
         """
@@ -1557,6 +1955,127 @@ class SpatialGraph(amiramesh.AmiraMesh):
         """
         return self.constrain_nodes(*args,**kwargs)
         
+    def batch_edit(self):
+        """
+        Start a set of topology edits that are applied together in one pass (see GraphEdit), e.g.
+        with graph.batch_edit() as tx: tx.delete_node(3)
+        """
+        return GraphEdit(self)
+        
+    def edge_subgraph(self,edges,return_lookup=False):
+        """
+        New graph containing the given edges and the nodes they connect, leaving this graph unchanged.
+        All vertex, edge and point fields are subset to match; label counters are carried over so that new labels
+        stay unique across the source graph.
+        If return_lookup, also returns the source indices of the new graph's nodes and edges
+        """
+        edges = np.sort(arr(edges,dtype='int').ravel())
+        ec = self.get_data('EdgeConnectivity')
+        nedgepoints = self.get_data('NumEdgePoints')
+        offsets = self.edge_offsets()
+        
+        nodes = np.unique(ec[edges])
+        lookup = np.zeros(self.nnode,dtype=ec.dtype) - 1
+        lookup[nodes] = np.arange(nodes.shape[0])
+        
+        # Edge point indices for the selected edges, in order
+        n = nedgepoints[edges]
+        starts = np.concatenate([[0],np.cumsum(n)[:-1]]).astype('int64')
+        points = np.arange(np.sum(n),dtype='int64') + np.repeat(offsets[edges]-starts,n)
+        
+        graph = SpatialGraph()
+        graph.parameters = copy.deepcopy(self.parameters)
+        graph.definitions = copy.deepcopy(self.definitions)
+        graph.header = copy.deepcopy(self.header)
+        graph.fieldNames = copy.deepcopy(self.fieldNames)
+        graph.fileType = self.fileType
+        graph.filename = self.filename
+        
+        graph.fields = []
+        for f in self.fields:
+            fcopy = f.copy()
+            graph.fields.append(fcopy)
+            data = f['data']
+            if data is None:
+                continue
+            definition = f['definition'].lower()
+            if f['name']=='EdgeConnectivity':
+                data = lookup[data[edges]]
+            elif definition=='vertex':
+                data = data[nodes]
+            elif definition=='edge':
+                data = data[edges]
+            elif definition=='point':
+                data = data[points]
+            graph.set_data(data,name=f['name'])
+            
+        graph.set_definition_size('VERTEX',nodes.shape[0])
+        graph.set_definition_size('EDGE',edges.shape[0])
+        graph.set_definition_size('POINT',points.shape[0])
+        graph.set_graph_sizes()
+        graph.node_label_counter = self.node_label_counter
+        graph.edge_label_counter = self.edge_label_counter
+        graph.point_label_counter = self.point_label_counter
+        
+        if return_lookup:
+            return graph, nodes, edges
+        return graph
+        
+    def tile(self,grid_shape=None,tile_size=None,overlap=0.,skip_empty=True):
+        """
+        Split the graph into a regular grid of tiles, given either the number of tiles along each axis (grid_shape)
+        or the size of each tile (tile_size). The grid starts at the lower corner of the graph extent.
+        Each edge is included (whole) in every tile that contains one or more of its edge points, with tiles expanded
+        by overlap on every side.
+        Edge points are binned to tiles in one pass; the tile graphs (see edge_subgraph) are then built lazily, so this
+        is a generator yielding (tile_index, tile_extent, graph) with tile_index = (i,j,k) and
+        tile_extent = [[x0,x1],[y0,y1],[z0,z1]] (excluding overlap)
+        """
+        if grid_shape is None and tile_size is None:
+            raise ValueError('Either grid_shape or tile_size must be given')
+            
+        points = self.get_data('EdgePointCoordinates')
+        nodes = self.get_data('VertexCoordinates')
+        lo = np.minimum(np.min(points,axis=0),np.min(nodes,axis=0)).astype('float')
+        hi = np.maximum(np.max(points,axis=0),np.max(nodes,axis=0)).astype('float')
+        
+        if grid_shape is not None:
+            grid_shape = np.broadcast_to(arr(grid_shape,dtype='int'),(3,))
+            tile_size = (hi-lo) / grid_shape
+            tile_size[tile_size==0] = 1.
+        else:
+            tile_size = np.broadcast_to(arr(tile_size,dtype='float'),(3,))
+            grid_shape = np.maximum(np.ceil((hi-lo)/tile_size).astype('int'),1)
+        overlap = np.broadcast_to(arr(overlap,dtype='float'),(3,))
+        
+        # Range of tiles each point falls in (more than one with overlap)
+        i0 = np.clip(np.floor((points-lo-overlap)/tile_size).astype('int'),0,grid_shape-1)
+        i1 = np.clip(np.floor((points-lo+overlap)/tile_size).astype('int'),0,grid_shape-1)
+        span = np.max(i1-i0,axis=0) + 1
+        
+        # Unique (tile,edge) pairs, sorted by tile then edge
+        edge_index = self.edge_point_index()
+        ntile = int(np.prod(grid_shape))
+        keys = []
+        for di in range(span[0]):
+            for dj in range(span[1]):
+                for dk in range(span[2]):
+                    ind = i0 + arr([di,dj,dk])
+                    valid = np.all(ind<=i1,axis=1)
+                    tile = np.ravel_multi_index(ind[valid].T,grid_shape)
+                    keys.append(tile.astype('int64')*self.nedge + edge_index[valid])
+        keys = np.unique(np.concatenate(keys))
+        tiles,edges = keys // max(self.nedge,1), keys % max(self.nedge,1)
+        bounds = np.searchsorted(tiles,np.arange(ntile+1))
+        
+        for t in range(ntile):
+            if skip_empty and bounds[t]==bounds[t+1]:
+                continue
+            index = np.unravel_index(t,grid_shape)
+            x0 = lo + arr(index)*tile_size
+            extent = [[x0[i],x0[i]+tile_size[i]] for i in range(3)]
+            yield tuple(int(i) for i in index), extent, self.edge_subgraph(edges[bounds[t]:bounds[t+1]])
+        
     def remove_field(self,fieldName):
         """
         Remove a data field from the graph
@@ -1567,6 +2086,7 @@ class SpatialGraph(amiramesh.AmiraMesh):
             return
         _  = self.fields.pop(f[0][0])
         _  = self.fieldNames.pop(f[0][0])
+        self.invalidate_field_index()
         
     def get_node(self,index):
         """
@@ -1582,30 +2102,22 @@ class SpatialGraph(amiramesh.AmiraMesh):
         
     def edge_index_from_point(self,pointIndex):
         """
-        Given the index of an edge point, returns the edge index that it is part of
+        Given the index of an edge point (or an array of indices), returns the edge index that it is part of.
+        Out of range point indices return -1
         """
-        nEdgePoint = self.get_data('NumEdgePoints')
-        nEdgePointCum = np.cumsum(nEdgePoint)
-        wh = np.where(nEdgePointCum<=pointIndex)
-        try:
-            if wh[0].shape==(0,):
-                return 0
-            else:
-                return np.max(wh)
-        except Exception as e:
-            print(e)
-            import pdb
-            pdb.set_trace()
+        offsets = self.edge_offsets()
+        pointIndex = np.asarray(pointIndex)
+        edgeInd = np.searchsorted(offsets,pointIndex,side='right') - 1
+        edgeInd = np.where((pointIndex<0) | (pointIndex>=offsets[-1]),-1,edgeInd)
+        if edgeInd.ndim==0:
+            return int(edgeInd)
+        return edgeInd
         
     def edgepoint_edge_indices(self):
         """
-        Creates an array relating edgepoints to the index of the edge that they're from
+        Creates an array relating edgepoints to the index of the edge that they're from (see edge_point_index)
         """
-        edgeconn = self.get_data('EdgeConnectivity')
-        nedge = edgeconn.shape[0]
-        nEdgePoint = self.get_data('NumEdgePoints')
-        conn_inds = np.linspace(0,nedge-1,nedge,dtype='int')
-        return np.repeat(conn_inds,nEdgePoint)
+        return self.edge_point_index()
         
     def get_edges_containing_node(self,node_inds,mode='or'):
         """
@@ -1613,6 +2125,9 @@ class SpatialGraph(amiramesh.AmiraMesh):
         """
         edgeconn = self.get_data('EdgeConnectivity')
         if mode=='or':
+            if np.ndim(node_inds)==0:
+                # Single node - look up in the incidence structure
+                return self.node_edges(node_inds).copy()
             return np.where(np.in1d(edgeconn[:,0],node_inds) | np.in1d(edgeconn[:,1],node_inds))[0]
         elif mode=='and':
             return np.where(np.in1d(edgeconn[:,0],node_inds) & np.in1d(edgeconn[:,1],node_inds))[0]
@@ -1637,12 +2152,25 @@ class SpatialGraph(amiramesh.AmiraMesh):
         This helper function looks through several common options and returns the first that matches (all converted to lower case)
         NOTE: Diameter is also in the lookup list!
         """
+        # The resolved field is cached until a field is added, removed, renamed or replaced
+        if self.fields is None:
+            return None
+        key = tuple((id(f),f['name']) for f in self.fields)
+        cache = getattr(self,'radiusFieldCache',None)
+        if cache is not None and cache[0]==key:
+            return cache[1]
+        
         names = ['radius','radii','diameter','diameters','thickness']
+        lowerNames = {}
+        for field in self.fields:
+            lowerNames.setdefault(field['name'].lower(),field)
+        radiusField = None
         for name in names:
-            match = [self.fields[i] for i,field in enumerate(self.fieldNames) if field.lower()==name.lower()]
-            if len(match)>0:
-                return match[0]
-        return None
+            if name in lowerNames:
+                radiusField = lowerNames[name]
+                break
+        self.radiusFieldCache = (key,radiusField)
+        return radiusField
         
     def get_radius_field_name(self):
         f = self.get_radius_field()
@@ -1670,7 +2198,7 @@ class SpatialGraph(amiramesh.AmiraMesh):
         assert edgeIndex<nedge
         #chase
         npoints = nedgepoints[edgeIndex]
-        start_index = np.sum(nedgepoints[:edgeIndex])
+        start_index = self.edge_offsets()[edgeIndex]
         end_index = start_index + npoints
         
         return [start_index,end_index]
@@ -1678,7 +2206,7 @@ class SpatialGraph(amiramesh.AmiraMesh):
     def check_for_degenerate_edges(self):
 
         edgeconn = self.get_data('EdgeConnectivity')
-        un,cn = np.unique(edgeconn,axis=0,return_counts=True)
+        _,cn,_ = _undirected_edge_groups(edgeconn)
         if np.any(cn>1):
             return True
         else:
@@ -1832,13 +2360,10 @@ class SpatialGraph(amiramesh.AmiraMesh):
     def connected_nodes(self,index, return_edges=True):
         # Return all nodes connected to a supplied node index, 
         # along with the edge indices they are connected by
-        vertCoords = self.get_data('VertexCoordinates')
-        edgeconn = self.get_data('EdgeConnectivity')
-        
-        conn_edges = self.get_edges_containing_node(index)
-        end_nodes = edgeconn[conn_edges]
-        # Remove the current (source) node from the end node list
-        end_nodes = arr([e[e!=index] for e in end_nodes]).flatten()
+        edges,neighbours,_ = self._node_incidence(index)
+        conn_edges = self.node_edges(index).copy()
+        # Remove the current (source) node from the end node list (i.e. self-loops)
+        end_nodes = neighbours[neighbours!=index].copy()
 
         if return_edges:
             return end_nodes, conn_edges
@@ -1875,25 +2400,65 @@ class SpatialGraph(amiramesh.AmiraMesh):
         
     def get_edge_lengths(self,node=False):
     
+        if node==False:
+            return self.edge_geometry(radius=False)['length']
+            
         edgeconn = self.get_data('EdgeConnectivity') 
-        nedgepoints = self.get_data('NumEdgePoints')
-        edgeCoords = self.get_data('EdgePointCoordinates')
         nodes = self.get_data('VertexCoordinates')
-        
-        lengths = np.zeros(self.nedge)
-        
-        if node==False:
-            for i in range(self.nedge):
-                x0 = np.sum(nedgepoints[:i])
-                npts = nedgepoints[i]
-                pts = edgeCoords[x0:x0+npts]
-                lengths[i] = np.sum(np.linalg.norm(pts[:-1]-pts[1:],axis=1))
-        else:
-            edge_nodes = nodes[edgeconn]
-            lengths = np.linalg.norm(edge_nodes[:,1]-edge_nodes[:,0],axis=1)
+        edge_nodes = nodes[edgeconn]
+        lengths = np.linalg.norm(edge_nodes[:,1]-edge_nodes[:,0],axis=1)
             
         return lengths
         
+    def edge_geometry(self,radius=True):
+        """
+        Per-edge geometry, computed in one pass over the edge points. Returns a dictionary of arrays (one entry per edge):
+        length (polyline length), chord (straight-line distance between the first and last points), tortuosity (chord/length),
+        and, if a radius field is present (and radius=True), volume (sum of pi*r^2*ds, using the radius at the start of each segment)
+        and mean_radius, min_radius and max_radius
+        """
+        points = self.get_data('EdgePointCoordinates')
+        offsets = self.edge_offsets()
+        npts = np.diff(offsets)
+        
+        # Segment lengths, stored against each segment's first point (zero for the last point on each edge)
+        ds = np.zeros(points.shape[0])
+        if points.shape[0]>1:
+            ds[:-1] = np.linalg.norm(points[1:]-points[:-1],axis=1)
+        ds[offsets[1:][npts>0]-1] = 0.
+        
+        rads = self.get_radius_data() if radius else None
+        if rads is None:
+            length = self.edge_reduce(ds,op='sum')
+        else:
+            sums = self.edge_reduce(np.column_stack([ds,np.pi*np.square(rads)*ds]),op='sum')
+            length = sums[:,0]
+        
+        chord = np.zeros(self.nedge)
+        has_pts = npts>0
+        chord[has_pts] = np.linalg.norm(points[offsets[1:][has_pts]-1]-points[offsets[:-1][has_pts]],axis=1)
+        tortuosity = np.divide(chord,length,out=np.full(self.nedge,np.nan),where=length>0)
+        
+        res = {'length':length, 'chord':chord, 'tortuosity':tortuosity}
+        if rads is not None:
+            res['volume'] = sums[:,1]
+            for op in ['mean','min','max']:
+                res[op+'_radius'] = self.edge_reduce(rads,op=op)
+        return res
+        
+    def spatial_index(self):
+        """
+        KD-tree spatial index over edge points and segments (see SpatialIndex), for nearest-vessel, radius and box queries.
+        Cached until the edge point coordinates, NumEdgePoints or the radius field are replaced
+        """
+        radii = self.get_radius_data()
+        index = self._cached_topology('spatial_index','EdgePointCoordinates',
+                                      lambda points: SpatialIndex(points,self.edge_offsets(),radii=radii))
+        if index is not None and (index.radii is not radii or index.offsets is not self.edge_offsets()):
+            self.topologyCache.pop('spatial_index',None)
+            index = self.spatial_index()
+        return index
+        
     def get_node_count(self,edge_node_lookup=None,restore=False,tmpfile=None,graph_params=None):
 
         nodecoords = self.get_data('VertexCoordinates')
@@ -1970,17 +2535,23 @@ class SpatialGraph(amiramesh.AmiraMesh):
         return a_inlet_node,v_outlet_node 
 
     def get_duplicated_edges(self):
+        """
+        Label edges that share the same pair of nodes (in either direction).
+        Each set of duplicates gets its own index, numbered in order of first appearance;
+        self-connected edges are also labelled. All other edges are set to -1.
+        """
         edges = self.get_data('EdgeConnectivity')
-        #duplicate_edges = np.zeros(edges.shape[0],dtype='int')
         duplicate_edge_index = np.zeros(edges.shape[0],dtype='int') - 1
-        dind = 0
-        for i,x in enumerate(edges): 
-            s1 = np.where( (edges[:,0]==x[0]) & (edges[:,1]==x[1]) & (duplicate_edge_index==-1) )[0]
-            s2 = np.where( (edges[:,1]==x[0]) & (edges[:,0]==x[1]) & (duplicate_edge_index==-1) )[0]
-            if len(s1)+len(s2)>1:
-                duplicate_edge_index[s1] = dind
-                duplicate_edge_index[s2] = dind
-                dind += 1
+        if edges.shape[0]==0:
+            return duplicate_edge_index
+            
+        inverse, counts, first = _undirected_edge_groups(edges)
+        dup = (counts>1) | (edges[first,0]==edges[first,1])
+        groups = np.where(dup)[0]
+        groups = groups[np.argsort(first[groups])]
+        group_label = np.zeros(counts.shape[0],dtype='int') - 1
+        group_label[groups] = np.arange(groups.shape[0])
+        duplicate_edge_index[:] = group_label[inverse]
         
         return duplicate_edge_index
         
@@ -2267,39 +2838,54 @@ class SpatialGraph(amiramesh.AmiraMesh):
         self.set_data(edgepoints,name='EdgePointCoordinates')
         self.set_data(rads,name=self.get_radius_field_name())
                     
-    def identify_graphs(self,progBar=False,ignore_node=None,ignore_edge=None,verbose=False,add_scalar=True,add_to_graph=False):
+    def identify_graphs(self,ignore_node=None,ignore_edge=None,verbose=False,add_to_graph=False):
+    
+        """
+        Label the connected subgraphs of the network.
+        Returns the graph index of each node and the number of nodes in each graph.
+        Graphs are numbered in order of their lowest-index end node (as before), with
+        graphs containing no end nodes (e.g. closed loops) numbered after these.
+        Edges flagged in ignore_edge, or touching nodes flagged in ignore_node, are not
+        used to join graphs.
+        If add_to_graph is True, the graph index is stored in a 'GraphIndex' point field.
+        (The progBar and add_scalar arguments have been removed: labelling no longer loops
+        over nodes, and the per-edge 'Graph' scalar is replaced by the 'GraphIndex' field.)
+        """
+        
+        from scipy.sparse import coo_matrix
+        from scipy.sparse.csgraph import connected_components
 
-        # NEW VERSION (faster)!
-        # Find all connected nodes
+        conn = self.get_data('EdgeConnectivity')
+        nnode = self.nnode
+        
+        keep = np.ones(conn.shape[0],dtype='bool')
+        if ignore_edge is not None:
+            keep &= ~arr(ignore_edge,dtype='bool')
+        if ignore_node is not None:
+            ignore_node = arr(ignore_node,dtype='bool')
+            keep &= ~(ignore_node[conn[:,0]] | ignore_node[conn[:,1]])
+        conn = conn[keep]
+        
+        adj = coo_matrix((np.ones(conn.shape[0],dtype='int8'),(conn[:,0],conn[:,1])),shape=(nnode,nnode))
+        ngraph, labels = connected_components(adj,directed=False)
+        
+        # Order graphs by their first end node, then by their first node
         gc = self.get_node_count()
-        sends = np.where(gc<=1)
-        nodes_visited = []
-        node_graph_index = np.zeros(self.nnode,dtype='int') - 1
-        #node_graph_contains_root = np.zeros(graph.nnode,dtype='bool')
-        graph_index_count = 0
-        for send in sends[0]:
-            if node_graph_index[send]==-1:
-                node_graph_index[send] = graph_index_count
-                #node_graph_contains_root[send] = np.any(frozenNode[send])
-                edges = self.get_edges_containing_node(send)
-                cnodes,cedges = self.get_all_connections_to_node(send)
-
-                if len(cnodes)>0:                            
-                    node_graph_index[cnodes] = graph_index_count
-                    #node_graph_contains_root[cnodes] = np.any(frozenNode[cnodes])
-
-                graph_index_count += 1
-
-            if np.all(node_graph_index>=0):
-                break
-                
-        unique, counts = np.unique(node_graph_index, return_counts=True)
+        node_inds = np.arange(nnode)
+        key = np.full(ngraph,2*nnode,dtype='int')
+        np.minimum.at(key,labels,np.where(gc<=1,node_inds,node_inds+nnode))
+        order = np.argsort(key,kind='stable')
+        rank = np.empty(ngraph,dtype='int')
+        rank[order] = np.arange(ngraph)
+        node_graph_index = rank[labels]
+        
+        counts = np.bincount(node_graph_index,minlength=ngraph)
+        
+        if verbose:
+            print(f'{ngraph} graphs identified')
 
         if add_to_graph:
-            edge_graph_index = np.zeros(self.nedge,dtype='int')
-            for unq in unique:
-                cedges = self.get_edges_containing_node(np.where(node_graph_index==unq))
-                edge_graph_index[cedges] = unq
+            edge_graph_index = node_graph_index[self.get_data('EdgeConnectivity')[:,0]]
             nedgepoints = self.get_data('NumEdgePoints')
             point_graph_index = np.repeat(edge_graph_index,nedgepoints)
 
@@ -2309,157 +2895,39 @@ class SpatialGraph(amiramesh.AmiraMesh):
                 
         return node_graph_index, counts
         
-        
-        nodeCoords = self.get_data('VertexCoordinates')
-        conn = self.get_data('EdgeConnectivity')
-        nnodes = len(nodeCoords)
-        nedge = len(conn)
-        
-        if ignore_node is None:
-            ignore_node = np.zeros(self.nnode,dtype='bool')
-            ignore_node[:] = False
-        if ignore_edge is None:
-            ignore_edge = np.zeros(self.nedge,dtype='bool')
-            ignore_edge[:] = False
-        
-        #import pdb
-        #pdb.set_trace()
-        
-        def next_count_value(graphIndex):
-            return np.max(graphIndex)+1
-
-        count = -1
-        graphIndex = np.zeros(nnodes,dtype='int') - 1
-        
-        if progBar:
-            pbar = tqdm(total=nnodes) # progress bar
-        
-        for nodeIndex,node in enumerate(nodeCoords):
-            if progBar:
-                pbar.update(1)
-            
-            #if graphIndex[nodeIndex] == -1:
-            if not ignore_node[nodeIndex]:
-                connIndex,edge_inds = self.connected_nodes(nodeIndex)
-                connIndex = [connIndex[ei] for ei,edgeInd in enumerate(edge_inds) if not ignore_edge[edgeInd]]
-                nconn = len(connIndex)
-                # See if connected nodes have been assigned a graph index
-                if nconn>0:
-                    # Get graph indices for connected nodes
-                    connGraphIndex = graphIndex[connIndex]
-                    #if not ignore_edge[edge_inds]:
-                    if True:
-                        # If one or more connected nodes has an index, assign the minimum one to the curret node
-                        if not all(connGraphIndex==-1):
-                            #mn = np.min(np.append(connGraphIndex[connGraphIndex>=0],count))
-                            #unq = np.unique(np.append(connGraphIndex[connGraphIndex>=0],count))
-                            mn = np.min(connGraphIndex[connGraphIndex>=0])
-                            unq = np.unique(connGraphIndex[connGraphIndex>=0])
-                            inds = [i for i,g in enumerate(graphIndex) if g in unq]
-                            graphIndex[inds] = mn
-                            graphIndex[connIndex] = mn
-                            graphIndex[nodeIndex] = mn
-                            #print 'Node {} set to {} (from neighbours)'.format(nodeIndex,mn)
-                            count = mn
-                        else:
-                            # No graph indices in vicinity
-                            if graphIndex[nodeIndex] == -1:
-                                count = next_count_value(graphIndex)
-                                graphIndex[connIndex] = count
-                                graphIndex[nodeIndex] = count
-                                #print 'Node {} set to {} (new index)'.format(nodeIndex,count)
-                            else:
-                                count = graphIndex[nodeIndex]
-                                graphIndex[connIndex] = count
-                                #print 'Node {} neighbours set to {}'.format(nodeIndex,count)
-                            #graphIndex[nodeIndex] = count
-                            #graphIndex[connIndex] = count
-                else:
-                    # No graph indices in vicinity and no connected nodes
-                    count = next_count_value(graphIndex)
-                    if graphIndex[nodeIndex] == -1:
-                        graphIndex[nodeIndex] = count
-        
-        if progBar:            
-            pbar.close()
-
-        # Make graph indices contiguous        
-        unq = np.unique(graphIndex)
-        ngraph = len(unq)
-        newInd = np.linspace(0,ngraph-1,num=ngraph,dtype='int')
-        for i,ind in enumerate(unq):
-            graphIndex[graphIndex==ind] = i
-            
-        graph_size = np.histogram(graphIndex,bins=newInd)[0]
-        
-        if self.nodeList is None:
-            self.nodeList = self.node_list()
-            
-        edges = self.edges_from_node_list(self.nodeList)
-        
-        if add_scalar:
-            for e in edges:
-                indS,indE = graphIndex[e.start_node_index],graphIndex[e.end_node_index]
-                if indS!=indE:
-                    import pdb
-                    pdb.set_trace()
-                e.add_scalar('Graph',np.repeat(indS,e.npoints))
-            
-        return graphIndex, graph_size
-        
     def edge_scalar_to_node_scalar(self,name,maxval=False):
-    
-        if False: #type(name) is str:
-            data = self.get_data(name)
-            if data is None:
-                return None
-            conns = self.get_data('EdgeConnectivity')
-
-            if False:
-                mask = (conns[:, 0][:, None] == np.arange(self.nnode)) | (conns[:, 1][:, None] == np.arange(self.nnode))
-                masked_data = np.where(mask, data[:, None], np.nan)
-                node_scalar = np.nanmax(masked_data, axis=0)
-                node_scalar = np.where(np.all(np.isnan(masked_data), axis=0), None, node_scalar).astype(data.dtype)
-            else:
-                node_scalar = arr([None if len(np.where((conns[:,0]==n) | (conns[:,1]==n))[0])==0
-                                   else np.nanmax(data[np.where((conns[:,0]==n) | (conns[:,1]==n))])
-                                   for n in range(self.nnode)]).astype(data.dtype)
-            
-            return node_scalar
+        """
+        Node values of a point scalar field: the value at the node's end of its lowest-index edge,
+        or (maxval=True) the maximum over all points of all of the node's edges.
+        Unconnected nodes are set to zero
+        """
 
         scalar_points = self.get_data(name)
         if scalar_points is None:
             return None
     
         verts = self.get_data('VertexCoordinates')
-        conns = self.get_data('EdgeConnectivity')
-        npoints = self.get_data('NumEdgePoints')
         points = self.get_data('EdgePointCoordinates')
         
+        if maxval:
+            edge_max = self.edge_reduce(scalar_points,op='max')
+            return self.node_reduce(edge_max,op='max',default=0).astype(scalar_points.dtype)
+        
         scalar_nodes = np.zeros(verts.shape[0],dtype=scalar_points.dtype)
-        eei = self.edgepoint_edge_indices()
-    
-        for nodeIndex in range(self.nnode):
-            edgeIds = np.where((conns[:,0]==nodeIndex) | (conns[:,1]==nodeIndex))
-            if len(edgeIds[0])>0:
-                vals = []
-                for edgeId in edgeIds[0]:
-                    npts = int(npoints[edgeId])
-                    x0 = int(np.sum(npoints[0:edgeId]))
-                    vtype = scalar_points[x0:x0+npts]
-                    pts = points[x0:x0+npts,:]
-                    node = verts[nodeIndex]
-                    
-                    if not maxval:
-                        if np.all(pts[0,:]==node):
-                            scalar_nodes[nodeIndex] = scalar_points[x0]
-                        else:
-                            scalar_nodes[nodeIndex] = scalar_points[x0+npts-1]
-                        break
-                    else:
-                        vals.append(scalar_points[x0:x0+npts])
-                if maxval:
-                    scalar_nodes[nodeIndex] = np.max(vals)
+        if self.nedge==0:
+            return scalar_nodes
+        
+        # Lowest-index edge containing each node
+        indptr,edges,_,_ = self.adjacency()
+        nnode = min(self.nnode,indptr.shape[0]-1)
+        connected = np.where(np.diff(indptr[:nnode+1])>0)[0]
+        first_edge = edges[indptr[connected]]
+        
+        # Take the edge's first point if it lies on the node, otherwise its last
+        offsets = self.edge_offsets()
+        x0,x1 = offsets[first_edge],offsets[first_edge+1]-1
+        at_start = np.all(points[x0]==verts[connected],axis=1)
+        scalar_nodes[connected] = scalar_points[np.where(at_start,x0,x1)]
                         
         return scalar_nodes
 
@@ -2469,59 +2937,31 @@ class SpatialGraph(amiramesh.AmiraMesh):
             return None
 
         # 1. point -> edge scalars
-        epi = self.edge_point_index()
-        sums = np.bincount(epi, weights=data, minlength=self.nedge)
-        counts = np.bincount(epi, minlength=self.nedge)
-
-        means = np.full(self.nedge, np.nan, dtype=float)
-        nonzero = counts != 0
-        means[nonzero] = sums[nonzero] / counts[nonzero]
-
-        # 2. collect contribution of edges to nodes
-        conns = self.get_data('EdgeConnectivity')
-
-        node_ids = np.concatenate([conns[:, 0], conns[:, 1]])
-        vals     = np.concatenate([means,       means])
-
-        # filter out invalid nodes and NaN edge values
-        valid = (
-            (node_ids >= 0) &
-            (node_ids < self.nnode) &
-            ~np.isnan(vals)
-        )
-        node_ids = node_ids[valid].astype(np.int64)
-        vals     = vals[valid]
+        means = self.edge_reduce(data,op='mean')
 
-        # prepare result array filled with the default value
-        node_scalar = np.full(self.nnode, default, dtype=float)
-
-        # if no edges contribute at all, just return the default-filled array
-        if node_ids.size == 0:
-            return node_scalar if callable(func) else [node_scalar for _ in func]
-
-        # 3. sort contributions by node id to allow grouping
-        order = np.argsort(node_ids)
-        node_ids_sorted = node_ids[order]
-        vals_sorted     = vals[order]
-
-        unique_nodes, starts = np.unique(node_ids_sorted, return_index=True)
-        ends = np.empty_like(starts)
-        ends[:-1] = starts[1:]
-        ends[-1] = node_ids_sorted.size
+        funcs = func if isinstance(func, list) else [func]
+        if not all(callable(f) for f in funcs):
+            raise ValueError("func must be callable or a list of callables")
 
+        # 2. edge -> node, over the edges containing each node (NaN edge values are ignored)
         def _reduce_one(f):
-            out = node_scalar.copy()
-            for nid, s, e in zip(unique_nodes, starts, ends):
-                seg = vals_sorted[s:e]
-                out[nid] = f(seg)
+            op = _reduce_funcs.get(f)
+            if op is not None:
+                return self.node_reduce(means, op=op, default=default)
+                
+            # Arbitrary function - apply to each node's edge values in turn
+            indptr,edges,_,_ = self.adjacency()
+            out = np.full(self.nnode, default, dtype=float)
+            for nid in range(min(self.nnode,indptr.shape[0]-1)):
+                seg = means[edges[indptr[nid]:indptr[nid+1]]]
+                seg = seg[~np.isnan(seg)]
+                if seg.shape[0]>0:
+                    out[nid] = f(seg)
             return out
 
         if callable(func):
             return _reduce_one(func)
-        elif isinstance(func, list) and all(callable(f) for f in func):
-            return [_reduce_one(f) for f in func]
-        else:
-            raise ValueError("func must be callable or a list of callables")
+        return [_reduce_one(f) for f in func]
 
         
     def point_scalars_to_edge_scalars(self,func=np.mean,name=None,data=None):
@@ -2573,6 +3013,10 @@ class SpatialGraph(amiramesh.AmiraMesh):
         return scalar_edges.squeeze()
  
     def point_scalars_to_segment_scalars(self,func=np.mean,name=None,domain=None):
+        """
+        Scalar values for each edge segment (pair of consecutive edge points), taken from the segment's first point.
+        All (or the named) point scalars are returned, one row per field
+        """
 
         scalars = self.get_scalars()
         if name is not None:
@@ -2580,12 +3024,6 @@ class SpatialGraph(amiramesh.AmiraMesh):
             if len(scalars)==0:
                 return None
     
-        verts = self.get_data('VertexCoordinates')
-        conns = self.get_data('EdgeConnectivity')
-        npoints = self.get_data('NumEdgePoints')
-        nsegpoints = npoints - 1
-        points = self.get_data('EdgePointCoordinates')
-        
         nsc = len(scalars)
         nseg = self.nedgepoint - self.nedge
         scalar_segs = np.zeros([nsc,nseg])
@@ -2595,22 +3033,17 @@ class SpatialGraph(amiramesh.AmiraMesh):
             segments = self.get_segments(domain=domain)
             ins = (np.all(segments[:,0]>=domain[:,0],axis=1)) & (np.all(segments[:,0]<=domain[:,1],axis=1)) & \
                   (np.all(segments[:,1]>=domain[:,0],axis=1)) & (np.all(segments[:,1]<=domain[:,1],axis=1))
+                  
+        # Every edge point except the last on each edge starts a segment
+        offsets = self.edge_offsets()
+        seg_start = np.ones(self.nedgepoint,dtype='bool')
+        seg_start[offsets[1:][offsets[1:]>0]-1] = False
     
-        for i,conn in enumerate(conns):
-            npts = int(npoints[i])
-            x0 = int(np.sum(npoints[0:i]))
-            x1 = x0+npts
-            s0 = int(np.sum(nsegpoints[0:i]))
-            s1 = s0+int(nsegpoints[i])
-
-            for j,scalar in enumerate(scalars):
-                    
-                data = scalar['data']
-                if data is not None:
-                    if npts>2:
-                        scalar_segs[j,s0:s1] = data[x0:x1-1]
-                    else:
-                        scalar_segs[j,s0] = data[x0]
+        for j,scalar in enumerate(scalars):
+            data = scalar['data']
+            if data is not None:
+                scalar_segs[j] = data[seg_start]
+                
         if ins is None:
             return scalar_segs.squeeze()
         else:
@@ -2673,8 +3106,9 @@ class SpatialGraph(amiramesh.AmiraMesh):
         edge_def = self.get_definition('EDGE')
         #tubes = []
         tubes = np.empty(self.nedgepoint,dtype='object') # [None]*self.graph.nedgepoint
+        offsets = self.edge_offsets()
         for i in trange(edge_def['size'][0]):
-            i0 = np.sum(npoints[:i])
+            i0 = offsets[i]
             i1 = i0+npoints[i]
             coords = points[i0:i1]
             rads = radii[i0:i1]
@@ -2960,27 +3394,21 @@ class SpatialGraph(amiramesh.AmiraMesh):
 
         # ---- optional dedupe of parallel edges (undirected) ----
         if dedupe_first and len(E) > 0:
-            key = np.sort(E, axis=1)
-            # group by pair
-            # pick best per pair depending on prefer and weight
-            from collections import defaultdict
-            buckets = defaultdict(list)
-            for i, (a, b) in enumerate(key):
-                buckets[(int(a), int(b))].append(i)
-
-            keep_idx = []
-            for pair, idxs in buckets.items():
-                if len(idxs) == 1:
-                    keep_idx.append(idxs[0])
-                    continue
-                # choose per weight
-                ws = [edge_weight(i) for i in idxs]
-                choice = int(np.argmin(ws)) if prefer == "short" else int(np.argmax(ws))
-                keep_idx.append(idxs[choice])
-            keep_idx = np.array(sorted(keep_idx), dtype=int)
-            E = E[keep_idx]
-            per_coords = [per_coords[i] for i in keep_idx]
-            per_scal = [per_scal[i] for i in keep_idx]
+            # group by pair and pick best per pair depending on prefer and weight
+            group, counts, _ = _undirected_edge_groups(E)
+            dup = np.where(counts[group] > 1)[0]
+            if len(dup) > 0:
+                ws = np.array([edge_weight(i) for i in dup], dtype=float)
+                if prefer != "short":
+                    ws = -ws
+                srt = dup[np.lexsort((dup, ws, group[dup]))]
+                best = srt[np.r_[True, group[srt][1:] != group[srt][:-1]]]
+                keep = counts[group] == 1
+                keep[best] = True
+                keep_idx = np.where(keep)[0]
+                E = E[keep_idx]
+                per_coords = [per_coords[i] for i in keep_idx]
+                per_scal = [per_scal[i] for i in keep_idx]
 
         # ---- compute weights ----
         M = len(E)
@@ -3615,6 +4043,440 @@ class SpatialGraph(amiramesh.AmiraMesh):
             return True, 1, inds[0]
         return False, -1, None
 
+class SpatialIndex(object):
+    """
+    KD-tree index over the edge points and segment midpoints of a spatial graph (see SpatialGraph.spatial_index).
+    Vessels are treated as spheres at each edge point (nearest) or as capsules around each segment (radius and box queries),
+    using the graph radius field if present (otherwise zero radius)
+    """
+
+    def __init__(self,points,offsets,radii=None):
+        from scipy.spatial import cKDTree
+    
+        self.points = arr(points,dtype='float')
+        self.offsets = offsets
+        self.radii = radii
+        npoint = self.points.shape[0]
+        self.point_radius = np.zeros(npoint) if radii is None else arr(radii,dtype='float').reshape(npoint,-1)[:,0]
+        self.point_edge = np.repeat(np.arange(offsets.shape[0]-1),np.diff(offsets))
+        
+        # Segments join consecutive points on the same edge
+        seg_start = np.ones(npoint,dtype='bool')
+        seg_start[offsets[1:][offsets[1:]>0]-1] = False
+        self.segment_start = np.where(seg_start)[0]
+        self.segment_edge = self.point_edge[self.segment_start]
+        p0,p1 = self.points[self.segment_start],self.points[self.segment_start+1]
+        self.segment_midpoints = (p0+p1) / 2.
+        self.segment_radius = np.maximum(self.point_radius[self.segment_start],self.point_radius[self.segment_start+1])
+        
+        # Any part of a segment's surface lies within this distance of its midpoint
+        half_length = np.linalg.norm(p1-p0,axis=1) / 2.
+        self.max_point_radius = np.max(self.point_radius) if npoint>0 else 0.
+        self.segment_bound = np.max(half_length+self.segment_radius) if self.segment_start.shape[0]>0 else 0.
+        
+        self.point_tree = cKDTree(self.points) if npoint>0 else None
+        self.segment_tree = cKDTree(self.segment_midpoints) if self.segment_start.shape[0]>0 else None
+        
+    def _segment_distance(self,x,segs):
+        # Distance from x to the surface of each segment (capsule) in segs
+        p0,p1 = self.points[self.segment_start[segs]],self.points[self.segment_start[segs]+1]
+        d = p1 - p0
+        dd = np.sum(d*d,axis=1)
+        t = np.divide(np.sum((x-p0)*d,axis=1),dd,out=np.zeros(dd.shape[0]),where=dd>0)
+        closest = p0 + np.clip(t,0.,1.)[:,None]*d
+        return np.linalg.norm(x-closest,axis=1) - self.segment_radius[segs]
+        
+    def nearest(self,x,exclude_edge=None,k=16):
+        """
+        Nearest vessel surface to each query point, with vessels treated as spheres at each edge point.
+        exclude_edge optionally gives an edge index for each query point whose points are ignored
+        (e.g. to find the nearest neighbouring vessel to a vessel's own points).
+        Returns (distance, edge index, edge point index); distance is negative inside a vessel, and inf (with indices -1) if nothing is found.
+        k is the number of nearest edge points first searched for each query (more are searched where needed)
+        """
+        x = arr(x,dtype='float')
+        single = x.ndim==1
+        x = x.reshape(-1,3)
+        nq = x.shape[0]
+        dist = np.full(nq,np.inf)
+        ind = np.zeros(nq,dtype='int') - 1
+        if self.point_tree is None or nq==0:
+            return (dist[0],-1,-1) if single else (dist,ind,ind.copy())
+        if exclude_edge is not None:
+            exclude_edge = np.broadcast_to(arr(exclude_edge),(nq,))
+        
+        npoint = self.points.shape[0]
+        if exclude_edge is not None:
+            # Enough neighbours to see past a query's own edge
+            k += int(np.max(np.diff(self.offsets)))
+            
+        # Query the k nearest centres. A closer surface may lie beyond these if radii differ, or if all k were excluded,
+        # so queries that can't be confirmed are repeated with k doubled (in chunks, to bound memory)
+        todo = np.arange(nq)
+        while todo.shape[0]>0:
+            k = min(k,npoint)
+            chunk = max(1,2**22//k)
+            unresolved = []
+            for c0 in range(0,todo.shape[0],chunk):
+                q = todo[c0:c0+chunk]
+                dq,iq = self.point_tree.query(x[q],k=k)
+                dq,iq = dq.reshape(q.shape[0],k),iq.reshape(q.shape[0],k)
+                surf = dq - self.point_radius[iq]
+                if exclude_edge is not None:
+                    surf[self.point_edge[iq]==exclude_edge[q,None]] = np.inf
+                best = np.argmin(surf,axis=1)
+                rows = np.arange(q.shape[0])
+                dist[q],ind[q] = surf[rows,best],iq[rows,best]
+                # Unseen points are at least dq[:,-1] from the query, so their surfaces at least dq[:,-1]-max_point_radius
+                if k<npoint:
+                    unresolved.append(q[~(dq[:,-1]-self.max_point_radius>=dist[q])])
+            todo = np.concatenate(unresolved) if len(unresolved)>0 else todo[:0]
+            k *= 2
+                
+        ind[~np.isfinite(dist)] = -1
+        edge = np.where(ind>=0,self.point_edge[ind],-1)
+        if single:
+            return dist[0],edge[0],ind[0]
+        return dist,edge,ind
+        
+    def query_radius(self,x,r,return_segments=False):
+        """
+        Indices of edges whose surface lies within distance r of point x (ascending).
+        If return_segments, also return the indices of the matching segments (as their starting edge point index)
+        """
+        x = arr(x,dtype='float')
+        segs = np.zeros(0,dtype='int')
+        if self.segment_tree is not None:
+            segs = arr(self.segment_tree.query_ball_point(x,r+self.segment_bound),dtype='int')
+            segs = segs[self._segment_distance(x,segs)<=r]
+        edges = np.unique(self.segment_edge[segs])
+        if return_segments:
+            return edges,self.segment_start[np.sort(segs)]
+        return edges
+        
+    def _segment_box_overlap(self,p0,d,lo,hi):
+        # Slab test: whether each segment p0 to p0+d intersects its box lo-hi (one box per segment)
+        parallel = d==0
+        with np.errstate(divide='ignore',invalid='ignore'):
+            t0,t1 = (lo-p0)/d,(hi-p0)/d
+        inside = (p0>=lo) & (p0<=hi)
+        tmin = np.where(parallel,np.where(inside,-np.inf,np.inf),np.minimum(t0,t1))
+        tmax = np.where(parallel,np.where(inside,np.inf,-np.inf),np.maximum(t0,t1))
+        t_enter = np.maximum(np.max(tmin,axis=1),0.)
+        t_exit = np.minimum(np.min(tmax,axis=1),1.)
+        return t_enter<=t_exit
+        
+    def query_box(self,lo,hi,return_segments=False):
+        """
+        Indices of edges with any segment overlapping the axis-aligned box lo-hi (ascending).
+        Each segment's centreline is tested exactly against the box grown by the segment's radius on every side, so
+        this is exact for zero radius and otherwise conservative (a vessel passing within its radius of a box edge or
+        corner, but not touching the box, can be included).
+        If return_segments, also return the indices of the matching segments (as their starting edge point index)
+        """
+        lo,hi = arr(lo,dtype='float'),arr(hi,dtype='float')
+        segs = np.zeros(0,dtype='int')
+        if self.segment_tree is not None:
+            # Chebyshev ball around the box centre, then a slab test of each segment against the grown box
+            centre,half = (lo+hi)/2.,(hi-lo)/2.
+            segs = arr(self.segment_tree.query_ball_point(centre,np.max(half)+self.segment_bound,p=np.inf),dtype='int')
+            p0,p1 = self.points[self.segment_start[segs]],self.points[self.segment_start[segs]+1]
+            rad = self.segment_radius[segs][:,None]
+            segs = segs[self._segment_box_overlap(p0,p1-p0,lo-rad,hi+rad)]
+        edges = np.unique(self.segment_edge[segs])
+        if return_segments:
+            return edges,self.segment_start[np.sort(segs)]
+        return edges
+
+class GraphEdit(object):
+    """
+    Records topology edits to a spatial graph and applies them all in one compaction pass on commit.
+    Created by SpatialGraph.batch_edit(), usually as a context manager:
+    
+        with graph.batch_edit() as tx:
+            n = tx.add_node([0.,0.,0.])
+            tx.add_edge(n,5)
+            tx.delete_edge(10)
+            
+    Node and edge indices refer to the graph as it was when the edit started; new nodes and edges get provisional
+    indices following on from these (returned by add_node/add_edge/split_edge). Nothing changes until commit
+    (on leaving the with block without an exception), after which node_lookup and edge_lookup map the
+    original and provisional indices to final ones (-1 if deleted).
+    New nodes and edges take scalar values from the scalars dictionary if given, otherwise the field's first value;
+    NodeLabel and EdgeLabel fields get new unique labels. Nodes made by split_edge take node values from the point field
+    of the same name at the split point where there is one, and otherwise from the split edge's start node
+    """
+
+    def __init__(self,graph):
+        self.graph = graph
+        self.nnode = graph.nnode
+        self.nedge = graph.nedge
+        self.npts = graph.get_data('NumEdgePoints')
+        
+        self.new_nodes = [] # (coordinates, scalars, split edge or -1)
+        self.new_edges = [] # (start, end, points, scalars) for added edges, (split edge, point index, node) for splits
+        self.deleted_nodes = []
+        self.deleted_edges = []
+        self.moves = {}
+        
+        self.node_lookup = None
+        self.edge_lookup = None
+        self.committed = False
+        
+    def __enter__(self):
+        return self
+        
+    def __exit__(self,exc_type,exc_value,traceback):
+        # Edits are discarded if the block raised
+        if exc_type is None:
+            self.commit()
+        return False
+        
+    def _check_node(self,index):
+        index = int(index)
+        if index<0 or index>=self.nnode+len(self.new_nodes):
+            raise IndexError(f'Node index {index} out of range')
+        return index
+        
+    def _node_coordinates(self,index):
+        # Coordinates of an original or provisional node (before any moves)
+        if index<self.nnode:
+            return self.graph.get_data('VertexCoordinates')[index]
+        return self.new_nodes[index-self.nnode][0]
+        
+    def _check_edge(self,index):
+        index = int(index)
+        if index<0 or index>=self.nedge+len(self.new_edges):
+            raise IndexError(f'Edge index {index} out of range')
+        return index
+        
+    def add_node(self,coordinates,scalars=None):
+        """
+        Add a node, returning its (provisional) index
+        """
+        self.new_nodes.append((arr(coordinates,dtype='float'),scalars,-1))
+        return self.nnode + len(self.new_nodes) - 1
+        
+    def add_edge(self,start_node,end_node,points=None,scalars=None):
+        """
+        Add an edge between two nodes, with edge point coordinates (default: straight line between the nodes).
+        The first and last points must lie on the start and end nodes (as they are before any moves).
+        Returns its (provisional) index
+        """
+        start_node,end_node = self._check_node(start_node),self._check_node(end_node)
+        if points is not None:
+            points = arr(points)
+            if points.ndim!=2 or points.shape[0]<2:
+                raise ValueError('Edges need two or more edge points')
+            if not np.allclose(points[[0,-1]],[self._node_coordinates(start_node),self._node_coordinates(end_node)]):
+                raise ValueError('The first and last edge points must match the coordinates of the start and end nodes')
+        self.new_edges.append((start_node,end_node,points,scalars))
+        return self.nedge + len(self.new_edges) - 1
+        
+    def split_edge(self,edge,point_index):
+        """
+        Split an existing edge with a new node at one of its interior edge points.
+        The original edge runs from its start node to the new node, and a new edge from the new node onwards
+        (towards the next split in the same edge, if any).
+        Returns the (provisional) indices of the new node and the new edge
+        """
+        edge,point_index = int(edge),int(point_index)
+        if edge<0 or edge>=self.nedge:
+            raise IndexError('Only edges present at the start of the edit can be split')
+        if point_index<=0 or point_index>=self.npts[edge]-1:
+            raise ValueError('Edges can only be split at interior edge points')
+        coordinates = self.graph.get_data('EdgePointCoordinates')[self.graph.edge_offsets()[edge]+point_index]
+        self.new_nodes.append((arr(coordinates,dtype='float'),None,edge))
+        node = self.nnode + len(self.new_nodes) - 1
+        self.new_edges.append((edge,point_index,node))
+        return node, self.nedge + len(self.new_edges) - 1
+        
+    def delete_node(self,index):
+        """
+        Delete a node and every edge containing it
+        """
+        self.deleted_nodes.append(self._check_node(index))
+        
+    def delete_edge(self,index):
+        """
+        Delete an edge. Deleting an original edge that has been split also deletes every piece it was split into
+        (the split nodes are kept)
+        """
+        self.deleted_edges.append(self._check_edge(index))
+        
+    def move_node(self,index,coordinates):
+        """
+        Move a node, along with the end points of the edges connected to it
+        """
+        self.moves[self._check_node(index)] = arr(coordinates,dtype='float')
+        
+    def _new_values(self,field,n,scalars):
+        # Values of a field for new items: from the scalars dictionary, otherwise the field's first value
+        data = field['data']
+        name = field['name']
+        if scalars is not None and name in scalars:
+            return np.broadcast_to(arr(scalars[name],dtype=data.dtype),(n,)+data.shape[1:])
+        if data.shape[0]>0:
+            return np.broadcast_to(data[0],(n,)+data.shape[1:])
+        return np.zeros((n,)+data.shape[1:],dtype=data.dtype)
+        
+    def _labels(self,data,n,counter):
+        return _new_labels(self.graph,data,n,counter)
+        
+    def commit(self):
+        """
+        Apply all recorded edits to the graph in one pass.
+        Raises a ValueError, leaving the graph unchanged, if a field's definition is unknown or its length doesn't match it
+        """
+        if self.committed:
+            raise Exception('Edits have already been committed')
+        self.committed = True
+        
+        graph = self.graph
+        nodes,conn,points,npts = graph.get_standard_fields()
+        offsets = graph.edge_offsets()
+        nn0,ne0,np0 = self.nnode,self.nedge,points.shape[0]
+        _check_field_sizes(graph,nn0,ne0,np0)
+        point_fields = {f['name']:f['data'] for f in graph.fields if f['data'] is not None and f['definition'].lower()=='point'}
+        nn1,ne1 = nn0 + len(self.new_nodes),ne0 + len(self.new_edges)
+        
+        # Splits, sorted by edge and then position along the edge
+        splits = [(x[0],x[1],x[2],ne0+i) for i,x in enumerate(self.new_edges) if len(x)==3]
+        splits = arr(splits,dtype='int').reshape(-1,4)
+        splits = splits[np.lexsort((splits[:,1],splits[:,0]))]
+        s_edge,s_point,s_node,s_id = splits.T
+        if np.any((s_edge[1:]==s_edge[:-1]) & (s_point[1:]==s_point[:-1])):
+            raise ValueError('Edge split more than once at the same point')
+            
+        # Node coordinates (original, then new), with moves applied
+        new_coords = arr([x[0] for x in self.new_nodes],dtype='float').reshape(-1,3)
+        split_src = np.zeros(nn1-nn0,dtype='int64') - 1
+        split_src[s_node-nn0] = offsets[s_edge] + s_point
+        node_coords = np.concatenate([nodes,new_coords.astype(nodes.dtype)])
+        unmoved_coords = node_coords.copy()
+        for i,c in self.moves.items():
+            node_coords[i] = c
+        
+        # Edge table, indexed by original/provisional edge index: start in the point buffer, point count, connectivity
+        # and the edge that fields are inherited from (-1 for new edges). New edge points follow the original ones
+        e_start = np.zeros(ne1,dtype='int64')
+        e_n = np.zeros(ne1,dtype='int64')
+        e_conn = np.zeros((ne1,2),dtype=conn.dtype)
+        e_parent = np.zeros(ne1,dtype='int') - 1
+        e_start[:ne0],e_n[:ne0],e_conn[:ne0],e_parent[:ne0] = offsets[:-1],npts,conn,np.arange(ne0)
+        
+        add_ids,add_points = [],[]
+        ptr = np0
+        for i,x in enumerate(self.new_edges):
+            if len(x)==4:
+                pts = x[2] if x[2] is not None else unmoved_coords[[x[0],x[1]]]
+                add_ids.append(ne0+i)
+                add_points.append(arr(pts,dtype=points.dtype))
+                e_start[ne0+i],e_n[ne0+i],e_conn[ne0+i] = ptr,len(pts),[x[0],x[1]]
+                ptr += len(pts)
+        add_ids = arr(add_ids,dtype='int')
+        
+        if splits.shape[0]>0:
+            first = np.concatenate([[True],s_edge[1:]!=s_edge[:-1]])
+            last = np.concatenate([s_edge[1:]!=s_edge[:-1],[True]])
+            next_point = np.where(last,npts[s_edge]-1,np.roll(s_point,-1))
+            next_node = np.where(last,conn[s_edge,1],np.roll(s_node,-1))
+            e_start[s_id] = offsets[s_edge] + s_point
+            e_n[s_id] = next_point - s_point + 1
+            e_conn[s_id] = np.column_stack([s_node,next_node])
+            e_parent[s_id] = s_edge
+            # Original edges now end at their first split
+            e_n[s_edge[first]] = s_point[first] + 1
+            e_conn[s_edge[first],1] = s_node[first]
+            
+        # Deletions
+        keep_nodes = np.ones(nn1,dtype='bool')
+        keep_nodes[arr(self.deleted_nodes,dtype='int')] = False
+        keep_edges = np.all(keep_nodes[e_conn],axis=1)
+        deleted_edges = arr(self.deleted_edges,dtype='int')
+        keep_edges[deleted_edges] = False
+        # Deleting a split edge deletes all of its pieces
+        keep_edges[s_id[np.isin(s_edge,deleted_edges)]] = False
+        self.node_lookup = index_lookup(keep_nodes)
+        self.edge_lookup = index_lookup(keep_edges)
+        
+        # Gather edge points for the remaining edges
+        kn,ks = e_n[keep_edges],e_start[keep_edges]
+        new_offsets = np.concatenate([[0],np.cumsum(kn)])
+        point_src = np.arange(new_offsets[-1],dtype='int64') + np.repeat(ks-new_offsets[:-1],kn)
+        point_edge = np.repeat(np.where(keep_edges)[0],kn)
+        new_edge_points = point_edge>=ne0
+        
+        # Provisional indices of new edges, for per-point and per-edge values
+        relabel = np.where(keep_edges & (np.arange(ne1)>=ne0))[0]
+        add_lookup = np.zeros(ne1,dtype='int') - 1
+        add_lookup[add_ids] = np.arange(add_ids.shape[0])
+        
+        for f in graph.fields:
+            data,name = f['data'],f['name']
+            if data is None or name in ['EdgeConnectivity','NumEdgePoints']:
+                continue
+            definition = f['definition'].lower()
+            if name=='VertexCoordinates':
+                graph.set_data(node_coords[keep_nodes],name=name)
+            elif definition=='vertex':
+                vals = np.zeros((nn1-nn0,)+data.shape[1:],dtype=data.dtype)
+                point_data = point_fields.get(name)
+                if point_data is not None and point_data.shape[1:]!=data.shape[1:]:
+                    point_data = None
+                for i,x in enumerate(self.new_nodes):
+                    if x[2]>=0 and point_data is not None:
+                        vals[i] = point_data[split_src[i]]
+                    elif x[2]>=0:
+                        vals[i] = data[conn[x[2],0]]
+                    else:
+                        vals[i] = self._new_values(f,1,x[1])[0]
+                if name=='NodeLabel':
+                    vals[:] = self._labels(data,nn1-nn0,'node_label_counter')
+                graph.set_data(np.concatenate([data,vals])[keep_nodes],marker=f['marker'])
+            elif definition=='point':
+                if name=='EdgePointCoordinates':
+                    added = add_points
+                else:
+                    added = [self._new_values(f,len(p),self.new_edges[i-ne0][3]) for i,p in zip(add_ids,add_points)]
+                new_data = np.concatenate([data]+[arr(a) for a in added])[point_src] if len(added)>0 else data[point_src]
+                if name=='EdgeLabel' and relabel.shape[0]>0:
+                    labels = np.zeros(ne1,dtype=data.dtype)
+                    labels[relabel] = self._labels(data,relabel.shape[0],'edge_label_counter')
+                    new_data[new_edge_points] = labels[point_edge[new_edge_points]]
+                graph.set_data(new_data,marker=f['marker'])
+            elif definition=='edge':
+                vals = np.zeros((ne1,)+data.shape[1:],dtype=data.dtype)
+                vals[:ne0] = data
+                inherit = e_parent>=0
+                vals[inherit] = data[e_parent[inherit]]
+                for i in add_ids:
+                    vals[i] = self._new_values(f,1,self.new_edges[i-ne0][3])[0]
+                if name=='EdgeLabel' and relabel.shape[0]>0:
+                    vals[relabel] = self._labels(data,relabel.shape[0],'edge_label_counter')
+                graph.set_data(vals[keep_edges],marker=f['marker'])
+                
+        # Moved nodes carry the ends of their edges with them
+        new_points = graph.get_data('EdgePointCoordinates')
+        new_conn = e_conn[keep_edges]
+        if len(self.moves)>0:
+            moved = np.zeros(nn1,dtype='bool')
+            moved[list(self.moves.keys())] = True
+            s,e = moved[new_conn[:,0]],moved[new_conn[:,1]]
+            new_points[new_offsets[:-1][s]] = node_coords[new_conn[s,0]]
+            new_points[new_offsets[1:][e]-1] = node_coords[new_conn[e,1]]
+            
+        graph.set_data(self.node_lookup[new_conn],name='EdgeConnectivity')
+        graph.set_data(kn.astype(npts.dtype),name='NumEdgePoints')
+        graph.set_definition_size('VERTEX',int(np.sum(keep_nodes)))
+        graph.set_definition_size('EDGE',int(np.sum(keep_edges)))
+        graph.set_definition_size('POINT',int(new_offsets[-1]))
+        graph.set_graph_sizes()
+        graph.nodeList = None
+        graph.edgeList = None
+        
+        return graph
+
 class Editor(object):     
 
     def _insert_node_in_edge(self,edge_index,edgepoint_index,nodeCoords,edgeConn,nedgepoints,edgeCoords,scalars=None):
@@ -3972,158 +4834,120 @@ class Editor(object):
         
         return graph
         
-    def remove_intermediate_nodes(self,graph):
+    def remove_intermediate_nodes(self,graph,decimate=True):
         """
-        Remove nodes that have exactly two connections, and add them into the edge data
+        Remove nodes that have exactly two connections, and add them into the edge data.
+        Each chain of such nodes is merged into one edge between the nodes at either end of the chain, keeping every second
+        point if decimate=True (otherwise all points, without repeating those of the removed nodes). Rings made up only of
+        two-connection nodes are removed.
+        Raises a ValueError, leaving the graph unchanged, if a field's definition is unknown or its length doesn't match it
         """
-        
+
         nodecoords = graph.get_data('VertexCoordinates')
         edgeconn = graph.get_data('EdgeConnectivity')
-        points = graph.get_data('EdgePointCoordinates')
-        nedge = graph.get_data('NumEdgePoints')
-        scalars = graph.get_scalars()
-        nscalars = graph.get_node_scalars()
-        
-        nedges = edgeconn.shape[0]
+        nedgepoints = graph.get_data('NumEdgePoints')
         nnode = nodecoords.shape[0]
-        
-        node_count = graph.get_node_count()
-        inline_nodes = np.where(node_count==2)
-        
-        edge_del_flag = np.zeros(nedges,dtype='bool')
-        node_del_flag = np.zeros(nnode,dtype='bool')
-        
-        consol_edge = []
-        # Loop through each of the inline nodes (i.e. nodes with exactly 2 connections)
-        for i,_node_inds in enumerate(inline_nodes[0]):
-            consolodated_edges = []
-            start_or_end_node = []
-            node_inds = [_node_inds]
-            
-            # Track which nodes are connected to inline nodes, and aggregate chains of inline nodes        
-            count = 0
-            while True:
-                next_nodes = []
-                for node_ind in node_inds:
-                    if node_del_flag[node_ind]==False and node_count[node_ind]==2:
-                        node_del_flag[node_ind] = True
-                        cur_conn = np.where(((edgeconn[:,0]==node_ind) | (edgeconn[:,1]==node_ind)) & (edge_del_flag==False))
-                        
-                        # Mark the edges as needing to be consolodated 
-                        consolodated_edges.append(cur_conn[0])
-                        edge_del_flag[cur_conn[0]] = True
-                        conn_nodes = np.unique(edgeconn[cur_conn].flatten())
-                        conn_nodes = conn_nodes[conn_nodes!=node_ind]
-                        conn_count = node_count[conn_nodes]
-                    
-                        # Look for endpoints or branching points
-                        edge_or_branch = np.where((conn_count==1) | (conn_count>2))
-                        if len(edge_or_branch[0])>0:
-                            start_or_end_node.append(conn_nodes[edge_or_branch[0]])
-                            
-                        if len(start_or_end_node)>=2:
-                            break
-                           
-                        if len(conn_nodes)>0: 
-                            next_nodes.append(conn_nodes)
-                        count += 1
-                        #print(next_nodes)
-                    
-                if len(start_or_end_node)>=2:
-                    break
-                else:
-                    # Next iteration prep.
-                    if len(next_nodes)==0:
-                        break
-                    node_inds = np.concatenate(next_nodes)
-
-            # Aggregate identified edges containing inline nodes (will remove loops!)
-            if count>0 and len(start_or_end_node)>0:
-                consolodated_edges = np.concatenate(consolodated_edges)
-                start_or_end_node = np.concatenate(start_or_end_node)
-                
-                # Merge the edges into one
-                cur_conns = edgeconn[consolodated_edges]
-                start_node, end_node = start_or_end_node[0],start_or_end_node[1]
-                cur_node = start_node
-                
-                consol_points = []
-                consol_scalars = [[] for _ in range(len(scalars))]
-                visited = np.zeros(len(consolodated_edges),dtype='bool')
-                count1 = 0
+        npoint = int(np.sum(nedgepoints))
+        _check_field_sizes(graph,nnode,edgeconn.shape[0],npoint)
+
+        indptr,inc_edges,_,_ = graph.adjacency()
+        node_count = np.zeros(nnode,dtype='int')
+        ncount = np.diff(indptr)[:nnode]
+        node_count[:ncount.shape[0]] = ncount
+        inline = node_count==2
+
+        # Walk each chain of inline nodes once, starting from its lowest-indexed node and heading out along both of its edges
+        conn = edgeconn.tolist()
+        ptr = indptr.tolist()
+        inc = inc_edges.tolist()
+        is_inline = inline.tolist()
+        visited = [False]*nnode
+        chain_edges, chain_flip, chain_index, chain_nodes = [], [], [], []
+        for seed in np.where(inline)[0].tolist():
+            if visited[seed]:
+                continue
+            visited[seed] = True
+            sides = []
+            for e in inc[ptr[seed]:ptr[seed]+2]:
+                node, edges = seed, []
                 while True:
-                    cur_edge_ind = consolodated_edges[np.where(((cur_conns[:,0]==cur_node) | (cur_conns[:,1]==cur_node)) & (visited==False))][0]
-                    visited[np.where(consolodated_edges==cur_edge_ind)] = True
-                    
-                    cur_edge = edgeconn[cur_edge_ind]
-                    x0 = np.sum(nedge[:cur_edge_ind])
-                    x1 = x0 + nedge[cur_edge_ind]
-                    cur_pts = points[x0:x1]
-                    
-                    if cur_edge[0]==cur_node:
-                        # Correct way round
-                        consol_points.append(cur_pts)
-                        next_node = cur_edge[1]
-                        for j,sc in enumerate(scalars):
-                            consol_scalars[j].append(sc['data'][x0:x1])
-                    else:
-                        #breakpoint()
-                        consol_points.append(np.flip(cur_pts,axis=0))
-                        next_node = cur_edge[0]
-                        for j,sc in enumerate(scalars):
-                            consol_scalars[j].append(np.flip(sc['data'][x0:x1],axis=0))
-                        
-                    if next_node==end_node:
+                    edges.append(e)
+                    nxt = conn[e][1] if conn[e][0]==node else conn[e][0]
+                    if nxt==seed or not is_inline[nxt]:
                         break
-                    else:
-                        cur_node = next_node
-                    count1 += 1
-                        
-                consol_points = np.concatenate(consol_points)
-                consol_edge.append({'start_node':start_node,'end_node':end_node,'points':consol_points,'scalars':consol_scalars})
-                
-        # Delete inline edges
-        #edgeconn = edgeconn[~edge_del_flag]
-        
-        # Add new edges to graph
-        scalar_names = [x['name'] for x in scalars]
-        for edge in consol_edge:
-            new_conn = arr([edge['start_node'],edge['end_node']])
-            new_pts = edge['points']
-            # Create indices defining the first, last and every second index in between
-            skip_inds = np.arange(0,len(new_pts),2)
-            if new_pts.shape[0]%2==0:
-                skip_inds = np.concatenate([skip_inds,[new_pts.shape[0]-1]])
-            new_pts = new_pts[skip_inds]
-            
-            if not np.all(new_pts[0]==nodecoords[new_conn[0]]) or not np.all(new_pts[-1]==nodecoords[new_conn[1]]):
-                breakpoint()
-            
-            new_npts = new_pts.shape[0]
-            edgeconn = np.vstack((edgeconn,new_conn))
-            nedge = np.concatenate((nedge,[new_npts]))
-            points = np.vstack((points,new_pts))
-
-            for j,sc in enumerate(scalars):
-                if scalar_names[j]=='EdgeLabel':
-                    new_data = np.concatenate(edge['scalars'][j])[skip_inds]
-                    new_data[:] = graph.unique_edge_label() #  np.min(new_data)
-                else:
-                    new_data = np.concatenate(edge['scalars'][j])[skip_inds]
-                sc['data'] = np.concatenate((sc['data'],new_data))
-        
-        graph.set_data(edgeconn,name='EdgeConnectivity')
-        graph.set_data(points,name='EdgePointCoordinates')
-        graph.set_data(nedge,name='NumEdgePoints')
-        graph.set_definition_size('EDGE',edgeconn.shape[0])
-        graph.set_definition_size('POINT',points.shape[0])
+                    visited[nxt] = True
+                    i0 = ptr[nxt]
+                    e = inc[i0] if inc[i0+1]==e else inc[i0+1]
+                    node = nxt
+                if nxt==seed: # Ring
+                    break
+                nbr = conn[edges[0]][1] if conn[edges[0]][0]==seed else conn[edges[0]][0]
+                sides.append((len(edges),nbr,edges,nxt))
+            if nxt==seed:
+                continue
+
+            # The chain starts at whichever end is closest to the seed (ties go to the side with the lower-indexed neighbour)
+            sides.sort(key=lambda x:x[:2])
+            start, end = sides[0][3], sides[1][3]
+            cur = start
+            for e in sides[0][2][::-1] + sides[1][2]:
+                flip = conn[e][0]!=cur
+                cur = conn[e][0] if flip else conn[e][1]
+                chain_edges.append(e)
+                chain_flip.append(flip)
+                chain_index.append(len(chain_nodes))
+            chain_nodes.append([start,end])
+
+        nchain = len(chain_nodes)
+        if nchain>0:
+            seq = arr(chain_edges,dtype='int')
+            chain_index = arr(chain_index,dtype='int')
+            first_in_chain = np.concatenate([[True],chain_index[1:]!=chain_index[:-1]])
+
+            # Source point index of every point in the merged edges (reversed where an edge is traversed end to start)
+            counts = nedgepoints[seq]
+            pos = np.arange(np.sum(counts)) - np.repeat(np.cumsum(counts)-counts,counts)
+            src = np.repeat(graph.edge_offsets()[seq],counts) + np.where(np.repeat(chain_flip,counts),np.repeat(counts,counts)-1-pos,pos)
+            point_chain = np.repeat(chain_index,counts)
+            if decimate:
+                # First, last and every second point in between
+                npts = np.bincount(point_chain,minlength=nchain)
+                k = np.arange(src.shape[0]) - np.repeat(np.cumsum(npts)-npts,npts)
+                keep = (k%2==0) | (k==npts[point_chain]-1)
+            else:
+                keep = (pos>0) | np.repeat(first_in_chain,counts)
+            src, point_chain = src[keep], point_chain[keep]
+            new_npts = np.bincount(point_chain,minlength=nchain)
+
+            edge_labels = graph.get_data('EdgeLabel')
+            if edge_labels is not None:
+                labels = _new_labels(graph,edge_labels,nchain,'edge_label_counter')
+            for f in graph.fields:
+                data, definition = f['data'], f['definition'].lower()
+                if data is None:
+                    continue
+                if f['name']=='EdgeConnectivity':
+                    graph.set_data(np.concatenate([data,arr(chain_nodes,dtype=data.dtype)]),name=f['name'])
+                elif f['name']=='NumEdgePoints':
+                    graph.set_data(np.concatenate([data,new_npts.astype(data.dtype)]),name=f['name'])
+                elif definition=='point':
+                    new_data = data[src]
+                    if f['name']=='EdgeLabel':
+                        new_data[:] = np.repeat(labels,new_npts)
+                    graph.set_data(np.concatenate([data,new_data]),name=f['name'])
+                elif definition=='edge':
+                    new_data = data[seq[first_in_chain]]
+                    if f['name']=='EdgeLabel':
+                        new_data[:] = labels
+                    graph.set_data(np.concatenate([data,new_data]),name=f['name'])
+            graph.set_definition_size('EDGE',edgeconn.shape[0]+nchain)
+            graph.set_definition_size('POINT',npoint+src.shape[0])
 
         # Delete inline nodes and edges connecting them
-        node_del_flag[node_count==0] = True
-        graph = delete_vertices(graph,~node_del_flag,return_lookup=False)
-        
-        return graph        
-        
+        graph = delete_vertices(graph,~(inline | (node_count==0)),return_lookup=False)
+
+        return graph
+
     def largest_graph(self, graph):
 
         graphNodeIndex, graph_size = graph.identify_graphs()
@@ -4138,7 +4962,7 @@ class Editor(object):
     def remove_graphs_smaller_than(self, graph, lim, pfile=None):
 
         if True: #pfile is None:
-            graphNodeIndex, graph_size = graph.identify_graphs(progBar=True)
+            graphNodeIndex, graph_size = graph.identify_graphs()
         else:
             import pickle
             plist = pickle.load(open(pfile,"r"))
@@ -4408,8 +5232,9 @@ class Editor(object):
             filter = np.ones(conns.shape[0],dtype='bool')
         
         pts_interp,npoints_interp = [],np.zeros(conns.shape[0],dtype='int')-1
+        offsets = graph.edge_offsets()
         for i,conn in enumerate(conns):
-            i0 = np.sum(npoints[:i])
+            i0 = offsets[i]
             i1 = i0 + npoints[i]
             pts = points[i0:i1]
             
@@ -4465,7 +5290,7 @@ class Editor(object):
                 # If the existing edge has more than 2 points
                 elif npoints[i]>2:
                     # Spline interpolate curve at required interval
-                    i0 = np.sum(npoints[:i])
+                    i0 = offsets[i]
                     i1 = i0 + npoints[i]
                     pts = points[i0:i1]
 
@@ -4601,11 +5426,12 @@ class Editor(object):
             g_node_scalars.append(gvars.node_scalar_values[j][gvars.nodecoords_allocated])  
             g_node_scalar_names.append(gvars.node_scalars[j]['name'])
 
+        offsets = graph.edge_offsets()
         for i,conn in enumerate(conns):
 
             if filter[i]==True: # Ignore if filter is False           
             
-                i0 = np.sum(npoints[:i])
+                i0 = offsets[i]
                 i1 = i0 + npoints[i]
                 pts = points[i0:i1]
                 
@@ -4790,7 +5616,6 @@ class Node(object):
             
             if graph.edgeList is None:
                 graph.edgeList = arr([None]*graph.nedge)
-            edgeInds = np.where(graph.edgeList!=None)[0] # [e for e in graph.edgeList if e is not None]
 
             vertCoords = graph.get_field('VertexCoordinates')['data']
             if vertCoords is None:
@@ -4801,9 +5626,11 @@ class Node(object):
             #s0 = np.where(edgeConn==index)
             #ns0 = len(s0)
             if edgeConn is not None:
-                s0 = np.where(edgeConn[:,0]==index)
+                # Incident edges from the graph's (cached) incidence structure
+                inc_edges,_,inc_start = graph._node_incidence(index)
+                s0 = (inc_edges[inc_start],)
                 ns0 = len(s0[0])
-                s1 = np.where(edgeConn[:,1]==index)
+                s1 = (inc_edges[~inc_start],)
                 ns1 = len(s1[0])
             else:
                 ns0,ns1,s0,s1 = 0,0,[],[]
@@ -4821,11 +5648,9 @@ class Node(object):
             if len(s0)>0:
                 for e in s0[0]:
                     self.edge_indices.append(e)
-                    if e not in edgeInds:  
+                    if graph.edgeList[e] is None:  
                         newEdge = Edge(graph=graph,index=e)
-                        edgeInds = np.append(edgeInds,e)
-                        if graph.edgeList[e] is None:
-                            graph.edgeList[e] = newEdge
+                        graph.edgeList[e] = newEdge
                     else:
                         newEdge = graph.edgeList[e] #[edge for edge in graph.edgeList if edge is not None and edge.index==e]
                     self.edges.append(newEdge)
@@ -4835,11 +5660,9 @@ class Node(object):
                 for e in s1[0]:
                     self.edge_indices.append(e)
                     self.edge_indices_rev.append(True)
-                    if e not in edgeInds:                  
+                    if graph.edgeList[e] is None:                  
                         newEdge = Edge(graph=graph,index=e)
-                        edgeInds = np.append(edgeInds,e)
-                        if graph.edgeList[e] is None:
-                            graph.edgeList[e] = newEdge
+                        graph.edgeList[e] = newEdge
                     else:
                         newEdge = graph.edgeList[e] # [edge for edge in graph.edgeList if edge is not None and edge.index==e]
                     self.edges.append(newEdge)
@@ -4931,16 +5754,13 @@ class Edge(object):
             self.scalars,self.scalarNames = self.get_scalars_from_graph(graph,index)
             stat = self.complete_edge(nodeCoords[edgeConn[index,1],:],edgeConn[index,1])
             
-            self.i0 = np.sum(nedgepoints[:index])
+            self.i0 = graph.edge_offsets()[index]
             self.i1 = self.i0 + nedgepoints[index]
         
     def get_coordinates_from_graph(self,graph,index):
         nedgepoints = graph.get_field('NumEdgePoints')['data']
         coords = graph.get_field('EdgePointCoordinates')['data']
-        if index>0:
-            nprev = np.sum(nedgepoints[0:index])
-        else:
-            nprev = 0
+        nprev = graph.edge_offsets()[index]
         ncur = nedgepoints[index]
         e_coords = coords[nprev:nprev+ncur,:]
         return e_coords
@@ -4950,7 +5770,7 @@ class Edge(object):
         if len(scalars)==0:
             return None,None
         nedgepoints = graph.get_field('NumEdgePoints')['data']
-        nprev = np.sum(nedgepoints[0:index])
+        nprev = graph.edge_offsets()[index]
         ncur = nedgepoints[index]
         scalarData = []
         scalarNames = []
@@ -5104,6 +5924,26 @@ class GVars(object):
         
         self.set_scalars()
         
+    def _growth(self,capacity,needed):
+        # Number of slots to add so that capacity>=needed, growing geometrically (at least doubling)
+        # so that repeated appends are amortised O(1)
+        if needed<=capacity:
+            return 0
+        return int(max(needed-capacity,capacity,self.n_all))
+        
+    def reserve(self,nodes=0,edges=0,points=0):
+        """
+        Ensure capacity for at least the given total number of nodes, edges and edge points,
+        so that subsequent add_node/add_edge calls do not reallocate
+        """
+        # The add methods keep a free slot after the last entry, so one more than the total is needed
+        if nodes>=self.nodecoords.shape[0]:
+            self.preallocate_nodes(nodes+1-self.nodecoords.shape[0])
+        if edges>=self.edgeconn.shape[0]:
+            self.preallocate_edges(edges+1-self.edgeconn.shape[0])
+        if points>=self.edgepoints.shape[0]:
+            self.preallocate_edgepoints(points+1-self.edgepoints.shape[0])
+        
     def set_scalars(self):
         scalars = self.graph.get_scalars()
         scalar_values = [x['data'].copy() for x in scalars]
@@ -5132,7 +5972,7 @@ class GVars(object):
     def set_edgeconn(self,edgeconn,nedgepoints,update_pointer=False):
         # Reset all edgeconn and nedgepoints to array argument provided
         if self.edgeconn.shape[0]<edgeconn.shape[0]:
-            self.preallocate_edges(edgeconn.shape[0],set_pointer_to_start=False)
+            self.preallocate_edges(edgeconn.shape[0]-self.edgeconn.shape[0],set_pointer_to_start=False)
         self.edgeconn[:edgeconn.shape[0]] = edgeconn
         self.nedgepoints[:nedgepoints.shape[0]] = nedgepoints
         self.edgeconn_allocated[:] = False
@@ -5153,7 +5993,7 @@ class GVars(object):
     def add_node(self,node,new_scalar_vals=[]):
         # Assign existing node slot to supplied node coordinate
         if self.node_ptr>=self.nodecoords.shape[0]:
-            self.preallocate_nodes(self.n_all,set_pointer_to_start=False)
+            self.preallocate_nodes(self._growth(self.nodecoords.shape[0],self.node_ptr+1),set_pointer_to_start=False)
         self.nodecoords[self.node_ptr] = node
         self.nodecoords_allocated[self.node_ptr] = True
         
@@ -5167,7 +6007,7 @@ class GVars(object):
             self.node_scalar_values[i][self.node_ptr] = new_scalar_vals[i]
         self.node_ptr += 1
         if self.node_ptr>=self.nodecoords.shape[0]:
-            self.preallocate_nodes(self.n_all,set_pointer_to_start=False)
+            self.preallocate_nodes(self._growth(self.nodecoords.shape[0],self.node_ptr+1),set_pointer_to_start=False)
             
     def append_nodes(self,nodes,update_pointer=False):
         # Create new slots for an array containing multiple node coordinates
@@ -5187,34 +6027,14 @@ class GVars(object):
         keep = np.ones(nnode,dtype='bool')
         keep[node_inds_to_remove] = False
 
-        # Remove edges containing nodes
-        # Find which edges must be deleted
-        del_node_inds = np.where(keep==False)[0]
-        del_edges = [np.where((edgeconn[:,0]==i) | (edgeconn[:,1]==i))[0] for i in del_node_inds]
-        # Remove empties (i.e. where the node doesn't appear in any edges)
-        del_edges = [x for x in del_edges if len(x)>0]
-        # Flatten
-        del_edges = [item for sublist in del_edges for item in sublist]
-        # Convert to numpy
-        del_edges = arr(del_edges)
-        # List all edge indices
-        inds = np.linspace(0,edgeconn.shape[0]-1,edgeconn.shape[0],dtype='int')
-        # Define which edge each edgepoint belongs to
-        edge_inds = np.repeat(inds,nedgepoints)
-        # Create a mask of points to keep for edgepoint variables
-        keep_edgepoints = ~np.in1d(edge_inds,del_edges)
-        # Apply mask to edgepoint array
+        # Remove edges containing nodes, and their edge points
+        keep_edges,keep_edgepoints,_,_,_ = deletion_masks(edgeconn,nedgepoints,keep)
         edgepoints = edgepoints[keep_edgepoints]
         # Apply mask to scalars
         scalars = []
         for i,scalar in enumerate(self.scalar_values):
             scalars.append(scalar[self.edgepoints_allocated][keep_edgepoints])
-              
-        # Create a mask for removing edge connections and apply to the nedgepoint array
-        keep_edges = np.ones(edgeconn.shape[0],dtype='bool')
-        if len(del_edges)>0:
-            keep_edges[del_edges] = False
-            nedgepoints = nedgepoints[keep_edges]
+        nedgepoints = nedgepoints[keep_edges]
         
         # Remove nodes and update indices
         nodecoords, edgeconn, edge_lookup = update_array_index(nodecoords,edgeconn,keep)
@@ -5230,17 +6050,16 @@ class GVars(object):
             
     def add_edgeconn(self,conn,npts=2):
         if self.edge_ptr>=self.edgeconn.shape[0]:
-            self.preallocate_edges(self.n_all,set_pointer_to_start=False)
+            self.preallocate_edges(self._growth(self.edgeconn.shape[0],self.edge_ptr+1),set_pointer_to_start=False)
         self.edgeconn[self.edge_ptr] = conn
         self.edgeconn_allocated[self.edge_ptr] = True
         self.nedgepoints[self.edge_ptr] = npts
         self.edge_ptr += 1
         if self.edge_ptr>=self.edgeconn.shape[0]:
-            self.preallocate_edges(self.n_all,set_pointer_to_start=False)
+            self.preallocate_edges(self._growth(self.edgeconn.shape[0],self.edge_ptr+1),set_pointer_to_start=False)
 
     def add_edge(self,start_node_index,end_node_index,new_scalar_vals,points=None):
         new_conn = [start_node_index,end_node_index]
-        nodes = self.nodecoords[new_conn]
         if points is None or not np.all(points[0]-self.nodecoords[new_conn[0]]<1e-12) or not np.all(points[-1]-self.nodecoords[new_conn[1]]<1e-12):
             self.add_edgeconn(new_conn)
             self.add_edgepoints(self.nodecoords[new_conn],new_scalar_vals,edgeInd=self.edge_ptr-1)
@@ -5252,7 +6071,7 @@ class GVars(object):
     def add_edgepoints(self,pnt,new_scalar_vals,edgeInd=-1):
         npts = pnt.shape[0]
         if self.edgepoints.shape[0]-self.edgepnt_ptr<=npts:
-            self.preallocate_edgepoints(self.n_all,set_pointer_to_start=False)
+            self.preallocate_edgepoints(self._growth(self.edgepoints.shape[0],self.edgepnt_ptr+npts+1),set_pointer_to_start=False)
         self.edgepoints[self.edgepnt_ptr:self.edgepnt_ptr+npts] = pnt
         self.edgepoints_allocated[self.edgepnt_ptr:self.edgepnt_ptr+npts] = True
         if edgeInd>=0:
@@ -5269,7 +6088,7 @@ class GVars(object):
             self.scalar_values[i][self.edgepnt_ptr:self.edgepnt_ptr+npts] = np.zeros(npts,dtype=dt)+new_scalar_vals[i]
         self.edgepnt_ptr += npts     
         if self.edgepnt_ptr>=self.edgepoints.shape[0]:
-            self.preallocate_edgepoints(self.n_all,set_pointer_to_start=False)
+            self.preallocate_edgepoints(self._growth(self.edgepoints.shape[0],self.edgepnt_ptr+1),set_pointer_to_start=False)
         
     def remove_edges(self,edge_inds_to_remove):
 
@@ -5336,7 +6155,7 @@ class GVars(object):
     def preallocate_edgepoints(self,n,set_pointer_to_start=False):
         if set_pointer_to_start:
             self.edgepnt_ptr = self.edgepoints.shape[0]
-        self.edgepoints = np.vstack([self.edgepoints,np.zeros([n,3])])
+        self.edgepoints = np.vstack([self.edgepoints,np.zeros([n,3],dtype=self.edgepoints.dtype)])
         self.edgepoints_allocated = np.concatenate([self.edgepoints_allocated,np.zeros(n,dtype='bool')])
         for i,sc in enumerate(self.scalar_values):
             self.scalar_values[i] = np.concatenate([self.scalar_values[i],np.zeros(n,dtype=sc.dtype)-1])
@@ -5360,19 +6179,67 @@ class GVars(object):
         self.edgepnt_ptr = self.edgepoints.shape[0]-1
         
     def convert_edgepoints_to_nodes(self,interp_radius_factor=None):
-
-        nedgepoint = self.edgepnt_ptr
-        strt = self.node_ptr
-        with tqdm(total=nedgepoint) as pbar:
-            pbar.update(self.node_ptr)
-            while True:
-                nep = self.nedgepoints[self.edgeconn_allocated] #graph.get_data('NumEdgePoints')
-                sind = np.where(nep>2)
-                if len(sind[0])>0:            
-                    self.insert_node_in_edge(sind[0][0],1)
-                    pbar.update(1)
-                else:
-                    break
+        """
+        Convert every interior edge point into a node, so that each edge is split into consecutive two-point edges.
+        New nodes take node scalar values from the point scalar of the same name, where one exists, and otherwise
+        from the start node of their original edge. The first segment of each edge keeps the original edge index.
+        """
+        nodecoords = self.nodecoords[self.nodecoords_allocated]
+        edgeconn = self.edgeconn[self.edgeconn_allocated]
+        nedgepoints = self.nedgepoints[self.edgeconn_allocated]
+        edgepoints = self.edgepoints[self.edgepoints_allocated]
+        scalars = [x[self.edgepoints_allocated] for x in self.scalar_values]
+        node_scalars = [x[self.nodecoords_allocated] for x in self.node_scalar_values]
+        scalar_names = [x['name'] for x in self.scalars]
+        
+        nnode, nedge, npoint = nodecoords.shape[0], edgeconn.shape[0], edgepoints.shape[0]
+        if nedge==0 or np.all(nedgepoints<=2):
+            return
+            
+        offsets = np.concatenate([[0],np.cumsum(nedgepoints)])
+        point_edge = np.repeat(np.arange(nedge),nedgepoints)
+        local = np.arange(npoint) - offsets[point_edge]
+        interior = (local>0) & (local<nedgepoints[point_edge]-1)
+        new_points = np.where(interior)[0]
+        nnew = new_points.shape[0]
+        
+        # Node index of each edge point: the edge's end nodes at either end, new nodes in between
+        valid = nedgepoints>0
+        point_node = np.zeros(npoint,dtype=edgeconn.dtype)
+        point_node[offsets[:-1][valid]] = edgeconn[valid,0]
+        point_node[offsets[1:][valid]-1] = edgeconn[valid,1]
+        point_node[new_points] = nnode + np.arange(nnew)
+        
+        # One segment per pair of consecutive points, with each edge's first segment listed first
+        seg_start = np.where(local<nedgepoints[point_edge]-1)[0]
+        first = local[seg_start]==0
+        seg_start = seg_start[np.argsort(~first,kind='stable')]
+        nfirst = np.sum(first)
+        pts = np.stack([seg_start,seg_start+1],axis=1)
+        
+        new_edgeconn = point_node[pts]
+        new_nedgepoints = np.full(seg_start.shape[0],2,dtype=nedgepoints.dtype)
+        pts = pts.ravel()
+        new_scalars = [x[pts] for x in scalars]
+        if 'EdgeLabel' in scalar_names and seg_start.shape[0]>nfirst:
+            i = scalar_names.index('EdgeLabel')
+            labels = _new_labels(self.graph,scalars[i],seg_start.shape[0]-nfirst,'edge_label_counter')
+            new_scalars[i][2*nfirst:] = np.repeat(labels,2)
+            
+        new_node_scalars = []
+        for i,data in enumerate(node_scalars):
+            name = self.node_scalars[i]['name']
+            if name=='NodeLabel':
+                vals = _new_labels(self.graph,data,nnew,'node_label_counter')
+            elif name in scalar_names:
+                vals = scalars[scalar_names.index(name)][new_points].astype(data.dtype)
+            else:
+                vals = data[edgeconn[point_edge[new_points],0]]
+            new_node_scalars.append(np.concatenate([data,vals]))
+        
+        self.set_nodecoords(np.concatenate([nodecoords,edgepoints[new_points].astype(nodecoords.dtype)]),scalars=new_node_scalars)
+        self.set_edgeconn(new_edgeconn,new_nedgepoints)
+        self.set_edgepoints(edgepoints[pts],scalars=new_scalars)
                 
     def insert_nodes_in_edges(self,interp_resolution=None,interp_radius_factor=None,filter=None):
         
@@ -5430,7 +6297,7 @@ class GVars(object):
         dif = npoints - npoints_cur
     
         if self.edgepoints.shape[0]-self.edgepnt_ptr<=dif:
-            self.preallocate_edgepoints(self.n_all,set_pointer_to_start=False)
+            self.preallocate_edgepoints(self._growth(self.edgepoints.shape[0],self.edgepnt_ptr+dif+1),set_pointer_to_start=False)
         
         x0 = int(np.sum(nedgepoints[:int(edge_index)]))
         x1 = x0 + int(nedgepoints[int(edge_index)])
@@ -165,78 +165,22 @@ class Statistics(object):
         
         nedges = edgeconn.shape[0]
         
-        edgeInds = np.zeros(edgepoints.shape[0],dtype='int')
-        for edge_ind in range(nedges):
-            nep = nedgepoints[edge_ind]
-            x0 = np.sum(nedgepoints[:edge_ind])
-            x1 = x0 + nep
-            edgeInds[x0:x1] = edge_ind
- 
-        self.edge_intervessel_distance = np.zeros(nedges)   
-        self.edge_length = np.zeros(nedges)
-        self.edge_radii = np.zeros(nedges)
-        self.edge_volume = np.zeros(nedges)
-        self.edge_euclidean = np.zeros(nedges)      
-        self.edge_tortuosity = np.zeros(nedges)   
-
-        for edge_ind in trange(nedges):
-            #try:
-            if True:
-                nep = nedgepoints[edge_ind]
-                x0 = np.sum(nedgepoints[:edge_ind])
-                x1 = x0 + nep
-                pts = edgepoints[x0:x1]
-                rads = radii[x0:x1]
-            
-                #pts = edge.coordinates
-                #rads = edge.get_scalar(self.radius_field_name)
-                
-                # Define search range
-                rng = [np.min(pts,axis=0),np.max(pts,axis=0)]
-                #if rng[0]<0.:
-                #   rng[0] *= 1.2*np.max(rads)
-                #else:
-                #   rng[0] *= 0.8*np.max(rads)
-                #if rng[1]<0.:
-                #   rng[1] *= 0.8*np.max(rads)
-                #else:
-                #   rng[1] *= 1.2*np.max(rads)
-                   
-                lim = 10. #100. #um
-                # Get nearby points
-                inds = [(edgepoints[:,0]>rng[0][0]-lim) & (edgepoints[:,0]<rng[1][0]+lim) & (edgepoints[:,1]>rng[0][1]-lim) & (edgepoints[:,1]<rng[1][1]+lim) & (edgepoints[:,2]>rng[0][2]-lim) & (edgepoints[:,2]<rng[1][2]+lim) & (edgeInds!=edge_ind)]
-                #inds = []
-                if len(inds)>0:
-                    curPoints = edgepoints[inds[0]]
-                    curRadii = radii[inds[0]]
-                else:
-                    curPoints,curRadii = [],[]
-
-                dist = np.zeros(pts.shape[0]-1)
-
-                length = np.sum([np.linalg.norm(pts[i]-pts[i-1]) for i,x in enumerate(pts[1:])])
-                volume = np.sum([np.linalg.norm(pts[i]-pts[i-1])*np.square(rads[i]) for i,x in enumerate(pts[1:])])
-                
-                for i in range(pts.shape[0]-1):
-                    if len(curPoints)>0:
-                        dist[i] = np.min([np.linalg.norm(pts[i]-p)-rads[i]-curRadii[j] for j,p in enumerate(curPoints)])
-                      
-                #breakpoint()  
-                if len(curPoints)>0:
-                    self.edge_intervessel_distance[edge_ind] = np.max(dist)
-                else:
-                    self.edge_intervessel_distance[edge_ind] = -1.
-                self.edge_length[edge_ind] = length
-                self.edge_volume[edge_ind] = volume
-                self.edge_radii[edge_ind] = np.mean(rads)
-                self.edge_euclidean[edge_ind] = np.linalg.norm(pts[-1]-pts[0])
-
-                #breakpoint()
-                self.edge_tortuosity[edge_ind] = self.edge_euclidean[edge_ind] / length
-                
-            #except Exception as e:
-            #    print('Error, edge {}: {}'.format(edge,e))
+        geom = graph.edge_geometry()
+        self.edge_length = geom['length']
+        self.edge_radii = geom['mean_radius']
+        self.edge_volume = geom['volume']
+        self.edge_euclidean = geom['chord']
+        self.edge_tortuosity = geom['tortuosity']
 
+        # Intervessel distance: for each segment start point, the surface distance to the nearest point on any other edge.
+        # The edge value is the largest of these (-1 if there are no other edges)
+        index = graph.spatial_index()
+        seg_start = index.segment_start
+        dist,_,_ = index.nearest(edgepoints[seg_start],exclude_edge=index.segment_edge)
+        point_dist = np.full(edgepoints.shape[0],-np.inf)
+        point_dist[seg_start] = dist - radii[seg_start]
+        self.edge_intervessel_distance = graph.edge_reduce(point_dist,op='max')
+        self.edge_intervessel_distance[~np.isfinite(self.edge_intervessel_distance)] = -1.
             
     def _branching_angle(self,vec1,vec2,acute=False):
 
@@ -262,6 +206,7 @@ class Statistics(object):
         edgepoints = graph.get_data('EdgePointCoordinates')
         nedgepoints = graph.get_data('NumEdgePoints')
         radii = self.graph.get_data(self.radius_field_name)
+        offsets = graph.edge_offsets()
         
         nnodes = nodecoords.shape[0]
         
@@ -269,7 +214,7 @@ class Statistics(object):
         self.node_connections = []
 
         for node_ind in trange(nnodes):
-            sind = np.where((edgeconn[:,0]==node_ind) | (edgeconn[:,1]==node_ind))
+            sind = (graph.node_edges(node_ind),)
 
             if len(sind[0])>0:
                 if len(sind[0])>1:
@@ -284,7 +229,7 @@ class Statistics(object):
                         direction = -1
                         
                     nep = nedgepoints[edge_ind]
-                    x0 = np.sum(nedgepoints[:edge_ind])
+                    x0 = offsets[edge_ind]
                     x1 = x0 + nep
                     pts = edgepoints[x0:x1]
                     
@@ -301,7 +246,7 @@ class Statistics(object):
                                 direction2 = -1
                                 
                             nep2 = nedgepoints[edge_ind2]
-                            x02 = np.sum(nedgepoints[:edge_ind2])
+                            x02 = offsets[edge_ind2]
                             x12 = x02 + nep2
                             pts2 = edgepoints[x02:x12]
                             
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput benchmark for incremental graph building with GVars.add_edge.
+Run as a script; the growth behaviour itself is tested in test_gvars_growth.py
+
+@author: simon
+"""
+
+from pymira import spatialgraph
+import numpy as np
+import time
+
+def seed_graph():
+
+    graph = spatialgraph.SpatialGraph(initialise=True,scalars=['Radii'],node_scalars=[])
+    graph.set_definition_size('VERTEX',2)
+    graph.set_definition_size('EDGE',1)
+    graph.set_definition_size('POINT',2)
+    graph.set_data(np.asarray([[0.,0.,0.],[1.,0.,0.]],dtype='float32'),name='VertexCoordinates')
+    graph.set_data(np.asarray([[0,1]],dtype='int'),name='EdgeConnectivity')
+    graph.set_data(np.asarray([2],dtype='int'),name='NumEdgePoints')
+    graph.set_data(np.asarray([[0.,0.,0.],[1.,0.,0.]],dtype='float32'),name='EdgePointCoordinates')
+    graph.set_data(np.asarray([1.,1.]),name='Radii')
+    return graph
+
+def build_chain(nedge,reserve=False):
+
+    gv = spatialgraph.GVars(seed_graph())
+    if reserve:
+        gv.reserve(nodes=nedge+2,edges=nedge+1,points=2*nedge+2)
+
+    t0 = time.perf_counter()
+    for i in range(nedge):
+        gv.add_node(np.asarray([i+2.,0.,0.]))
+        gv.add_edge(i+1,i+2,[1.])
+    dt = time.perf_counter() - t0
+    return gv, dt
+
+if __name__=='__main__':
+    for nedge in [10000,100000,1000000]:
+        for reserve in [False,True]:
+            _, dt = build_chain(nedge,reserve=reserve)
+            print(f'{nedge} edges (reserve={reserve}): {dt:.2f}s, {nedge/dt:.0f} edges/s')
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""
+Timing for SpatialIndex.nearest with each query's own edge excluded (as in Statistics intervessel distances),
+on graphs with long, densely sampled edges
+
+@author: simon
+"""
+
+from pymira import spatialgraph
+import numpy as np
+import time
+
+def dense_edges(nedge,npts,seed=0):
+
+    rng = np.random.default_rng(seed)
+    t = np.linspace(0.,4.,npts)
+    points = np.concatenate([np.column_stack([t,np.full(npts,3.*(i%50))+0.3*np.sin(t+i),np.full(npts,3.*(i//50))]) for i in range(nedge)])
+    offsets = np.arange(nedge+1)*npts
+    radii = rng.uniform(0.05,0.45,points.shape[0])
+    return points, offsets, radii
+    
+def time_nearest(nedge,npts):
+
+    points, offsets, radii = dense_edges(nedge,npts)
+    index = spatialgraph.SpatialIndex(points,offsets,radii=radii)
+    t0 = time.perf_counter()
+    index.nearest(points,exclude_edge=index.point_edge)
+    return time.perf_counter() - t0
+
+if __name__=='__main__':
+    for nedge,npts in [(2000,5),(2000,40),(2000,100),(10000,40)]:
+        dt = time_nearest(nedge,npts)
+        print(f'{nedge} edges x {npts} points: {dt:.2f}s ({nedge*npts/dt:.0f} queries/s)')
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of serial versus threaded field decoding in AmiraMesh.read
+
+Usage: python benchmark_read.py [number of edge points, default 2000000]
+
+@author: simon
+"""
+
+from pymira import spatialgraph
+import numpy as np
+import tempfile
+import time
+import sys
+import os
+
+def make_graph(npoint,seed=0):
+    # Chain of 2-point edges with three point scalar fields
+    rng = np.random.default_rng(seed)
+    nedge = npoint//2
+    nodes = rng.random((nedge+1,3))*1000.
+    conn = np.stack([np.arange(nedge),np.arange(1,nedge+1)],axis=1)
+    graph = spatialgraph.SpatialGraph(initialise=True,scalars=['Radii','Flow','Pressure'])
+    graph.set_definition_size('VERTEX',nodes.shape[0])
+    graph.set_definition_size('EDGE',nedge)
+    graph.set_definition_size('POINT',2*nedge)
+    graph.set_data(nodes,name='VertexCoordinates')
+    graph.set_data(conn,name='EdgeConnectivity')
+    graph.set_data(np.full(nedge,2),name='NumEdgePoints')
+    graph.set_data(nodes[conn.ravel()],name='EdgePointCoordinates')
+    for name in ['Radii','Flow','Pressure']:
+        graph.set_data(rng.random(2*nedge),name=name)
+    return graph
+
+def time_read(ofile,workers=None,force=False):
+    graph = spatialgraph.SpatialGraph()
+    if force:
+        # Use threads regardless of the number of cores / file size
+        graph._parallel_workers = lambda w: w
+    t0 = time.perf_counter()
+    graph.read(ofile,quiet=True,workers=workers)
+    return time.perf_counter()-t0, graph
+
+if __name__=='__main__':
+    npoint = int(sys.argv[1]) if len(sys.argv)>1 else 2000000
+    graph = make_graph(npoint)
+    ncpu = len(os.sched_getaffinity(0)) if hasattr(os,'sched_getaffinity') else os.cpu_count()
+    print(f'{npoint} points, {ncpu} cores available')
+    
+    with tempfile.TemporaryDirectory() as d:
+        for fileType,encoding in [('3D ASCII 2.0',None),('3D BINARY-LITTLE-ENDIAN 2.1','HxZip')]:
+            ofile = os.path.join(d,'bench.am')
+            graph.write(ofile,fileType=fileType,encoding=encoding)
+            print(f'{fileType} {encoding or ""}: {os.path.getsize(ofile)/1e6:.0f} MB')
+            
+            ref, refGraph = time_read(ofile)
+            print(f'  serial: {ref:.2f}s')
+            for workers in [2,4]:
+                for force in [False,True]:
+                    dt, res = time_read(ofile,workers=workers,force=force)
+                    for f in refGraph.fields:
+                        assert np.array_equal(res.get_data(f['name']),f['data'])
+                    label = 'threads forced' if force else 'read(workers)'
+                    print(f'  workers={workers} ({label}): {dt:.2f}s')
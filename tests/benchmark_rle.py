@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of HxByteRLE decoding, for data with many short runs (the worst case for decoding)
+
+Usage: python benchmark_rle.py [size in MB]
+
+@author: simon
+"""
+
+from pymira import amiramesh
+import numpy as np
+import time
+import sys
+
+def python_decode(d,uncompressed_size):
+    # Pure Python control byte scan (used when numba isn't installed), with the same numpy gather
+    jit = amiramesh._rle_control_bytes_jit, amiramesh._rle_expand_jit
+    amiramesh._rle_control_bytes_jit, amiramesh._rle_expand_jit = None, None
+    try:
+        return amiramesh.AmiraMesh().decode_rle(d,uncompressed_size)
+    finally:
+        amiramesh._rle_control_bytes_jit, amiramesh._rle_expand_jit = jit
+
+def label_data(nbytes,seed=0):
+    # Label-like data with short runs (1-6 bytes) and some noise
+    rng = np.random.default_rng(seed)
+    nrun = nbytes//3
+    data = np.repeat(rng.integers(0,8,nrun),rng.integers(1,6,nrun)).astype('uint8')
+    return data[:nbytes].tobytes()
+
+if __name__=='__main__':
+    am = amiramesh.AmiraMesh()
+    size = int(float(sys.argv[1])*1024*1024) if len(sys.argv)>1 else 32*1024*1024
+    data = label_data(size)
+    enc = am.encode_rle(data,min_run=2)
+    print(f'{len(data)/1e6:.1f} MB decoded, {len(enc)/1e6:.1f} MB encoded')
+    
+    if amiramesh._rle_control_bytes_jit is not None:
+        am.decode_rle(enc[:1000],10) # Compile
+        t0 = time.perf_counter()
+        res = am.decode_rle(enc,len(data))
+        print(f'numba: {time.perf_counter()-t0:.2f}s')
+        assert res.tobytes()==data
+    else:
+        print('numba not installed')
+        
+    t0 = time.perf_counter()
+    res = python_decode(enc,len(data))
+    print(f'Python: {time.perf_counter()-t0:.2f}s')
+    assert res.tobytes()==data
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""
+Shared test fixtures
+
+@author: simon
+"""
+
+from pymira import spatialgraph
+import numpy as np
+import pytest
+import os
+
+test_file = os.path.join(os.path.dirname(__file__),'test_network.am')
+
+def read_test_network():
+
+    graph = spatialgraph.SpatialGraph()
+    graph.read(test_file,quiet=True)
+    # Point values equal to the point index, so they can be followed through edits
+    graph.set_data(np.arange(graph.nedgepoint,dtype='float32'),name='Radii')
+    return graph
+
+@pytest.fixture
+def load_graph():
+    """
+    Function returning a fresh copy of test_network.am (a chain of 5 nodes and 4 three-point edges),
+    with Radii set to the edge point index
+    """
+    return read_test_network
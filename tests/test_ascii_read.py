@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+ASCII data sections: values and dtypes for each field type
+
+@author: simon
+"""
+
+from pymira import spatialgraph
+import numpy as np
+import os
+
+test_file = os.path.join(os.path.dirname(__file__),'test_network.am')
+
+def test_ascii_dtypes(tmp_path):
+
+    graph = spatialgraph.SpatialGraph()
+    graph.read(test_file,quiet=True)
+    n = graph.nedgepoint
+    # byte is unsigned (uint8) and long is 64-bit (int64); previously these were read as int8 and int32,
+    # so bytes above 127 came back negative and longs beyond 32 bits overflowed
+    values = {'byte':(np.arange(n)*20+10).astype('uint8'),
+              'long':(np.arange(n,dtype='int64')-6)*2**40+7,
+              'int':(np.arange(n,dtype='int32')-6)*100000,
+              'float':np.linspace(-1.,1.,n).astype('float32'),
+              'double':np.linspace(-1e-3,1e3,n),
+              }
+    assert values['byte'].max()>127 and np.abs(values['long']).max()>2**31
+    for type_,data in values.items():
+        graph.add_field(name=f'{type_.title()}Field',marker=f'@{len(graph.fields)+1}',definition='POINT',type=type_,nelements=1,nentries=[0])
+        graph.set_data(data,name=f'{type_.title()}Field')
+        
+    ofile = str(tmp_path / 'ascii.am')
+    graph.write(ofile,fileType='3D ASCII 2.0')
+    res = spatialgraph.SpatialGraph()
+    res.read(ofile,quiet=True)
+    for type_,data in values.items():
+        rdata = res.get_data(f'{type_.title()}Field')
+        assert rdata.dtype==res._numpy_dtype(type_), type_
+        assert np.array_equal(rdata,data), type_
+    assert res.get_data('Radii').dtype==np.float32
+    assert res.get_data('EdgeConnectivity').dtype==np.int32
+    
+if __name__=='__main__':
+    import tempfile, pathlib
+    with tempfile.TemporaryDirectory() as d:
+        test_ascii_dtypes(pathlib.Path(d))
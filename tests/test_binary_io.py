@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+Binary read/write round-trip tests for each supported field type
+
+@author: simon
+"""
+
+from pymira import spatialgraph
+import numpy as np
+import os
+
+test_file = os.path.join(os.path.dirname(__file__),'test_network.am')
+
+def _graph_with_typed_fields():
+
+    graph = spatialgraph.SpatialGraph()
+    graph.read(test_file,quiet=True)
+    n = graph.nedgepoint
+    rng = np.random.default_rng(0)
+    values = {'float':rng.random(n).astype('f')*1e3,
+              'double':rng.random(n)*1e-3,
+              'int':rng.integers(-2**31,2**31-1,n).astype('int32'),
+              'long':rng.integers(-2**62,2**62,n).astype('int64'),
+              'byte':np.arange(n).astype('uint8')*20+10,
+              }
+    for i,(type_,data) in enumerate(values.items()):
+        graph.add_field(name=f'{type_.title()}Field',marker=f'@{len(graph.fields)+1}',definition='POINT',type=type_,nelements=1,nentries=[0])
+        graph.set_data(data,name=f'{type_.title()}Field')
+    return graph, values
+
+def test_binary_roundtrip(tmp_path):
+
+    graph, values = _graph_with_typed_fields()
+    # Byte values above 127 must survive (Amira bytes are unsigned)
+    assert values['byte'].max()>127
+    
+    for fileType in ['3D BINARY-LITTLE-ENDIAN 2.1','3D BINARY 2.0']:
+        for encoding in [None,'HxByteRLE','HxZip']:
+            ofile = str(tmp_path / 'roundtrip.am')
+            graph.write(ofile,fileType=fileType,encoding=encoding)
+            
+            res = spatialgraph.SpatialGraph()
+            res.read(ofile,quiet=True)
+            for type_,data in values.items():
+                rdata = res.get_data(f'{type_.title()}Field')
+                assert rdata.dtype==res._numpy_dtype(type_)
+                assert np.array_equal(rdata,data), (fileType,encoding,type_)
+            for name in ['VertexCoordinates','EdgeConnectivity','NumEdgePoints','EdgePointCoordinates','Radii']:
+                assert np.allclose(res.get_data(name),graph.get_data(name))
+                
+def test_dtypes():
+
+    am = spatialgraph.SpatialGraph()
+    assert am._numpy_dtype('byte')==np.uint8
+    assert am._numpy_dtype('long')==np.int64
+    assert am._numpy_dtype('int')==np.int32
+    assert am._numpy_dtype('double')==np.float64
+    assert am._numpy_dtype('float')==np.float32
+
+if __name__=='__main__':
+    import tempfile, pathlib
+    with tempfile.TemporaryDirectory() as d:
+        test_binary_roundtrip(pathlib.Path(d))
+    test_dtypes()
+    print('Binary round-trip OK')
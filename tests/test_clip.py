@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Cropping with constrain_nodes(clip_edges=True)
+
+@author: simon
+"""
+
+import numpy as np
+import pytest
+
+def clip_graph(load_graph):
+
+    graph = load_graph()
+    with graph.batch_edit() as tx:
+        # Two-point edge leaving the box
+        a = tx.add_node([-3.,0.,0.])
+        tx.add_edge(0,a)
+        # Edge that leaves the box, comes back in and leaves again
+        b = tx.add_node([1.,-2.,0.])
+        tx.add_edge(1,b,points=[[1.,0.,0.],[1.4,0.,0.],[1.,-0.5,0.],[1.,-2.,0.]])
+        
+    # Point fields that are linear in the coordinates, so interpolated values can be checked exactly
+    points = graph.get_data('EdgePointCoordinates')
+    graph.set_data((points[:,0]+10.*points[:,1]).astype('float32'),name='Radii')
+    graph.add_field(name='Vec',marker=f'@{len(graph.fields)+1}',definition='POINT',type='double',nelements=2,nentries=[0])
+    graph.set_data(points[:,:2].astype('float64')*2.,name='Vec')
+    graph.add_field(name='Label',marker=f'@{len(graph.fields)+1}',definition='POINT',type='int',nelements=1,nentries=[0])
+    graph.set_data(np.arange(graph.nedgepoint,dtype='int32'),name='Label')
+    graph.add_field(name='NodeVal',marker=f'@{len(graph.fields)+1}',definition='VERTEX',type='float',nelements=1,nentries=[0])
+    graph.set_data(np.arange(graph.nnode,dtype='float32')*10.,name='NodeVal')
+    return graph
+    
+def edge_points(graph,i):
+    offsets = graph.edge_offsets()
+    return slice(offsets[i],offsets[i+1])
+
+def test_clip_edges(load_graph):
+
+    graph = clip_graph(load_graph)
+    res = graph.constrain_nodes(xrange=[-1.,1.2],yrange=[-1.,3.],clip_edges=True)
+    
+    nodes = res.get_data('VertexCoordinates')
+    ec = res.get_data('EdgeConnectivity')
+    points = res.get_data('EdgePointCoordinates')
+    assert res.nnode==6 and res.nedge==5
+    for name in res.fieldNames:
+        f = res.get_field(name)
+        size = {'vertex':res.nnode,'edge':res.nedge,'point':res.nedgepoint}[f['definition'].lower()]
+        assert f['data'].shape[0]==size, name
+    assert np.all(res.edge_offsets()[-1]==res.nedgepoint)
+    
+    # Edge ends match their nodes
+    offsets = res.edge_offsets()
+    assert np.allclose(points[offsets[:-1]],nodes[ec[:,0]])
+    assert np.allclose(points[offsets[1:]-1],nodes[ec[:,1]])
+    
+    # Point fields follow the coordinates, including the multi-component field
+    assert np.allclose(res.get_data('Radii'),points[:,0]+10.*points[:,1])
+    assert res.get_data('Vec').shape==(res.nedgepoint,2)
+    assert np.allclose(res.get_data('Vec'),points[:,:2]*2.)
+    
+    expected = {(1.,1.):[[1.,1.,0.],[1.2,1.12,0.]],       # 3 point edge cut at x=1.2
+                (0.,0.):[[0.,0.,0.],[-1.,0.,0.]],         # 2 point edge
+                (1.,0.):[[1.,0.,0.],[1.2,0.,0.]],         # cut where it first leaves (later points dropped)
+                }
+    nclip = 0
+    for i in range(res.nedge):
+        e = edge_points(res,i)
+        key = tuple(points[e][0,:2].tolist())
+        if ec[i,1]<3:
+            continue
+        nclip += 1
+        assert np.allclose(points[e],expected[key]), key
+        # Integer fields take the value of the last point inside
+        labels = res.get_data('Label')[e]
+        assert labels[-1]==labels[-2]
+        # New nodes take the node values of the outside node they replace
+        outside = {(1.,1.):3,(0.,0.):5,(1.,0.):6}[key]
+        assert res.get_data('NodeVal')[ec[i,1]]==outside*10.
+    assert nclip==3
+    
+if __name__=='__main__':
+    pytest.main([__file__])
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Node deletion with delete_vertices and the index helpers it uses
+
+@author: simon
+"""
+
+from pymira import spatialgraph
+import numpy as np
+import pytest
+
+def test_index_helpers():
+
+    keep = np.asarray([True,False,True,True,False])
+    assert spatialgraph.index_lookup(keep).tolist()==[0,-1,1,2,-1]
+    
+    vals = np.arange(5)*10
+    # Index pairs referring to deleted entries are removed, the rest renumbered
+    new_vals,new_inds,lookup = spatialgraph.update_array_index(vals,np.asarray([[0,2],[1,2],[3,0],[4,4]]),keep)
+    assert new_vals.tolist()==[0,20,30]
+    assert new_inds.tolist()==[[0,1],[2,0]]
+    assert lookup.tolist()==[0,-1,1,2,-1]
+    # Nested lists of varying length
+    _,new_inds,_ = spatialgraph.update_array_index(vals,[[0,2,3],[1],[],[3]],keep)
+    assert [x.tolist() for x in new_inds]==[[0,1,2],[],[2]]
+    
+    edgeconn = np.asarray([[0,1],[1,2],[2,3]])
+    keep_edges,keep_points,node_lookup,edge_lookup,point_lookup = spatialgraph.deletion_masks(edgeconn,np.asarray([2,3,2]),[True,True,False,True])
+    assert keep_edges.tolist()==[True,False,False]
+    assert keep_points.tolist()==[True,True,False,False,False,False,False]
+    assert node_lookup.tolist()==[0,1,-1,2]
+    assert edge_lookup.tolist()==[0,-1,-1]
+    assert point_lookup.tolist()==[0,1,-1,-1,-1,-1,-1]
+
+def test_delete_vertices(load_graph):
+
+    graph = load_graph()
+    graph.add_field(name='EdgeVal',marker=f'@{len(graph.fields)+1}',definition='EDGE',type='int',nelements=1,nentries=[0])
+    graph.set_data(np.arange(graph.nedge,dtype='int32')+100,name='EdgeVal')
+    graph.add_field(name='Vec',marker=f'@{len(graph.fields)+1}',definition='POINT',type='float',nelements=2,nentries=[0])
+    graph.set_data(graph.get_data('EdgePointCoordinates')[:,:2].copy(),name='Vec')
+    
+    verts = graph.get_data('VertexCoordinates').copy()
+    points = graph.get_data('EdgePointCoordinates').copy()
+    
+    keep = np.asarray([True,True,False,True,True])
+    graph,node_lookup,edge_lookup,point_lookup = spatialgraph.delete_vertices(graph,keep,return_lookups=True)
+    
+    # Edges 1 and 2 contain node 2
+    assert node_lookup.tolist()==[0,1,-1,2,3]
+    assert edge_lookup.tolist()==[0,-1,-1,1]
+    assert point_lookup.tolist()==[0,1,2,-1,-1,-1,-1,-1,-1,3,4,5]
+    assert graph.nnode==4 and graph.nedge==2 and graph.nedgepoint==6
+    assert graph.get_data('EdgeConnectivity').tolist()==[[0,1],[2,3]]
+    assert np.array_equal(graph.get_data('VertexCoordinates'),verts[keep])
+    assert graph.get_data('NumEdgePoints').tolist()==[3,3]
+    assert graph.get_data('Radii').tolist()==[0,1,2,9,10,11]
+    assert graph.get_data('EdgeVal').tolist()==[100,103]
+    assert np.array_equal(graph.get_data('EdgePointCoordinates'),points[point_lookup>=0])
+    assert np.array_equal(graph.get_data('Vec'),points[point_lookup>=0,:2])
+    for f in graph.fields:
+        size = {'vertex':graph.nnode,'edge':graph.nedge,'point':graph.nedgepoint}[f['definition'].lower()]
+        assert f['data'].shape[0]==size, f['name']
+        
+    # Other return options
+    graph = load_graph()
+    graph,keep_edges = spatialgraph.delete_vertices(graph,[False,True,True,True,True],return_keep_edge=True)
+    assert keep_edges.tolist()==[False,True,True,True]
+    assert graph.get_data('EdgeConnectivity').tolist()==[[0,1],[1,2],[2,3]]
+    
+def test_delete_vertices_bad_fields(load_graph):
+
+    # Fields that can't be subset consistently are refused, leaving the graph unchanged
+    for definition,n in [('POINT',7),('EDGE',5),('',12),('LATTICE',12)]:
+        graph = load_graph()
+        graph.add_field(name='Bad',marker=f'@{len(graph.fields)+1}',definition=definition,type='float',nelements=1,nentries=[0])
+        graph.set_data(np.zeros(n,dtype='float32'),name='Bad')
+        with pytest.raises(ValueError):
+            spatialgraph.delete_vertices(graph,[True,True,False,True,True])
+        assert graph.nnode==5 and graph.nedge==4 and graph.get_data('Radii').shape[0]==12
+        
+    with pytest.raises(ValueError):
+        spatialgraph.delete_vertices(load_graph(),[True,False])
+    
+if __name__=='__main__':
+    pytest.main([__file__])
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Converting interior edge points to nodes with GVars.convert_edgepoints_to_nodes
+
+@author: simon
+"""
+
+from pymira import spatialgraph
+import numpy as np
+import pytest
+
+def test_convert_edgepoints_to_nodes(load_graph):
+
+    graph = load_graph()
+    graph.add_field(name='NodeVal',marker=f'@{len(graph.fields)+1}',definition='VERTEX',type='float',nelements=1,nentries=[0])
+    graph.set_data(np.arange(graph.nnode,dtype='float32')+100.,name='NodeVal')
+    points = graph.get_data('EdgePointCoordinates').copy()
+    verts = graph.get_data('VertexCoordinates').copy()
+    radii = graph.get_data('Radii').copy()
+    
+    gv = spatialgraph.GVars(graph)
+    gv.convert_edgepoints_to_nodes()
+    graph = gv.set_in_graph()
+    
+    # One new node per interior point (points 1,4,7,10), and one two-point edge per segment
+    assert graph.nnode==9 and graph.nedge==8 and graph.nedgepoint==16
+    assert np.all(graph.get_data('NumEdgePoints')==2)
+    nodes = graph.get_data('VertexCoordinates')
+    assert np.allclose(nodes[:5],verts)
+    assert np.allclose(nodes[5:],points[[1,4,7,10]])
+    
+    # First segments keep the original edge indices, the second segments follow in order
+    ec = graph.get_data('EdgeConnectivity')
+    assert ec.tolist()==[[0,5],[1,6],[2,7],[3,8],[5,1],[6,2],[7,3],[8,4]]
+    new_points = graph.get_data('EdgePointCoordinates').reshape(-1,2,3)
+    assert np.allclose(new_points[:,0],nodes[ec[:,0]]) and np.allclose(new_points[:,1],nodes[ec[:,1]])
+    assert graph.get_data('Radii').reshape(-1,2).tolist()==[[0,1],[3,4],[6,7],[9,10],[1,2],[4,5],[7,8],[10,11]]
+    assert np.array_equal(np.unique(graph.get_data('Radii')),radii)
+    
+    # No point field of the same name, so new nodes take the original edge's start node value
+    assert graph.get_data('NodeVal').tolist()==[100.,101.,102.,103.,104.,100.,101.,102.,103.]
+    
+def test_node_values_from_points(load_graph):
+
+    graph = load_graph()
+    # Vertex field sharing its name with the Radii point field
+    graph.add_field(name='Radii',marker=f'@{len(graph.fields)+1}',definition='VERTEX',type='float',nelements=1,nentries=[0])
+    graph.set_data(np.arange(graph.nnode,dtype='float32')*10.,marker=graph.fields[-1]['marker'])
+    
+    gv = spatialgraph.GVars(graph)
+    gv.convert_edgepoints_to_nodes()
+    node_radii = gv.node_scalar_values[[x['name'] for x in gv.node_scalars].index('Radii')][gv.nodecoords_allocated]
+    assert node_radii.tolist()==[0.,10.,20.,30.,40.,1.,4.,7.,10.]
+    
+if __name__=='__main__':
+    pytest.main([__file__])
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Indexed field lookup (get_field) and the cached radius field stay correct when fields are edited directly
+
+@author: simon
+"""
+
+from pymira import spatialgraph
+import os
+
+test_file = os.path.join(os.path.dirname(__file__),'test_network.am')
+
+def test_field_index():
+
+    graph = spatialgraph.SpatialGraph()
+    graph.read(test_file,quiet=True)
+    radii = graph.get_field('Radii')
+    assert graph.get_field(marker='@5') is radii
+    assert graph.get_field('Missing') is None
+    
+    # Renaming a field dict directly
+    radii['name'] = 'Thickness'
+    assert graph.get_field('Radii') is None
+    assert graph.get_field('Thickness') is radii
+    
+    # Replacing a field dict in place
+    new = dict(radii,name='Radii',marker='@6')
+    graph.fields[4] = new
+    assert graph.get_field('Thickness') is None
+    assert graph.get_field('Radii') is new
+    assert graph.get_field(marker='@5') is None
+    assert graph.get_field(marker='@6') is new
+    assert graph.get_data('Radii') is new['data']
+    
+    # Changing a marker directly
+    new['marker'] = '@7'
+    assert graph.get_field(marker='@6') is None
+    assert graph.get_field(marker='@7') is new
+    
+def test_radius_field_cache():
+
+    graph = spatialgraph.SpatialGraph()
+    graph.read(test_file,quiet=True)
+    radii = graph.get_field('Radii')
+    assert graph.get_radius_field() is radii
+    
+    radii['name'] = 'Width'
+    assert graph.get_radius_field() is None
+    radii['name'] = 'thickness'
+    assert graph.get_radius_field() is radii
+    assert graph.get_radius_field_name()=='thickness'
+    
+    new = dict(radii,name='Diameter')
+    graph.fields[4] = new
+    assert graph.get_radius_field() is new
+    assert graph.get_radius_data() is new['data']
+    
+    # Added/removed fields
+    graph.add_field(name='Radius',marker='@6',definition='POINT',type='float',nelements=1,nentries=[0],data=new['data'])
+    assert graph.get_radius_field_name()=='Radius'
+    graph.remove_field('Radius')
+    assert graph.get_radius_field_name()=='Diameter'
+    
+if __name__=='__main__':
+    test_field_index()
+    test_radius_field_cache()
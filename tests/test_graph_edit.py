@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Batched topology edits with SpatialGraph.batch_edit (GraphEdit)
+
+@author: simon
+"""
+
+import numpy as np
+import pytest
+
+def snapshot(graph):
+    return {f['marker']:f['data'].copy() for f in graph.fields}
+
+def check_consistent(graph):
+
+    sizes = {'vertex':graph.nnode,'edge':graph.nedge,'point':graph.nedgepoint}
+    for f in graph.fields:
+        assert f['data'].shape[0]==sizes[f['definition'].lower()], f['name']
+    offsets = graph.edge_offsets()
+    nodes,ec,points = graph.get_data('VertexCoordinates'),graph.get_data('EdgeConnectivity'),graph.get_data('EdgePointCoordinates')
+    assert np.allclose(points[offsets[:-1]],nodes[ec[:,0]])
+    assert np.allclose(points[offsets[1:]-1],nodes[ec[:,1]])
+
+def test_split_node_scalars(load_graph):
+
+    graph = load_graph()
+    # Vertex field sharing its name with the Radii point field, and one with no point equivalent
+    graph.add_field(name='Radii',marker=f'@{len(graph.fields)+1}',definition='VERTEX',type='float',nelements=1,nentries=[0])
+    node_radii = graph.fields[-1]['marker']
+    graph.set_data(np.arange(graph.nnode,dtype='float32')*10.,marker=node_radii)
+    graph.add_field(name='NodeVal',marker=f'@{len(graph.fields)+1}',definition='VERTEX',type='float',nelements=1,nentries=[0])
+    graph.set_data(np.arange(graph.nnode,dtype='float32')+100.,name='NodeVal')
+    
+    with graph.batch_edit() as tx:
+        n0,e0 = tx.split_edge(1,1)
+        n1,e1 = tx.split_edge(2,1)
+    check_consistent(graph)
+    assert graph.nnode==7 and graph.nedge==6
+    
+    # Node values come from the point at the split (edge 1 points are 3-5, edge 2 points 6-8)
+    assert graph.get_data(marker=node_radii)[[n0,n1]].tolist()==[4.,7.]
+    assert np.allclose(graph.get_data('VertexCoordinates')[n0],[1.5,0.5,0.])
+    # ... or the split edge's start node where there is no point field of the same name
+    assert graph.get_data('NodeVal')[[n0,n1]].tolist()==[101.,102.]
+    assert graph.get_data(marker=node_radii)[:5].tolist()==[0.,10.,20.,30.,40.]
+    
+def test_delete_split_edge(load_graph):
+
+    graph = load_graph()
+    with graph.batch_edit() as tx:
+        n0,e0 = tx.split_edge(1,1)
+        n1,e1 = tx.split_edge(3,1)
+        tx.delete_edge(1)
+        tx.delete_edge(e1)
+    check_consistent(graph)
+    
+    # Every piece of edge 1 goes, and only the second piece of edge 3
+    assert tx.edge_lookup.tolist()==[0,-1,1,2,-1,-1]
+    assert graph.get_data('EdgeConnectivity').tolist()==[[0,1],[2,3],[3,6]]
+    assert graph.get_data('Radii').tolist()==[0,1,2,6,7,8,9,10]
+    # Split nodes are kept
+    assert graph.nnode==7
+    assert tx.node_lookup[[n0,n1]].tolist()==[5,6]
+    
+    # Same again with the deletion recorded before the split
+    graph = load_graph()
+    with graph.batch_edit() as tx:
+        tx.delete_edge(2)
+        tx.split_edge(2,1)
+    check_consistent(graph)
+    assert graph.get_data('EdgeConnectivity').tolist()==[[0,1],[1,2],[3,4]]
+    
+def test_rollback(load_graph):
+
+    graph = load_graph()
+    before = snapshot(graph)
+    sizes = (graph.nnode,graph.nedge,graph.nedgepoint)
+    
+    with pytest.raises(RuntimeError):
+        with graph.batch_edit() as tx:
+            n = tx.add_node([5.,5.,5.])
+            tx.add_edge(0,n)
+            tx.split_edge(1,1)
+            tx.delete_node(4)
+            tx.move_node(0,[1.,1.,1.])
+            raise RuntimeError('abandon edit')
+    assert not tx.committed and tx.node_lookup is None
+    assert (graph.nnode,graph.nedge,graph.nedgepoint)==sizes
+    for marker,data in snapshot(graph).items():
+        assert np.array_equal(data,before[marker])
+        
+    # Invalid edits found on commit leave the graph unchanged too
+    with pytest.raises(ValueError):
+        with graph.batch_edit() as tx:
+            tx.delete_node(4)
+            tx.split_edge(1,1)
+            tx.split_edge(1,1)
+    assert (graph.nnode,graph.nedge,graph.nedgepoint)==sizes
+    for marker,data in snapshot(graph).items():
+        assert np.array_equal(data,before[marker])
+    
+def test_bad_fields(load_graph):
+
+    # Fields that can't be edited consistently are refused on commit, leaving the graph unchanged
+    for definition,n in [('POINT',7),('',12)]:
+        graph = load_graph()
+        graph.add_field(name='Bad',marker=f'@{len(graph.fields)+1}',definition=definition,type='float',nelements=1,nentries=[0])
+        graph.set_data(np.zeros(n,dtype='float32'),name='Bad')
+        before = snapshot(graph)
+        with pytest.raises(ValueError):
+            with graph.batch_edit() as tx:
+                tx.split_edge(1,1)
+                tx.delete_node(4)
+        assert graph.nnode==5 and graph.nedge==4
+        for marker,data in snapshot(graph).items():
+            assert np.array_equal(data,before[marker])
+    
+def test_add_edge_points(load_graph):
+
+    graph = load_graph()
+    with graph.batch_edit() as tx:
+        n = tx.add_node([5.,5.,0.])
+        s,_ = tx.split_edge(1,1)
+        # Edge points must run from the start node to the end node (including new and split nodes)
+        e = tx.add_edge(n,s,points=[[5.,5.,0.],[3.,3.,0.],[1.5,0.5,0.]])
+        with pytest.raises(ValueError):
+            tx.add_edge(0,n,points=[[0.,0.,0.],[5.,5.,1.]])
+        with pytest.raises(ValueError):
+            tx.add_edge(s,n,points=[[5.,5.,0.],[1.5,0.5,0.]])
+    check_consistent(graph)
+    assert graph.nedge==6
+    assert graph.get_data('EdgeConnectivity')[tx.edge_lookup[e]].tolist()==[tx.node_lookup[n],tx.node_lookup[s]]
+    
+if __name__=='__main__':
+    pytest.main([__file__])
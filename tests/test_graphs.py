@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Connected subgraph labelling with SpatialGraph.identify_graphs
+
+@author: simon
+"""
+
+from pymira import spatialgraph
+import numpy as np
+import os
+import pytest
+
+test_file = os.path.join(os.path.dirname(__file__),'test_network.am')
+
+def brute_force_components(nnode,edgeconn):
+
+    # Sets of connected nodes, by repeated flood fill
+    label = -np.ones(nnode,dtype='int')
+    for seed in range(nnode):
+        if label[seed]>=0:
+            continue
+        label[seed] = seed
+        front = [seed]
+        while len(front)>0:
+            n = front.pop()
+            for s,e in edgeconn:
+                for a,b in [(s,e),(e,s)]:
+                    if a==n and label[b]<0:
+                        label[b] = seed
+                        front.append(b)
+    return sorted([frozenset(np.where(label==l)[0].tolist()) for l in np.unique(label)],key=min)
+
+def test_identify_graphs():
+
+    graph = spatialgraph.SpatialGraph()
+    graph.read(test_file,quiet=True)
+    
+    node_graph_index, counts = graph.identify_graphs()
+    assert node_graph_index.tolist()==[0]*5
+    assert counts.tolist()==[5]
+    
+    # Add a closed loop (no end nodes), an isolated node and a single-edge graph
+    with graph.batch_edit() as tx:
+        loop = [tx.add_node([10.+i,0.,0.]) for i in range(3)]
+        for i in range(3):
+            tx.add_edge(loop[i],loop[(i+1)%3])
+        tx.add_node([20.,0.,0.])
+        a,b = tx.add_node([30.,0.,0.]),tx.add_node([31.,0.,0.])
+        tx.add_edge(b,a)
+    assert graph.nnode==11
+    
+    node_graph_index, counts = graph.identify_graphs()
+    expected = brute_force_components(graph.nnode,graph.get_data('EdgeConnectivity'))
+    assert sorted([frozenset(np.where(node_graph_index==i)[0].tolist()) for i in range(counts.shape[0])],key=min)==expected
+    assert counts.sum()==graph.nnode
+    # Ordered by lowest end node (chain, isolated node, single edge), then loops
+    assert node_graph_index.tolist()==[0,0,0,0,0,3,3,3,1,2,2]
+    assert counts.tolist()==[5,1,2,3]
+    
+def test_identify_graphs_ignore():
+
+    graph = spatialgraph.SpatialGraph()
+    graph.read(test_file,quiet=True)
+    
+    ignore_edge = np.zeros(graph.nedge,dtype='bool')
+    ignore_edge[1] = True
+    node_graph_index, counts = graph.identify_graphs(ignore_edge=ignore_edge)
+    assert node_graph_index.tolist()==[0,0,1,1,1]
+    assert counts.tolist()==[2,3]
+    
+    # Edges touching an ignored node are not used; node 2 is no longer an end node but is left on its own
+    ignore_node = np.zeros(graph.nnode,dtype='bool')
+    ignore_node[2] = True
+    node_graph_index, counts = graph.identify_graphs(ignore_node=ignore_node)
+    assert node_graph_index.tolist()==[0,0,2,1,1]
+    assert counts.tolist()==[2,2,1]
+    
+    # GraphIndex point field, following each edge's start node
+    graph.identify_graphs(ignore_edge=ignore_edge,add_to_graph=True)
+    gi = graph.get_data('GraphIndex')
+    assert gi.shape[0]==graph.nedgepoint
+    assert gi.tolist()==np.repeat([0,0,1,1],3).tolist()
+    
+def test_identify_graphs_removed_args():
+
+    graph = spatialgraph.SpatialGraph()
+    graph.read(test_file,quiet=True)
+    
+    # progBar and add_scalar were accepted but ignored; they are no longer accepted
+    for kw in ['progBar','add_scalar']:
+        with pytest.raises(TypeError):
+            graph.identify_graphs(**{kw:True})
+    assert 'Graph' not in graph.fieldNames
+    
+if __name__=='__main__':
+    test_identify_graphs()
+    test_identify_graphs_ignore()
+    test_identify_graphs_removed_args()
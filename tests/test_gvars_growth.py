@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Capacity growth when building graphs incrementally with GVars (timings: benchmark_gvars.py)
+
+@author: simon
+"""
+
+from pymira import spatialgraph
+import numpy as np
+
+def seed_graph():
+
+    graph = spatialgraph.SpatialGraph(initialise=True,scalars=['Radii'],node_scalars=[])
+    graph.set_definition_size('VERTEX',2)
+    graph.set_definition_size('EDGE',1)
+    graph.set_definition_size('POINT',2)
+    graph.set_data(np.asarray([[0.,0.,0.],[1.,0.,0.]],dtype='float32'),name='VertexCoordinates')
+    graph.set_data(np.asarray([[0,1]],dtype='int'),name='EdgeConnectivity')
+    graph.set_data(np.asarray([2],dtype='int'),name='NumEdgePoints')
+    graph.set_data(np.asarray([[0.,0.,0.],[1.,0.,0.]],dtype='float32'),name='EdgePointCoordinates')
+    graph.set_data(np.asarray([1.,1.]),name='Radii')
+    return graph
+    
+def build_chain(gv,nedge):
+
+    # Append a chain of edges, counting how many times each buffer is reallocated
+    nrealloc = {'nodecoords':0,'edgeconn':0,'edgepoints':0}
+    for i in range(nedge):
+        prev = {k:getattr(gv,k) for k in nrealloc}
+        gv.add_node(np.asarray([i+2.,0.,0.]))
+        gv.add_edge(i+1,i+2,[1.])
+        for k in nrealloc:
+            nrealloc[k] += getattr(gv,k) is not prev[k]
+    return nrealloc
+
+def test_growth():
+
+    gv = spatialgraph.GVars(seed_graph())
+    gv.n_all = 10
+    assert gv._growth(100,50)==0
+    assert gv._growth(100,100)==0
+    # At least doubles, and always covers the shortfall
+    assert gv._growth(100,101)==100
+    assert gv._growth(100,350)==250
+    assert gv._growth(0,1)==10
+
+def test_add_edge_growth():
+
+    nedge = 5000
+    gv = spatialgraph.GVars(seed_graph())
+    nrealloc = build_chain(gv,nedge)
+    # Capacity grows geometrically, so only a logarithmic number of reallocations occur
+    for k,n in nrealloc.items():
+        assert 0<n<=int(np.log2(nedge))+1, (k,n)
+    assert gv.edgeconn.shape[0]<4*(nedge+1)
+    
+    graph = gv.set_in_graph()
+    assert graph.nnode==nedge+2
+    assert graph.nedge==nedge+1
+    assert graph.nedgepoint==2*nedge+2
+    assert np.all(graph.get_data('EdgeConnectivity')[1:,0]==np.arange(1,nedge+1))
+    assert graph.get_data('EdgePointCoordinates').dtype==np.dtype('float32')
+    
+def test_reserve():
+
+    nedge = 2000
+    gv = spatialgraph.GVars(seed_graph())
+    gv.reserve(nodes=nedge+2,edges=nedge+1,points=2*nedge+2)
+    # No reallocation at all once enough capacity is reserved
+    assert build_chain(gv,nedge)=={'nodecoords':0,'edgeconn':0,'edgepoints':0}
+    graph = gv.set_in_graph()
+    assert graph.nedge==nedge+1 and graph.nedgepoint==2*nedge+2
+    
+    # Reserving less than the current capacity does nothing
+    shape = gv.edgeconn.shape
+    gv.reserve(edges=1)
+    assert gv.edgeconn.shape==shape
+    
+if __name__=='__main__':
+    test_growth()
+    test_add_edge_growth()
+    test_reserve()
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Merging chains of two-connection nodes with Editor.remove_intermediate_nodes
+
+@author: simon
+"""
+
+from pymira import spatialgraph
+import numpy as np
+import pytest
+
+def reverse_edges(graph,reverse):
+
+    # Reverse some edges (connectivity, points and point values)
+    ec = graph.get_data('EdgeConnectivity').copy()
+    offsets = graph.edge_offsets()
+    order = np.arange(graph.nedgepoint)
+    for i in reverse:
+        ec[i] = ec[i,::-1]
+        order[offsets[i]:offsets[i+1]] = order[offsets[i]:offsets[i+1]][::-1]
+    graph.set_data(ec,name='EdgeConnectivity')
+    graph.set_data(graph.get_data('EdgePointCoordinates')[order],name='EdgePointCoordinates')
+    graph.set_data(graph.get_data('Radii')[order],name='Radii')
+    return graph
+
+def test_remove_intermediate_nodes(load_graph):
+
+    for reverse in [[],[1,2],[0,3]]:
+        graph = reverse_edges(load_graph(),reverse)
+        points = graph.get_data('EdgePointCoordinates').copy()
+        radii = graph.get_data('Radii').copy()
+        verts = graph.get_data('VertexCoordinates').copy()
+        res = spatialgraph.Editor().remove_intermediate_nodes(graph,decimate=False)
+        
+        # The chain collapses to a single edge between the end nodes, keeping every point once
+        assert res.nnode==2 and res.nedge==1
+        assert np.allclose(res.get_data('VertexCoordinates'),verts[[0,4]])
+        assert res.get_data('EdgeConnectivity').tolist()==[[0,1]]
+        assert res.get_data('NumEdgePoints').tolist()==[9]
+        expected = np.asarray([[0.,0.,0.],[0.5,0.,0.],[1.,0.,0.],[1.5,0.5,0.],[1.,1.,0.],[2.,1.6,0.],[2.,2.,0.],[1.7,4.5,0.],[2.,5.,0.]])
+        assert np.allclose(res.get_data('EdgePointCoordinates'),expected), reverse
+        # Point values follow their points
+        for p,r in zip(res.get_data('EdgePointCoordinates'),res.get_data('Radii')):
+            assert r in radii[np.all(np.isclose(points,p),axis=1)], reverse
+        if len(reverse)==0:
+            assert res.get_data('Radii').tolist()==[0,1,2,4,5,7,8,10,11]
+        
+def test_decimate(load_graph):
+
+    graph = load_graph()
+    res = spatialgraph.Editor().remove_intermediate_nodes(graph,decimate=True)
+    assert res.nnode==2 and res.nedge==1
+    # First, last and every second point of the merged edges (as before vectorising)
+    assert res.get_data('Radii').tolist()==[0,2,4,6,8,10,11]
+    pts = res.get_data('EdgePointCoordinates')
+    assert np.allclose(pts[[0,-1]],[[0.,0.,0.],[2.,5.,0.]])
+    
+def test_ring_and_branch(load_graph):
+
+    graph = load_graph()
+    with graph.batch_edit() as tx:
+        # Branch at node 2, so the chain is split there
+        n = tx.add_node([0.,2.,0.])
+        tx.add_edge(2,n)
+        # Ring made only of two-connection nodes
+        ring = [tx.add_node([10.+i,i%2,0.]) for i in range(3)]
+        for i in range(3):
+            tx.add_edge(ring[i],ring[(i+1)%3])
+    res = spatialgraph.Editor().remove_intermediate_nodes(graph)
+    
+    assert res.nnode==4 and res.nedge==3
+    nodes = res.get_data('VertexCoordinates')
+    assert np.allclose(nodes,[[0.,0.,0.],[1.,1.,0.],[2.,5.,0.],[0.,2.,0.]])
+    assert sorted(res.get_data('EdgeConnectivity').tolist())==[[0,1],[1,2],[1,3]]
+    offsets = res.edge_offsets()
+    ec = res.get_data('EdgeConnectivity')
+    pts = res.get_data('EdgePointCoordinates')
+    assert np.allclose(pts[offsets[:-1]],nodes[ec[:,0]]) and np.allclose(pts[offsets[1:]-1],nodes[ec[:,1]])
+    for f in res.fields:
+        size = {'vertex':res.nnode,'edge':res.nedge,'point':res.nedgepoint}[f['definition'].lower()]
+        assert f['data'].shape[0]==size, f['name']
+    
+def test_bad_fields(load_graph):
+
+    # Fields that can't be merged consistently are refused, leaving the graph unchanged
+    for definition,n in [('EDGE',3),('',12)]:
+        graph = load_graph()
+        graph.add_field(name='Bad',marker=f'@{len(graph.fields)+1}',definition=definition,type='float',nelements=1,nentries=[0])
+        graph.set_data(np.zeros(n,dtype='float32'),name='Bad')
+        with pytest.raises(ValueError):
+            spatialgraph.Editor().remove_intermediate_nodes(graph)
+        assert graph.nnode==5 and graph.nedge==4 and graph.get_data('Radii').shape[0]==12
+    
+if __name__=='__main__':
+    pytest.main([__file__])
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""
+JSON export/import round trips
+
+@author: simon
+"""
+
+from pymira import spatialgraph
+import numpy as np
+import os
+
+test_file = os.path.join(os.path.dirname(__file__),'test_network.am')
+
+def test_json_roundtrip(tmp_path):
+
+    graph = spatialgraph.SpatialGraph()
+    graph.read(test_file,quiet=True)
+    
+    for sidecar in [None,'base64','buffer']:
+        ofile = str(tmp_path / f'graph_{sidecar}.json')
+        graph.write_json(ofile,sidecar=sidecar)
+        data = graph.read_json_arrays(ofile)
+        for f in graph.fields:
+            name = 'Radius' if f['name']=='Radii' else f['name']
+            assert data[name].shape==f['data'].shape
+            assert np.allclose(data[name],f['data'])
+            
+def test_json_shapes(tmp_path):
+
+    # 1D lists are never reshaped, even when their length is a multiple of another field's row count,
+    # and ragged lists of lists are not forced into a 2D array
+    ofile = str(tmp_path / 'shapes.json')
+    with open(ofile,'w') as f:
+        f.write('{"Rows": [[1, 2], [3, 4]],\n "Flat": [1, 2, 3, 4],\n "Ragged": [[1, 2, 3], [4]],\n "Single": [[1.5, 2, 3, 4]]}\n')
+    data = spatialgraph.SpatialGraph().read_json_arrays(ofile)
+    assert data['Rows'].shape==(2,2)
+    assert data['Flat'].shape==(4,)
+    assert data['Ragged']==[[1,2,3],[4]]
+    assert data['Single'].shape==(1,4) and data['Single'].dtype.kind=='f'
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+Memory-mapped (lazy) loading of binary files
+
+@author: simon
+"""
+
+from pymira import spatialgraph
+import numpy as np
+import os
+
+test_file = os.path.join(os.path.dirname(__file__),'test_network.am')
+
+def test_mmap_read(tmp_path):
+
+    graph = spatialgraph.SpatialGraph()
+    graph.read(test_file,quiet=True)
+    
+    for fileType in ['3D BINARY-LITTLE-ENDIAN 2.1','3D BINARY 2.0']:
+        for encoding in [None,'HxZip']:
+            ofile = str(tmp_path / 'mmap.am')
+            graph.write(ofile,fileType=fileType,encoding=encoding)
+            
+            res = spatialgraph.SpatialGraph()
+            res.read(ofile,quiet=True,mmap=True)
+            assert res.nnode==graph.nnode and res.nedge==graph.nedge and res.nedgepoint==graph.nedgepoint
+            for f in graph.fields:
+                data = res.get_data(f['name'])
+                # Raw fields are mapped from the file, encoded fields are decoded
+                assert isinstance(data,np.memmap)==(encoding is None)
+                assert np.array_equal(data,f['data'])
+            del res
+            
+if __name__=='__main__':
+    import tempfile, pathlib
+    with tempfile.TemporaryDirectory() as d:
+        test_mmap_read(pathlib.Path(d))
+    print('mmap read OK')
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+Threaded field decoding in AmiraMesh.read gives the same result as serial reading
+
+@author: simon
+"""
+
+from pymira import spatialgraph
+import numpy as np
+import os
+
+test_file = os.path.join(os.path.dirname(__file__),'test_network.am')
+
+def test_parallel_read(tmp_path,capsys):
+
+    graph = spatialgraph.SpatialGraph()
+    graph.read(test_file,quiet=True)
+    # Small files are always read serially, with a message unless quiet
+    assert graph._parallel_workers(4)==1
+    graph.read(test_file,workers=4)
+    assert 'Reading field data serially' in capsys.readouterr().out
+    graph.read(test_file,quiet=True,workers=4)
+    assert capsys.readouterr().out==''
+    
+    for fileType,encoding in [('3D ASCII 2.0',None),('3D BINARY-LITTLE-ENDIAN 2.1','HxZip')]:
+        ofile = str(tmp_path / 'parallel.am')
+        graph.write(ofile,fileType=fileType,encoding=encoding)
+        res = spatialgraph.SpatialGraph()
+        res._parallel_workers = lambda workers: workers
+        res.read(ofile,quiet=True,workers=3)
+        assert res.fieldNames==graph.fieldNames
+        for f in graph.fields:
+            assert np.array_equal(res.get_data(f['name']),f['data'])
+            
+    # Unparseable values are still reported
+    with open(str(tmp_path / 'bad.am'),'w') as f:
+        f.write(open(test_file).read().replace('@5\n0.1\n0.1','@5\n0.1\nx'))
+    res = spatialgraph.SpatialGraph()
+    res._parallel_workers = lambda workers: workers
+    res.read(str(tmp_path / 'bad.am'),quiet=True,workers=2)
+    assert res.get_data('Radii') is None
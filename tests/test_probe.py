@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+Header-only reading and SpatialGraph.probe
+
+@author: simon
+"""
+
+from pymira import spatialgraph
+import os
+
+test_file = os.path.join(os.path.dirname(__file__),'test_network.am')
+
+def test_probe(tmp_path):
+
+    graph = spatialgraph.SpatialGraph()
+    graph.read(test_file,quiet=True)
+    
+    for ofile,fileType in [(test_file,None),(str(tmp_path / 'probe.am'),'3D BINARY-LITTLE-ENDIAN 2.1')]:
+        if fileType is not None:
+            graph.write(ofile,fileType=fileType,encoding='HxZip')
+        summary = spatialgraph.SpatialGraph.probe(ofile)
+        assert summary['nnode']==graph.nnode==5
+        assert summary['nedge']==graph.nedge==4
+        assert summary['nedgepoint']==graph.nedgepoint==12
+        assert [x['name'] for x in summary['fields']]==graph.fieldNames
+        shapes = {x['name']:list(x['shape']) for x in summary['fields']}
+        assert shapes['EdgePointCoordinates']==[12,3] and shapes['Radii']==[12]
+        
+        header = spatialgraph.SpatialGraph()
+        header.read_header(ofile,quiet=True)
+        assert all(f['data'] is None for f in header.fields)
+        
+if __name__=='__main__':
+    import tempfile, pathlib
+    with tempfile.TemporaryDirectory() as d:
+        test_probe(pathlib.Path(d))
+    print('probe OK')
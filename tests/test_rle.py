@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Round-trip tests for HxByteRLE encoding/decoding
+
+@author: simon
+"""
+
+from pymira import amiramesh
+import numpy as np
+
+def test_rle_roundtrip():
+
+    am = amiramesh.AmiraMesh()
+    rng = np.random.default_rng(0)
+
+    cases = [b'', b'a', b'aa', b'aaa', bytes(300), bytes(range(256))*3,
+             rng.integers(0,3,10000).astype('uint8').tobytes(),
+             np.repeat(rng.integers(0,256,500),rng.integers(1,400,500)).astype('uint8').tobytes(),
+            ]
+
+    for data in cases:
+        for min_run in [2,3,5]:
+            enc = am.encode_rle(data,min_run=min_run)
+            dec = am.decode_rle(enc,len(data))
+            assert dec.tobytes()==data
+
+    # Label-like data should compress well
+    data = np.repeat(np.arange(10,dtype='uint8'),1000).tobytes()
+    assert len(am.encode_rle(data))<len(data)/50
+
+def test_rle_control_bytes():
+
+    # The compiled and pure Python control byte scans must agree (including on errors)
+    am = amiramesh.AmiraMesh()
+    rng = np.random.default_rng(1)
+    data = np.repeat(rng.integers(0,256,2000),rng.integers(1,6,2000)).astype('uint8').tobytes()
+    enc = np.frombuffer(am.encode_rle(data,min_run=2),dtype='uint8')
+    for size in [len(data),len(data)+10]:
+        res = amiramesh._rle_control_bytes(enc.tobytes(),size)
+        if amiramesh._rle_control_bytes_jit is not None:
+            res_jit = amiramesh._rle_control_bytes_jit(enc,size)
+            assert np.array_equal(res[0],res_jit[0]) and res[1:]==tuple(res_jit[1:])
+        assert res[3]==(0 if size==len(data) else 1)
+        
+    # Both decoding paths give the same result
+    dec = am.decode_rle(enc.tobytes(),len(data))
+    jit = amiramesh._rle_control_bytes_jit, amiramesh._rle_expand_jit
+    amiramesh._rle_control_bytes_jit, amiramesh._rle_expand_jit = None, None
+    try:
+        dec_py = am.decode_rle(enc.tobytes(),len(data))
+    finally:
+        amiramesh._rle_control_bytes_jit, amiramesh._rle_expand_jit = jit
+    assert dec.tobytes()==dec_py.tobytes()==data
+    
+    try:
+        am.decode_rle(enc[:-5].tobytes(),len(data))
+        assert False
+    except ValueError:
+        pass
+
+if __name__=='__main__':
+    test_rle_roundtrip()
+    test_rle_control_bytes()
+    print('RLE round-trip OK')
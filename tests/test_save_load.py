@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Compressed columnar save/load round trips
+
+@author: simon
+"""
+
+from pymira import spatialgraph
+import numpy as np
+import pytest
+import os
+
+test_file = os.path.join(os.path.dirname(__file__),'test_network.am')
+
+def _check_roundtrip(path):
+
+    graph = spatialgraph.SpatialGraph()
+    graph.read(test_file,quiet=True)
+    graph.save(path)
+    
+    res = spatialgraph.SpatialGraph()
+    res.load(path)
+    assert res.fieldNames==graph.fieldNames
+    assert (res.nnode,res.nedge,res.nedgepoint)==(graph.nnode,graph.nedge,graph.nedgepoint)
+    for f in graph.fields:
+        data = res.get_data(f['name'])
+        assert data.dtype==f['data'].dtype
+        assert np.array_equal(data,f['data'])
+        
+    # Loading selected fields always includes the graph structure
+    res = spatialgraph.SpatialGraph()
+    res.load(path,fields=['Radii'])
+    assert sorted(res.fieldNames)==sorted(graph.fieldNames)
+    res = spatialgraph.SpatialGraph()
+    res.load(path,fields=[])
+    assert 'Radii' not in res.fieldNames
+    
+    # Round trip back to .am
+    ofile = os.path.splitext(path)[0]+'_rt.am'
+    res = spatialgraph.SpatialGraph()
+    res.read(path)
+    res.write(ofile)
+    rt = spatialgraph.SpatialGraph()
+    rt.read(ofile,quiet=True)
+    for f in graph.fields:
+        assert np.allclose(rt.get_data(f['name']),f['data'])
+
+def test_npz(tmp_path):
+    _check_roundtrip(str(tmp_path / 'graph.npz'))
+    
+def test_hdf5(tmp_path):
+    pytest.importorskip('h5py')
+    _check_roundtrip(str(tmp_path / 'graph.h5'))
+    
+def test_zarr(tmp_path):
+    pytest.importorskip('zarr')
+    _check_roundtrip(str(tmp_path / 'graph.zarr'))
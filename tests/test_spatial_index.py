@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Nearest-vessel and box queries with SpatialGraph.spatial_index
+
+@author: simon
+"""
+
+from pymira import spatialgraph
+import numpy as np
+import time
+import os
+
+test_file = os.path.join(os.path.dirname(__file__),'test_network.am')
+
+def test_query_box():
+
+    graph = spatialgraph.SpatialGraph()
+    graph.read(test_file,quiet=True)
+    index = graph.spatial_index()
+    
+    # Box inside the bounding box of edge 1's diagonal segment (1,0)-(1.5,0.5), but missing the segment and its 0.1 radius
+    lo,hi = [1.4,0.,-1.],[1.6,0.1,1.]
+    assert index.query_box(lo,hi).tolist()==[]
+    # Box the diagonal passes through
+    assert index.query_box([1.2,0.1,-1.],[1.4,0.2,1.]).tolist()==[1]
+    edges,segs = index.query_box([1.2,0.1,-1.],[1.4,0.2,1.],return_segments=True)
+    assert segs.tolist()==[3]
+    
+    # Radius grows the box on every side
+    assert index.query_box([0.2,0.15,-1.],[0.3,0.25,1.]).tolist()==[]
+    assert index.query_box([0.2,0.05,-1.],[0.3,0.15,1.]).tolist()==[0]
+    assert index.query_box([-5.,-5.,-5.],[5.,5.,5.]).tolist()==[0,1,2,3]
+    
+def test_query_box_zero_radius():
+
+    graph = spatialgraph.SpatialGraph()
+    graph.read(test_file,quiet=True)
+    graph.set_data(np.zeros(graph.nedgepoint,dtype='float32'),name='Radii')
+    index = graph.spatial_index()
+    
+    # Axis-parallel segments (zero direction components)
+    assert index.query_box([0.2,-0.05,-1.],[0.3,0.05,1.]).tolist()==[0]
+    assert index.query_box([0.2,0.05,-1.],[0.3,0.15,1.]).tolist()==[]
+    assert index.query_box([0.2,0.,0.],[0.3,0.,0.]).tolist()==[0]
+    
+    # Any box containing a point sampled along a segment must find it
+    points = graph.get_data('EdgePointCoordinates')
+    offsets = graph.edge_offsets()
+    t = np.linspace(0.,1.,101)[:,None]
+    samples, sample_edge = [], []
+    for i in range(graph.nedge):
+        for j in range(offsets[i],offsets[i+1]-1):
+            samples.append(points[j] + t*(points[j+1]-points[j]))
+            sample_edge.append(np.full(t.shape[0],i))
+    samples, sample_edge = np.concatenate(samples), np.concatenate(sample_edge)
+    
+    rng = np.random.default_rng(1)
+    for _ in range(200):
+        lo = rng.uniform([-0.5,-0.5,-0.1],[2.5,5.5,0.])
+        hi = lo + rng.uniform(0.,1.,3)
+        found = index.query_box(lo,hi)
+        inside = np.all((samples>=lo) & (samples<=hi),axis=1)
+        assert np.all(np.isin(np.unique(sample_edge[inside]),found))
+        
+def dense_edges(nedge,npts,seed=0):
+
+    # Wavy, densely sampled parallel edges with varied radii, spaced well apart compared with their points
+    rng = np.random.default_rng(seed)
+    t = np.linspace(0.,4.,npts)
+    points = np.concatenate([np.column_stack([t,np.full(npts,3.*(i%50))+0.3*np.sin(t+i),np.full(npts,3.*(i//50))]) for i in range(nedge)])
+    offsets = np.arange(nedge+1)*npts
+    radii = rng.uniform(0.05,0.45,points.shape[0])
+    return points, offsets, radii
+    
+def test_nearest_dense():
+
+    points, offsets, radii = dense_edges(120,40)
+    index = spatialgraph.SpatialIndex(points,offsets,radii=radii)
+    edge = index.point_edge
+    
+    # Every point, excluding its own edge, against a brute force search over a sample
+    t0 = time.perf_counter()
+    dist,nedge,nind = index.nearest(points,exclude_edge=edge)
+    assert time.perf_counter()-t0<10.
+    sample = np.random.default_rng(1).choice(points.shape[0],300,replace=False)
+    for i in sample:
+        s = np.linalg.norm(points-points[i],axis=1) - radii
+        s[edge==edge[i]] = np.inf
+        assert np.isclose(dist[i],np.min(s))
+        assert np.isclose(s[nind[i]],dist[i]) and nedge[i]==edge[nind[i]]!=edge[i]
+        
+    # Without exclusion, and with a small starting k
+    dist,_,nind = index.nearest(points[sample]+0.01,k=2)
+    for d,i in zip(dist,sample):
+        assert np.isclose(d,np.min(np.linalg.norm(points-(points[i]+0.01),axis=1)-radii))
+        
+    # A single edge has no other edges to find
+    index = spatialgraph.SpatialIndex(points[:40],offsets[:2],radii=radii[:40])
+    dist,nedge,nind = index.nearest(points[:40],exclude_edge=0)
+    assert np.all(np.isinf(dist)) and np.all(nedge==-1) and np.all(nind==-1)
+    
+if __name__=='__main__':
+    test_query_box()
+    test_query_box_zero_radius()
+    test_nearest_dense()
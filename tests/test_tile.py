@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Edge subgraphs and tiling
+
+@author: simon
+"""
+
+import numpy as np
+import pytest
+
+def test_edge_subgraph(load_graph):
+
+    graph = load_graph()
+    ec_before = graph.get_data('EdgeConnectivity').copy()
+    
+    sub, nodes, edges = graph.edge_subgraph([3,1],return_lookup=True)
+    assert nodes.tolist()==[1,2,3,4]
+    assert edges.tolist()==[1,3]
+    assert sub.nnode==4 and sub.nedge==2 and sub.nedgepoint==6
+    assert sub.get_data('EdgeConnectivity').tolist()==[[0,1],[2,3]]
+    assert np.array_equal(sub.get_data('VertexCoordinates'),graph.get_data('VertexCoordinates')[nodes])
+    assert sub.get_data('Radii').tolist()==[3,4,5,9,10,11]
+    pts = graph.get_data('EdgePointCoordinates')
+    assert np.array_equal(sub.get_data('EdgePointCoordinates'),np.concatenate([pts[3:6],pts[9:12]]))
+    assert sub.edge_offsets().tolist()==[0,3,6]
+    
+    # Source graph is unchanged
+    assert np.array_equal(graph.get_data('EdgeConnectivity'),ec_before)
+    assert graph.nedge==4 and graph.nedgepoint==12
+    
+def brute_force_tiles(graph,grid_shape,overlap):
+
+    # Edges with a point in each (overlap-expanded) tile; the outer tiles extend to cover everything beyond the grid
+    points = graph.get_data('EdgePointCoordinates')
+    lo = np.min(np.concatenate([points,graph.get_data('VertexCoordinates')]),axis=0)
+    hi = np.max(np.concatenate([points,graph.get_data('VertexCoordinates')]),axis=0)
+    size = (hi-lo) / grid_shape
+    size[size==0] = 1.
+    edge_index = graph.edge_point_index()
+    res = {}
+    for index in np.ndindex(*grid_shape):
+        x0 = lo + np.asarray(index)*size - overlap
+        x1 = lo + (np.asarray(index)+1)*size + overlap
+        x0[np.asarray(index)==0] = -np.inf
+        x1[np.asarray(index)==np.asarray(grid_shape)-1] = np.inf
+        inside = np.all((points>=x0) & (points<x1),axis=1)
+        res[index] = sorted(set(edge_index[inside].tolist()))
+    return res
+    
+def test_tile(load_graph):
+
+    graph = load_graph()
+    
+    for grid_shape in [(2,2,1),(3,4,1)]:
+        for overlap in [0.,0.3]:
+            expected = brute_force_tiles(graph,grid_shape,overlap)
+            ntile = 0
+            for index,extent,sub in graph.tile(grid_shape=grid_shape,overlap=overlap,skip_empty=False):
+                ntile += 1
+                assert sub.nedge==len(expected[index]), (grid_shape,overlap,index)
+                if sub.nedge>0:
+                    ref = graph.edge_subgraph(expected[index])
+                    assert np.array_equal(sub.get_data('EdgePointCoordinates'),ref.get_data('EdgePointCoordinates'))
+                    assert np.array_equal(sub.get_data('EdgeConnectivity'),ref.get_data('EdgeConnectivity'))
+                assert np.allclose([x[1]-x[0] for x in extent][:2],np.asarray([2.,5.])/grid_shape[:2])
+            assert ntile==np.prod(grid_shape)
+            
+            # Empty tiles are skipped by default, and every edge appears in at least one tile
+            tiled = set()
+            for index,extent,sub in graph.tile(grid_shape=grid_shape,overlap=overlap):
+                assert sub.nedge>0
+                tiled |= set(expected[index])
+            assert tiled==set(range(graph.nedge))
+            
+    # Tile size instead of grid shape
+    indices = [index for index,_,_ in graph.tile(tile_size=[1.,2.5,1.],skip_empty=False)]
+    assert indices==list(np.ndindex(2,2,1))
+    
+if __name__=='__main__':
+    pytest.main([__file__])
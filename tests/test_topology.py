@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Cached topology indices: edge_offsets, edge_point_index, adjacency and node_edges
+
+@author: simon
+"""
+
+from pymira import spatialgraph
+import numpy as np
+import os
+
+test_file = os.path.join(os.path.dirname(__file__),'test_network.am')
+
+def brute_force_incidence(graph):
+
+    # Incident edges, other-end nodes and start flags for each node, by looping over every edge
+    edgeconn = graph.get_data('EdgeConnectivity')
+    res = [[] for _ in range(graph.nnode)]
+    for i,(s,e) in enumerate(edgeconn):
+        res[s].append((i,e,True))
+        res[e].append((i,s,False))
+    return [sorted(x) for x in res]
+    
+def check_topology(graph):
+
+    npts = graph.get_data('NumEdgePoints')
+    offsets = graph.edge_offsets()
+    assert offsets.shape[0]==graph.nedge+1 and offsets[-1]==graph.nedgepoint
+    assert np.all(np.diff(offsets)==npts)
+    
+    edgeInd = graph.edge_point_index()
+    assert edgeInd.shape[0]==graph.nedgepoint
+    for i in range(graph.nedge):
+        assert np.all(edgeInd[offsets[i]:offsets[i+1]]==i)
+        
+    indptr,edges,neighbours,is_start = graph.adjacency()
+    assert indptr.shape[0]==graph.nnode+1
+    for n,expected in enumerate(brute_force_incidence(graph)):
+        i0,i1 = indptr[n],indptr[n+1]
+        assert sorted(zip(edges[i0:i1].tolist(),neighbours[i0:i1].tolist(),is_start[i0:i1].tolist()))==expected
+        assert np.all(np.diff(edges[i0:i1])>=0)
+        assert graph.node_edges(n).tolist()==sorted(set(x[0] for x in expected))
+
+def test_topology():
+
+    graph = spatialgraph.SpatialGraph()
+    graph.read(test_file,quiet=True)
+    
+    assert graph.edge_offsets().tolist()==[0,3,6,9,12]
+    assert graph.edge_point_index().tolist()==np.repeat(np.arange(4),3).tolist()
+    assert graph.node_edges(2).tolist()==[1,2]
+    check_topology(graph)
+    
+    # Cached arrays are reused until the structure changes
+    assert graph.adjacency()[0] is graph.adjacency()[0]
+    assert graph.edge_offsets() is graph.edge_offsets()
+    
+    # Branch, self-loop and isolated node
+    with graph.batch_edit() as tx:
+        n = tx.add_node([5.,5.,5.])
+        tx.add_edge(2,n)
+        tx.add_edge(n,n,points=[[5.,5.,5.],[6.,5.,5.],[5.,5.,5.]])
+        tx.add_node([9.,9.,9.])
+    assert graph.nnode==7 and graph.nedge==6
+    check_topology(graph)
+    assert graph.node_edges(5).tolist()==[4,5]
+    assert graph.node_edges(6).shape[0]==0
+    indptr = graph.adjacency()[0]
+    assert indptr[6]-indptr[5]==3 # Self-loop counted at both ends
+    
+def test_cache_invalidation():
+
+    graph = spatialgraph.SpatialGraph()
+    graph.read(test_file,quiet=True)
+    offsets = graph.edge_offsets()
+    indptr = graph.adjacency()[0]
+    
+    # Replacing the structure fields rebuilds the cached indices
+    graph.set_data(np.asarray([2,4,3,3]),name='NumEdgePoints')
+    assert graph.edge_offsets() is not offsets
+    assert graph.edge_offsets().tolist()==[0,2,6,9,12]
+    assert graph.edge_point_index().tolist()==[0,0,1,1,1,1,2,2,2,3,3,3]
+    
+    graph.set_data(np.asarray([[0,1],[1,2],[2,3],[1,4]]),name='EdgeConnectivity')
+    assert graph.adjacency()[0] is not indptr
+    assert graph.node_edges(1).tolist()==[0,1,3]
+    assert graph.node_edges(3).tolist()==[2]
+    check_topology(graph)
+    
+    # In-place edits need an explicit invalidation
+    graph.get_data('EdgeConnectivity')[3] = [0,4]
+    assert graph.node_edges(1).tolist()==[0,1,3]
+    graph.invalidate_topology_cache()
+    assert graph.node_edges(1).tolist()==[0,1]
+    assert graph.node_edges(0).tolist()==[0,3]
+    
+    # Cached arrays are read-only
+    try:
+        graph.edge_point_index()[0] = 1
+        assert False
+    except ValueError:
+        pass
+    
+if __name__=='__main__':
+    test_topology()
+    test_cache_invalidation()
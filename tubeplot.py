@@ -440,11 +440,12 @@ class TubePlot(object):
         print('Preparing graph (creating cylinders)...')
         # Create cylinders
         excluded = []
+        offsets = self.graph.edge_offsets()
         for i in trange(nedge):
             excl = True
             
             if self.edge_filter[i] and self.node_filter[conns[i,0]] and self.node_filter[conns[i,1]]:
-                i0 = np.sum(npoints[:i])
+                i0 = offsets[i]
                 i1 = i0+npoints[i]
                 coords = points[i0:i1]
                 rads = radii[i0:i1]
@@ -314,10 +314,10 @@ def skeletonize(image,resolution=arr([1.,1.,1.,]),offset=arr([0.,0.,0.])):
     graph.set_data(radii,name='Radius')
     graph.set_graph_sizes()
 
-    graphNodeIndex, graph_size = graph.identify_graphs(progBar=True)
+    graphNodeIndex, graph_size = graph.identify_graphs()
     ed = spatialgraph.Editor()
     graph = ed.remove_graphs_smaller_than(graph,20) #identify_graphs(graph)
-    graphNodeIndex, graph_size2 = graph.identify_graphs(progBar=True)
+    graphNodeIndex, graph_size2 = graph.identify_graphs()
     
     for e in range(graph.nedge):
        edge = graph.get_edge(e)